@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+
+'''Micro benchmarks of the osc codecs in chaosc.osc_lib and chaosc.c_osc_lib
+
+Measures decode_osc, proxy_decode_osc, reading the first and all arguments
+through an OSCMessageView, OSCMessage.encode_osc, encoding with an OSCMessageTemplate,
+OSCBundle.encode_osc and encode_into a reused buffer for typical message
+shapes. Results can be stored as a
+baseline and later runs compared against it::
+
+    python benchmarks/codec_bench.py -s baseline.json
+    # change the codec, rebuild c_osc_lib, then
+    python benchmarks/codec_bench.py -c baseline.json -t 0.1
+
+In comparison mode the exit code is 1 if any benchmark got slower than the
+threshold allows.
+'''
+
+# This file is part of chaosc
+#
+# chaosc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# chaosc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with chaosc.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2012-2014 Stefan Kögl
+
+from __future__ import absolute_import
+
+import argparse
+import json
+import os.path
+import platform
+import sys
+
+from time import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chaosc import osc_lib
+
+try:
+    from chaosc import c_osc_lib
+except ImportError:
+    c_osc_lib = None
+
+
+def _message(lib, address, typed_args):
+    message = lib.OSCMessage(address)
+    for argument, typetag in typed_args:
+        message.appendTypedArg(argument, typetag)
+    return message
+
+
+def _bundle(lib, elements):
+    bundle = lib.OSCBundle()
+    for element in elements:
+        bundle.append(element)
+    return bundle
+
+
+def make_cases(lib):
+    """Returns (name, object) pairs of realistic osc messages and bundles
+    built with the given codec module"""
+    single_float = _message(lib, "/fader/1", [(0.5, "f")])
+    sensor_frame = _message(lib, "/sensor/accelerometer/frame",
+        [(i * 0.25, "f") for i in range(15)] + [(123456, "i")])
+    blob = _message(lib, "/video/frame", [(17, "i"), ("\x7f" * 1024, "b")])
+    mixed = _message(lib, "/scene/cue", [("intro", "s"), (3, "i"),
+        (0.75, "f"), (1.5, "d")])
+    bundle = _bundle(lib, [_message(lib, "/sensor/%d" % i,
+        [(i * 0.1, "f"), (i, "i")]) for i in range(8)])
+    nested_bundle = _bundle(lib, [
+        _bundle(lib, [single_float, mixed]),
+        _bundle(lib, [sensor_frame, _bundle(lib, [single_float])]),
+        mixed])
+    return [
+        ("single_float", single_float),
+        ("sensor_frame", sensor_frame),
+        ("blob", blob),
+        ("mixed", mixed),
+        ("bundle", bundle),
+        ("nested_bundle", nested_bundle)]
+
+
+def measure(function, min_time, repeat):
+    """Returns the best time per call in nanoseconds
+
+    The number of calls per round grows until a round takes `min_time`
+    seconds, then the best of `repeat` rounds is taken.
+    """
+    number = 1
+    while True:
+        start = time()
+        for i in xrange(number):
+            function()
+        elapsed = time() - start
+        if elapsed >= min_time:
+            break
+        number *= 4
+    best = elapsed
+    for i in xrange(repeat - 1):
+        start = time()
+        for i in xrange(number):
+            function()
+        best = min(best, time() - start)
+    return best / number * 1e9
+
+
+def run(min_time, repeat, selected):
+    results = dict()
+    for lib_name, lib in (("osc_lib", osc_lib), ("c_osc_lib", c_osc_lib)):
+        if lib is None:
+            sys.stderr.write("c_osc_lib is not built, skipping it\n")
+            continue
+        for case_name, obj in make_cases(lib):
+            packet = obj.encode_osc()
+            length = len(packet)
+            buffer = bytearray(length)
+            operations = [
+                ("decode_osc", lambda: lib.decode_osc(packet, 0, length)),
+                ("encode_osc", obj.encode_osc),
+                ("encode_into", lambda: obj.encode_into(buffer))]
+            if isinstance(obj, lib.OSCMessage):
+                operations.append(("proxy_decode_osc",
+                    lambda: lib.proxy_decode_osc(packet, 0, length)))
+                operations.append(("view_first_arg",
+                    lambda: lib.OSCMessageView(packet, 0, length)[0]))
+                operations.append(("view_all_args",
+                    lambda: lib.OSCMessageView(packet, 0, length).values()))
+                template = lib.OSCMessageTemplate(obj.address,
+                    "".join(obj.typetags))
+                template_args = tuple(obj.args)
+                operations.append(("template_encode",
+                    lambda: template.encode(*template_args)))
+            for operation, function in operations:
+                key = "%s.%s.%s" % (lib_name, operation, case_name)
+                if selected and not [s for s in selected if s in key]:
+                    continue
+                results[key] = measure(function, min_time, repeat)
+                sys.stderr.write("%-50s %10.1f ns\n" % (key, results[key]))
+    return results
+
+
+def compare(results, baseline, threshold, out):
+    """Writes a comparison table and returns the keys slower than threshold
+    """
+    slower = list()
+    out.write("%-50s %10s %10s %8s\n" % ("benchmark", "baseline", "now",
+        "change"))
+    for key in sorted(results):
+        if key not in baseline:
+            out.write("%-50s %10s %10.1f %8s\n" % (key, "-", results[key], "new"))
+            continue
+        change = results[key] / baseline[key] - 1.
+        flag = ""
+        if change > threshold:
+            slower.append(key)
+            flag = " SLOWER"
+        out.write("%-50s %10.1f %10.1f %+7.1f%%%s\n" % (key, baseline[key],
+            results[key], change * 100., flag))
+    return slower
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(prog="codec_bench",
+        description="micro benchmarks of the chaosc osc codecs")
+    arg_parser.add_argument("-s", "--save",
+        help="store the results as baseline json in this path")
+    arg_parser.add_argument("-c", "--compare",
+        help="compare the results with this baseline json")
+    arg_parser.add_argument("-t", "--threshold", type=float, default=0.1,
+        help="relative slowdown reported as regression, default=0.1")
+    arg_parser.add_argument("-m", "--min_time", type=float, default=0.2,
+        help="minimal seconds per measurement round, default=0.2")
+    arg_parser.add_argument("-r", "--repeat", type=int, default=5,
+        help="rounds per benchmark, the best one counts, default=5")
+    arg_parser.add_argument("benchmarks", nargs="*",
+        help="only run benchmarks containing one of these strings")
+    args = arg_parser.parse_args()
+
+    results = run(args.min_time, args.repeat, args.benchmarks)
+
+    if args.save:
+        with open(args.save, "w") as output:
+            json.dump({
+                "python" : platform.python_version(),
+                "platform" : platform.platform(),
+                "results_ns" : results}, output, indent=4, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)["results_ns"]
+        slower = compare(results, baseline, args.threshold, sys.stdout)
+        if slower:
+            sys.stdout.write("%d benchmarks slower than %.0f%%\n" % (
+                len(slower), args.threshold * 100.))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+
+'''End-to-end loopback benchmark of the chaosc hub
+
+Starts chaosc in its own process, subscribes N receiver processes and sends
+timestamped messages with increasing rates. For every rate step throughput,
+loss and the p50/p99/p999 forwarding latency are measured and written as
+json. Everything runs on loopback, so no network is needed::
+
+    python benchmarks/hub_bench.py -n 4 -r 1000,10000,50000 -o results.json
+
+Hub options to compare can be passed with --hub_args. Note that sender and
+receivers are python processes too, so at high rates they can become the
+bottleneck. Watch the achieved send rate in the results.
+'''
+
+# This file is part of chaosc
+#
+# chaosc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# chaosc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with chaosc.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2012-2014 Stefan Kögl
+
+from __future__ import absolute_import
+
+import argparse
+import errno
+import json
+import os
+import os.path
+import platform
+import shlex
+import socket
+import subprocess
+import sys
+
+from array import array
+from multiprocessing import Process, Pipe
+from select import select
+from struct import pack, unpack_from
+from time import time, sleep
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chaosc.osc_lib import OSCMessage, encode_string, decode_osc
+
+
+BENCH_ADDRESS = "/bench/hub"
+
+# message layout: address, ",iid", step, sequence number, send timestamp
+_header = encode_string(BENCH_ADDRESS) + encode_string(",iid")
+_payload_offset = len(_header)
+
+RECEIVE_BUFFER = 8 * 1024 * 1024
+
+# seconds to wait for late packets after each step
+DRAIN_TIME = 0.5
+
+
+def free_port():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def percentile(values, fraction):
+    """Returns the given percentile of sorted values, None if empty"""
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def receiver(sock, pipe):
+    """Receives benchmark messages and returns counts and latencies per step
+
+    Runs in its own process until the pipe delivers "stop", then sends
+    {step: latencies in seconds} back.
+    """
+    sock.setblocking(0)
+    recv = sock.recv
+    steps = dict()
+    running = True
+    while running:
+        readable = select([sock, pipe], [], [], 0.1)[0]
+        if pipe in readable:
+            running = pipe.recv() != "stop"
+        if sock not in readable:
+            continue
+        while True:
+            try:
+                packet = recv(65536)
+            except socket.error, error:
+                if error.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
+            now = time()
+            if not packet.startswith(_header):
+                continue
+            step, sequence, timestamp = unpack_from(">iid", packet,
+                _payload_offset)
+            try:
+                latencies = steps[step]
+            except KeyError:
+                latencies = steps[step] = array("d")
+            latencies.append(now - timestamp)
+    pipe.send(dict((step, latencies.tolist())
+        for step, latencies in steps.iteritems()))
+
+
+def start_hub(port, token, hub_args):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [os.path.dirname(os.path.dirname(os.path.abspath(__file__)))] +
+        env.get("PYTHONPATH", "").split(os.pathsep))
+    command = [sys.executable, "-m", "chaosc.chaosc", "-4", "-d", os.devnull,
+        "-H", "127.0.0.1", "-P", str(port), "-a", token] + \
+        shlex.split(hub_args)
+    return subprocess.Popen(command, env=env)
+
+
+def subscribe(control, hub_address, ports, token, timeout=10.):
+    """Subscribes the receivers, retrying until the hub answers"""
+    deadline = time() + timeout
+    pending = set(ports)
+    control.settimeout(0.2)
+    while pending:
+        if time() > deadline:
+            raise RuntimeError("chaosc did not answer the subscriptions")
+        for port in pending:
+            message = OSCMessage("/subscribe")
+            message.appendTypedArg("127.0.0.1", "s")
+            message.appendTypedArg(port, "i")
+            message.appendTypedArg(token, "s")
+            message.appendTypedArg("bench-%d" % port, "s")
+            control.sendto(message.encode_osc(), hub_address)
+        try:
+            while pending:
+                data = control.recv(65536)
+                address, typetags, args = decode_osc(data, 0, len(data))
+                if not args or args[0] != "subscribe":
+                    continue
+                # "/OK subscribe host port" and
+                # "/Failed subscribe reason host port" end with the port.
+                # A retry of a subscription whose answer got lost is
+                # answered with "already subscribed", which is fine too.
+                if address == "/Failed" and args[1] != "already subscribed":
+                    raise RuntimeError("subscription of port %d failed - %s" %
+                        (args[-1], args[1]))
+                pending.discard(args[-1])
+        except socket.timeout:
+            pass
+
+
+def send_step(sock, hub_address, step, rate, duration, batch):
+    """Sends timestamped messages with the given rate
+
+    :returns: sent messages, elapsed seconds and send errors
+    :rtype: tuple
+    """
+    sendto = sock.sendto
+    interval = batch / float(rate)
+    sequence = 0
+    errors = 0
+    start = next_batch = time()
+    end = start + duration
+    while True:
+        now = time()
+        if now >= end:
+            break
+        delay = next_batch - now
+        if delay > 0.001:
+            sleep(delay - 0.001)
+            continue
+        elif delay > 0.:
+            continue
+        next_batch += interval
+        for i in xrange(batch):
+            try:
+                sendto("%s%s" % (_header, pack(">iid", step, sequence, time())),
+                    hub_address)
+            except socket.error, error:
+                if error.errno not in (errno.ENOBUFS, errno.EAGAIN):
+                    raise
+                errors += 1
+            else:
+                sequence += 1
+    return sequence, time() - start, errors
+
+
+def run(args):
+    rates = [float(rate) for rate in args.rates.split(",") if rate]
+    port = free_port()
+    hub_address = ("127.0.0.1", port)
+    hub = start_hub(port, args.token, args.hub_args)
+
+    receivers = list()
+    try:
+        for i in range(args.subscribers):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER)
+            sock.bind(("127.0.0.1", 0))
+            parent_pipe, child_pipe = Pipe()
+            process = Process(target=receiver, args=(sock, child_pipe))
+            process.daemon = True
+            process.start()
+            receivers.append((sock.getsockname()[1], process, parent_pipe))
+            sock.close()
+
+        control = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        control.bind(("127.0.0.1", 0))
+        subscribe(control, hub_address, [item[0] for item in receivers],
+            args.token)
+
+        sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sender.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, RECEIVE_BUFFER)
+        sent_per_step = list()
+        for step, rate in enumerate(rates):
+            sent, elapsed, errors = send_step(sender, hub_address, step, rate,
+                args.duration, args.batch)
+            sent_per_step.append((sent, elapsed, errors))
+            sys.stderr.write("step %d: %d packets/s requested, %.1f sent\n" % (
+                step, rate, sent / elapsed))
+            sleep(DRAIN_TIME)
+
+        received = list()
+        for port, process, pipe in receivers:
+            pipe.send("stop")
+            received.append(pipe.recv())
+            process.join()
+    finally:
+        hub.terminate()
+        hub.wait()
+        for port, process, pipe in receivers:
+            if process.is_alive():
+                process.terminate()
+
+    steps = list()
+    for step, rate in enumerate(rates):
+        sent, elapsed, errors = sent_per_step[step]
+        latencies = list()
+        for result in received:
+            latencies.extend(result.get(step, ()))
+        latencies.sort()
+        expected = sent * len(receivers)
+        steps.append({
+            "rate" : rate,
+            "sent" : sent,
+            "send_rate" : sent / elapsed,
+            "send_errors" : errors,
+            "expected" : expected,
+            "received" : len(latencies),
+            "throughput" : len(latencies) / elapsed,
+            "loss" : expected and 1. - len(latencies) / float(expected) or 0.,
+            "latency_us" : dict((name, value is not None and value * 1e6 or None)
+                for name, value in (
+                    ("p50", percentile(latencies, 0.5)),
+                    ("p99", percentile(latencies, 0.99)),
+                    ("p999", percentile(latencies, 0.999)),
+                    ("max", latencies and latencies[-1] or None)))})
+
+    return {
+        "config" : {
+            "subscribers" : args.subscribers,
+            "duration" : args.duration,
+            "batch" : args.batch,
+            "hub_args" : args.hub_args,
+            "python" : platform.python_version(),
+            "platform" : platform.platform()},
+        "steps" : steps}
+
+
+def print_table(results, out):
+    out.write("%10s %10s %12s %8s %10s %10s %10s\n" % ("rate", "sent/s",
+        "delivered/s", "loss %", "p50 us", "p99 us", "p999 us"))
+    for step in results["steps"]:
+        latency = step["latency_us"]
+        out.write("%10d %10.1f %12.1f %8.3f %10s %10s %10s\n" % ((step["rate"],
+            step["send_rate"], step["throughput"], step["loss"] * 100.) +
+            tuple([latency[name] is not None and "%.1f" % latency[name] or "-"
+                for name in ("p50", "p99", "p999")])))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(prog="hub_bench",
+        description="loopback benchmark of the chaosc hub")
+    arg_parser.add_argument("-n", "--subscribers", type=int, default=4,
+        help="number of subscribed receivers, default=4")
+    arg_parser.add_argument("-r", "--rates", default="1000,5000,10000,20000",
+        help="comma separated packets per second for each step, default=1000,5000,10000,20000")
+    arg_parser.add_argument("-D", "--duration", type=float, default=5.,
+        help="seconds per step, default=5")
+    arg_parser.add_argument("-B", "--batch", type=int, default=8,
+        help="packets sent back to back per wakeup, default=8")
+    arg_parser.add_argument("-a", "--token", default="sekret",
+        help="token for chaosc, default=sekret")
+    arg_parser.add_argument("-A", "--hub_args", default="",
+        help="additional command line flags for chaosc")
+    arg_parser.add_argument("-o", "--output",
+        help="path of the json results, default is stdout")
+    args = arg_parser.parse_args()
+
+    results = run(args)
+    print_table(results, sys.stderr)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=4, sort_keys=True)
+    else:
+        json.dump(results, sys.stdout, indent=4, sort_keys=True)
+        sys.stdout.write("\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -110,6 +110,10 @@ class ArgParser(object):
             help='token to authorize interaction with chaosc, default="sekret"')
         self.add_argument(subscriber_group, '-k', '--keep_subscribed', action="store_true",
             help='if specified, this tool don\'t unsubscribes on error or exit, default=False')
+        self.add_argument(subscriber_group, '-q', '--sequenced', action="store_true",
+            help='if specified, chaosc stamps packets with sequence numbers and this tool reports lost packets back, default=False')
+        self.add_argument(subscriber_group, '-Q', '--loss_report_interval', type=float, default=5.,
+            help='seconds between loss reports to chaosc, default=5.0')
         return subscriber_group
 
 
@@ -152,6 +156,29 @@ class ArgParser(object):
         return recording_group
 
 
+    def add_emitter_group(self):
+        emitter_group = self.add_argument_group("emitting", "flags relevant for generating load")
+        self.add_argument(emitter_group, '-e', '--addresses', default="/chaosc/emitter/%d",
+            help='comma separated osc addresses, "%%d" is replaced by 0..address_count-1, default="/chaosc/emitter/%%d"')
+        self.add_argument(emitter_group, '-n', '--address_count', type=int, default=16,
+            help='how many addresses are generated per address with "%%d", default=16')
+        self.add_argument(emitter_group, '-y', '--typetags', default="ifs",
+            help='comma separated typetag strings used in turn, e.g "i,ff,sif", default="ifs"')
+        self.add_argument(emitter_group, '-b', '--bundle_size', type=int, default=0,
+            help='messages per bundle, 0 sends plain messages, default=0')
+        self.add_argument(emitter_group, '-r', '--rate', type=float, default=1000.,
+            help='packets per second, 0 sends as fast as possible, default=1000')
+        self.add_argument(emitter_group, '-B', '--batch', type=int, default=16,
+            help='packets sent back to back per wakeup, default=16')
+        self.add_argument(emitter_group, '-D', '--duration', type=float, default=10.,
+            help='seconds to run, 0 runs until interrupted, default=10')
+        self.add_argument(emitter_group, '-V', '--variants', type=int, default=256,
+            help='how many different packets are pre-encoded, default=256')
+        self.add_argument(emitter_group, '-I', '--report_interval', type=float, default=1.,
+            help='seconds between rate reports, default=1')
+        return emitter_group
+
+
     def finalize(self):
         self.args = self.arg_parser.parse_args(sys.argv[1:])
 
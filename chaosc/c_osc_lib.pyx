@@ -22,13 +22,19 @@ from __future__ import absolute_import
 
 import types, time
 
-from math import ceil, modf
-from struct import pack, unpack
+from math import modf
+from struct import pack, unpack, Struct, error as StructError
 from copy import deepcopy
+from operator import attrgetter
 from itertools import izip
 
-__all__ = ["OSCError", "OSCBundleFound", "OSCMessage", "OSCBundle", "decode_osc",
-    "proxy_decode_osc", "encode_string"]
+from cpython.bytearray cimport PyByteArray_AS_STRING, PyByteArray_GET_SIZE
+from cpython.bytes cimport PyBytes_AS_STRING
+from libc.string cimport memcmp, memcpy, memset
+
+__all__ = ["OSCError", "OSCBundleFound", "OSCMessage", "OSCBundle",
+    "OSCMessageView", "OSCMessageTemplate", "message_template", "decode_osc",
+    "proxy_decode_osc", "encode_string", "walk_bundle"]
 
 class OSCError(Exception):
     """Base Class for all OSC-related errors
@@ -51,6 +57,42 @@ del timegm
 
 NTP_units_per_second = 0x100000000 # about 232 picoseconds
 
+_int_struct = Struct(">i")
+_uint_struct = Struct(">I")
+_float_struct = Struct(">f")
+_double_struct = Struct(">d")
+_long_struct = Struct(">q")
+_midi_struct = Struct(">BBBB")
+
+# typetag -> struct format of the fixed width numbers, runs of them are coded
+# by one struct.Struct. 'r' is a 32 bit rgba color
+_fixed_formats = {"i" : "i", "f" : "f", "d" : "d", "h" : "q", "r" : "I"}
+_fixed_structs = {"i" : _int_struct, "f" : _float_struct,
+    "d" : _double_struct, "h" : _long_struct, "r" : _uint_struct}
+
+# typetags without argument data and their values
+_constants = {"T" : True, "F" : False, "N" : None, "I" : float("inf")}
+
+# zero bytes terminating a string of length % 4
+_string_padding = ("\0\0\0\0", "\0\0\0", "\0\0", "\0")
+_blob_padding = ("", "\0\0\0", "\0\0", "\0")
+
+_bundle_address = "#bundle\0"
+
+# default limits of decoded bundles, the top level bundle counts as depth 1
+MAX_BUNDLE_DEPTH = 32
+MAX_BUNDLE_ELEMENTS = 65536
+
+# typetag string -> list of (struct.Struct, count) for runs of fixed width
+# arguments and single typetags of the others
+_typetag_codecs = dict()
+_typetag_codecs_size = 1024
+
+# (address, typetags) -> OSCMessageTemplate, see message_template
+_templates = dict()
+_templates_size = 1024
+_templates_clock = 0
+
 try:
     from numpy import typeDict
     for ftype in ['float32', 'float64', 'float128']:
@@ -75,15 +117,21 @@ cpdef inline str get_type_tag(object argument):
     ta = type(argument)
     if ta in float_types:
         return 'f'
-    elif ta in int_types:
-        return 'i'
+    elif ta in int_types or ta is long:
+        if -0x80000000 <= argument <= 0x7fffffff:
+            return 'i'
+        return 'h'
+    elif ta is bool:
+        return argument and 'T' or 'F'
+    elif argument is None:
+        return 'N'
     else:
         return 's'
 
 
 
 cpdef inline str encode_string(str argument):
-    return pack(">%ds" % int(ceil((len(argument)+1) / 4.0) * 4), argument)
+    return argument + _string_padding[len(argument) & 3]
 
 
 cpdef inline str encode_blob(str argument):
@@ -93,22 +141,22 @@ cpdef inline str encode_blob(str argument):
     The blob ends with 0 to 3 zero-bytes ('\x00')
     """
 
-    if isinstance(argument, basestring):
-        length = ceil((len(argument)) / 4.0) * 4
-        return pack(">i%ds" % length, length, argument)
-    else:
+    if argument is None:
         return ""
+    padding = _blob_padding[len(argument) & 3]
+    return "%s%s%s" % (_int_struct.pack(len(argument) + len(padding)),
+        argument, padding)
 
 
-cpdef inline str encode_timetag(float timestamp):
+cpdef inline str encode_timetag(double timestamp):
     """Convert a time in floating seconds to its
     OSC binary representation
     """
-    cdef float fract
-    cdef float secs
+    cdef double fract
+    cdef double secs
 
     if timestamp > 0.:
-        fract, secs = modf(time)
+        fract, secs = modf(timestamp)
         secs = secs - NTP_epoch
         return pack('>LL', long(secs), long(fract * NTP_units_per_second))
     else:
@@ -117,14 +165,19 @@ cpdef inline str encode_timetag(float timestamp):
 
 cpdef inline tuple decode_string(str data, int start, int end):
     """Reads the next (null-terminated) block of data
+
+    Raises OSCError if the string is not terminated before end.
     """
-    end = data.find('\0', start)
-    nextData = int(ceil(0.25 * (end+1)) * 4)
-    return data[start:end], nextData
+    end = data.find('\0', start, end)
+    if end < 0:
+        raise OSCError("unterminated osc string")
+    return data[start:end], (end + 4) & ~3
 
 
 cpdef inline tuple decode_blob(str data, int start, int end):
     """Reads the next (numbered) block of data
+
+    Raises OSCError if the size is negative or the blob exceeds end.
     """
 
     cdef int blob_start
@@ -132,8 +185,12 @@ cpdef inline tuple decode_blob(str data, int start, int end):
     cdef int nextData
 
     blob_start = start + 4
-    length = unpack(">i", data[start:blob_start])[0]
-    nextData = blob_start + int(ceil((length) / 4.0) * 4)
+    if blob_start > end:
+        raise OSCError("too few bytes for blob size")
+    length = _int_struct.unpack_from(data, start)[0]
+    if length < 0 or length > end - blob_start:
+        raise OSCError("invalid blob size %d" % length)
+    nextData = blob_start + ((length + 3) & ~3)
     return data[blob_start:nextData], nextData
 
 
@@ -153,14 +210,9 @@ cpdef inline tuple decode_long(str data, int start, int end):
     as a 64-bit signed integer.
         """
 
-    cdef int big
-    cdef int high
-    cdef int low
-
-    end = start + 8
-    high, low = unpack(">ll", data[start:end])
-    big = (long(high) << 32) + low
-    return big, end
+    if end - start < 8:
+        raise OSCError("too few bytes for long")
+    return _long_struct.unpack_from(data, start)[0], start + 8
 
 
 cpdef inline tuple decode_timetag(str data, int start, int end):
@@ -168,15 +220,12 @@ cpdef inline tuple decode_timetag(str data, int start, int end):
     as a TimeTag.
     """
 
-    cdef int high
-    cdef int low
-
     end = start + 8
     high, low = unpack(">LL", data[start:end])
     if (high == 0) and (low <= 1):
         return 0.0, end
     else:
-        return int(NTP_epoch + high) + float(low / NTP_units_per_second), end
+        return int(NTP_epoch + high) + low / float(NTP_units_per_second), end
 
 
 cpdef inline tuple decode_float(str data, int start, int end):
@@ -203,8 +252,285 @@ cpdef inline tuple decode_double(str data, int start, int end):
     return unpack(">d", data[start:end])[0], end
 
 
-cpdef tuple decode_osc(str data, int start, int end):
+cpdef inline tuple decode_char(str data, int start, int end):
+    """Reads a character sent as 32 bit integer
+    """
+    if end - start < 4:
+        raise OSCError("too few bytes for char")
+    value = _uint_struct.unpack_from(data, start)[0]
+    return value < 256 and chr(value) or unichr(value), start + 4
+
+
+cpdef inline tuple decode_midi(str data, int start, int end):
+    """Reads a 4 byte midi message as (port id, status, data1, data2)
+    """
+    if end - start < 4:
+        raise OSCError("too few bytes for midi message")
+    return _midi_struct.unpack_from(data, start), start + 4
+
+
+cpdef inline str encode_char(argument):
+    """Convert a character into its OSC binary representation
+    """
+    return _uint_struct.pack(ord(argument))
+
+
+cpdef inline str encode_midi(tuple argument):
+    """Convert a midi message (port id, status, data1, data2) into its OSC
+    binary representation
+    """
+    return _midi_struct.pack(*argument)
+
+
+# typetag -> decoder and encoder of the other typetags with argument data
+_decoders = {"s" : decode_string, "S" : decode_string, "b" : decode_blob,
+    "t" : decode_timetag, "c" : decode_char, "m" : decode_midi}
+_encoders = {"s" : encode_string, "S" : encode_string, "b" : encode_blob,
+    "t" : encode_timetag, "c" : encode_char, "m" : encode_midi}
+
+
+cpdef int argument_count(str typetags):
+    """Returns the number of arguments of a typetag string, an array counts
+    as one argument
+    """
+    cdef int count = 0
+    cdef int depth = 0
+
+    if "[" not in typetags:
+        return len(typetags)
+    for typetag in typetags:
+        if typetag == "[":
+            if not depth:
+                count += 1
+            depth += 1
+        elif typetag == "]":
+            depth -= 1
+        elif not depth:
+            count += 1
+    return count
+
+
+cpdef list typetag_codec(str typetags):
+    """Returns the codec of a typetag string: (struct.Struct, count) tuples
+    for runs of fixed width numbers (i, f, d, h, r) and typetag characters
+    for the others of OSC 1.1, '[' and ']' delimit arrays. Codecs are cached
+    per typetag string.
+    """
+    cdef list codec
+    cdef int depth = 0
+
+    codec = _typetag_codecs.get(typetags)
+    if codec is not None:
+        return codec
+
+    codec = list()
+    fixed = ""
+    for typetag in typetags:
+        if typetag in _fixed_formats:
+            fixed += _fixed_formats[typetag]
+            continue
+        if fixed:
+            codec.append((Struct(">" + fixed), len(fixed)))
+            fixed = ""
+        if typetag == "[":
+            depth += 1
+        elif typetag == "]":
+            depth -= 1
+            if depth < 0:
+                raise OSCError("unbalanced array in %r" % typetags)
+        elif typetag not in _decoders and typetag not in _constants:
+            raise OSCError("unknown typetag %r" % typetag)
+        codec.append(typetag)
+    if fixed:
+        codec.append((Struct(">" + fixed), len(fixed)))
+    if depth:
+        raise OSCError("unbalanced array in %r" % typetags)
+
+    # typetag strings come from the network, keep the cache bounded
+    if len(_typetag_codecs) >= _typetag_codecs_size:
+        _typetag_codecs.clear()
+    _typetag_codecs[typetags] = codec
+    return codec
+
+
+cpdef list decode_arguments(str data, int start, int end, str typetags):
+    """Decodes the arguments of an osc message, typetags without the
+    leading ','. Arrays are decoded as nested lists.
+    """
+    cdef list args = list()
+    cdef list arrays = list()
+    cdef list array
+    cdef int rest = start
+    cdef int size
+
+    for segment in typetag_codec(typetags):
+        if type(segment) is tuple:
+            codec = segment[0]
+            size = codec.size
+            if rest + size > end:
+                raise OSCError("too few bytes for arguments %r" % typetags)
+            args.extend(codec.unpack_from(data, rest))
+            rest += size
+        elif segment in _decoders:
+            argument, rest = _decoders[segment](data, rest, end)
+            args.append(argument)
+        elif segment in _constants:
+            args.append(_constants[segment])
+        elif segment == "[":
+            arrays.append(args)
+            args = list()
+        else:
+            array = args
+            args = arrays.pop()
+            args.append(array)
+    if rest > end:
+        raise OSCError("too few bytes for arguments %r" % typetags)
+    return args
+
+
+cpdef str encode_arguments(str typetags, args):
+    """Encodes the arguments of an osc message, typetags without the
+    leading ','. Arrays are passed as nested lists, typetags without data
+    (T, F, N, I) take an argument which is ignored.
+    """
+    cdef list tmp = list()
+    cdef list arrays = list()
+    cdef int index = 0
+    cdef int count
+
+    for segment in typetag_codec(typetags):
+        if type(segment) is tuple:
+            count = segment[1]
+            tmp.append(segment[0].pack(*args[index:index + count]))
+            index += count
+        elif segment in _encoders:
+            tmp.append(_encoders[segment](args[index]))
+            index += 1
+        elif segment in _constants:
+            index += 1
+        elif segment == "[":
+            arrays.append((args, index + 1))
+            args = args[index]
+            index = 0
+        else:
+            args, index = arrays.pop()
+    return "".join(tmp)
+
+
+cpdef int encoded_arguments_size(str typetags, args) except -1:
+    """Returns the byte size of the encoded arguments of an osc message,
+    typetags without the leading ','
+    """
+    cdef int size = 0
+    cdef list arrays = list()
+    cdef int index = 0
+
+    for segment in typetag_codec(typetags):
+        if type(segment) is tuple:
+            size += segment[0].size
+            index += segment[1]
+        elif segment == "[":
+            arrays.append((args, index + 1))
+            args = args[index]
+            index = 0
+        elif segment == "]":
+            args, index = arrays.pop()
+        else:
+            argument = args[index]
+            index += 1
+            if segment == "s" or segment == "S":
+                size += (len(argument) & ~3) + 4
+            elif segment == "b":
+                if argument is not None:
+                    size += 4 + ((len(argument) + 3) & ~3)
+            else:
+                size += _argument_sizes[segment]
+    return size
+
+
+cdef inline int _check_space(bytearray buffer, int end) except -1:
+    if end > PyByteArray_GET_SIZE(buffer):
+        raise ValueError("buffer too small, %d bytes needed" % end)
+    return 0
+
+
+cdef inline int _write(bytearray buffer, int offset, str data) except -1:
+    cdef int size = len(data)
+    _check_space(buffer, offset + size)
+    memcpy(PyByteArray_AS_STRING(buffer) + offset, PyBytes_AS_STRING(data),
+        size)
+    return offset + size
+
+
+cdef inline int _write_string(bytearray buffer, int offset, str argument) \
+    except -1:
+    cdef int size = len(argument)
+    cdef int padding = 4 - (size & 3)
+    cdef char *position
+
+    _check_space(buffer, offset + size + padding)
+    position = PyByteArray_AS_STRING(buffer) + offset
+
+    memcpy(position, PyBytes_AS_STRING(argument), size)
+    # reused buffers are not zeroed
+    memset(position + size, 0, padding)
+    return offset + size + padding
+
+
+cdef inline void _write_size(bytearray buffer, int offset, int size):
+    cdef unsigned char *position = \
+        <unsigned char *>PyByteArray_AS_STRING(buffer) + offset
+
+    position[0] = (size >> 24) & 0xff
+    position[1] = (size >> 16) & 0xff
+    position[2] = (size >> 8) & 0xff
+    position[3] = size & 0xff
+
+
+cpdef int encode_arguments_into(bytearray buffer, int offset, str typetags,
+    args) except -1:
+    """Writes the encoded arguments of an osc message into buffer and
+    returns the position after them, typetags without the leading ','.
+    Raises ValueError if the buffer is too small, OSCError for unknown
+    typetags or arguments not matching them.
+    """
+    cdef list arrays = list()
+    cdef int index = 0
+    cdef int count
+
+    for segment in typetag_codec(typetags):
+        if type(segment) is tuple:
+            codec = segment[0]
+            count = segment[1]
+            _check_space(buffer, offset + codec.size)
+            try:
+                codec.pack_into(buffer, offset, *args[index:index + count])
+            except StructError, error:
+                raise OSCError("invalid arguments for %r - %s" % (typetags,
+                    error))
+            offset += codec.size
+            index += count
+        elif segment == "s" or segment == "S":
+            offset = _write_string(buffer, offset, args[index])
+            index += 1
+        elif segment in _encoders:
+            offset = _write(buffer, offset, _encoders[segment](args[index]))
+            index += 1
+        elif segment in _constants:
+            index += 1
+        elif segment == "[":
+            arrays.append((args, index + 1))
+            args = args[index]
+            index = 0
+        else:
+            args, index = arrays.pop()
+    return offset
+
+
+cpdef tuple decode_osc(str data, int start, int end, int depth=0):
     """Converts a binary OSC message to a Python list.
+
+    Raises OSCError if bundles are nested deeper than MAX_BUNDLE_DEPTH.
     """
     #table = _table
     cdef int len_args
@@ -222,11 +548,17 @@ cpdef tuple decode_osc(str data, int start, int end):
         address = ""
 
     if address == "#bundle":
+        if depth >= MAX_BUNDLE_DEPTH:
+            raise OSCError("bundles nested deeper than %d" % MAX_BUNDLE_DEPTH)
         typetags, rest = decode_timetag(data, rest, end)
         while rest - end:
+            if end - rest < 4:
+                raise OSCError("truncated bundle element")
             length, rest = decode_int(data, rest, end)
             new_end = rest + length
-            args.append(decode_osc(data, rest, new_end))
+            if length <= 0 or new_end > end:
+                raise OSCError("invalid bundle element size %d" % length)
+            args.append(decode_osc(data, rest, new_end, depth + 1))
             rest = new_end
     elif rest - end:
         if typetags is None:
@@ -235,30 +567,83 @@ cpdef tuple decode_osc(str data, int start, int end):
         if not typetags.startswith(","):
             raise OSCError("OSCMessage's typetag-string lacks the magic ','")
 
+        args = decode_arguments(data, rest, end, typetags[1:])
         typetags = list(typetags[1:])
-        len_typetags = len(typetags)
-
-        for i in range(len_typetags):
-            typetag = typetags[i]
-            if typetag == "i":
-                argument, rest = decode_int(data, rest, end)
-            elif typetag == "s":
-                argument, rest = decode_string(data, rest, end)
-            elif typetag == "f":
-                argument, rest = decode_float(data, rest, end)
-            elif typetag == "b":
-                argument, rest = decode_blob(data, rest, end)
-            elif typetag == "d":
-                argument, rest = decode_double(data, rest, end)
-            elif typetag == "t":
-                argument, rest = decode_timetag(data, rest, end)
-            else:
-                raise OSCError("unknown typetag %r" % typetag)
-            args.append(argument)
 
     return address, typetags, args
 
 
+cdef inline int _read_size(str data, int offset):
+    cdef unsigned char *position = \
+        <unsigned char *>PyBytes_AS_STRING(data) + offset
+
+    return <int>((<unsigned int>position[0] << 24) | (position[1] << 16) |
+        (position[2] << 8) | position[3])
+
+
+cdef inline bint _is_bundle(str data, int offset):
+    return memcmp(PyBytes_AS_STRING(data) + offset, "#bundle\0", 8) == 0
+
+
+def walk_bundle(str data, int start=0, end=None, int max_depth=MAX_BUNDLE_DEPTH,
+    int max_elements=MAX_BUNDLE_ELEMENTS, bint views=False):
+    """Yields the messages of a binary bundle one at a time
+
+    Yields (timetag, offset, length) tuples of the messages or, if `views`
+    is True, (timetag, OSCMessageView) tuples. The timetag is the one of the
+    innermost enclosing bundle. Nested bundles are walked iteratively, so
+    the walk needs constant memory per level.
+
+    Raises OSCError if data is no bundle, `max_depth` levels of nesting or
+    `max_elements` messages and bundles are exceeded or an element does not
+    fit into its bundle.
+    """
+    cdef int rest
+    cdef int stop
+    cdef int length
+    cdef int elements = 0
+    cdef list stack
+
+    if end is None:
+        stop = len(data)
+    else:
+        stop = end
+    if start < 0 or stop > len(data) or stop - start < 16 or \
+        not _is_bundle(data, start):
+        raise OSCError("no osc bundle")
+    # (end, timetag) of the bundles enclosing the current position
+    stack = [(stop, decode_timetag(data, start + 8, stop)[0])]
+    rest = start + 16
+    while stack:
+        stop, timetag = stack[-1]
+        if rest == stop:
+            stack.pop()
+            continue
+        if stop - rest < 4:
+            raise OSCError("truncated bundle element")
+        length = _read_size(data, rest)
+        rest += 4
+        if length <= 0 or length > stop - rest:
+            raise OSCError("invalid bundle element size %d" % length)
+        elements += 1
+        if elements > max_elements:
+            raise OSCError("bundle has more than %d elements" % max_elements)
+        if length >= 8 and _is_bundle(data, rest):
+            if len(stack) >= max_depth:
+                raise OSCError("bundles nested deeper than %d" % max_depth)
+            if length < 16:
+                raise OSCError("truncated bundle")
+            stack.append((rest + length,
+                decode_timetag(data, rest + 8, rest + length)[0]))
+            rest += 16
+        else:
+            if views:
+                yield timetag, OSCMessageView(data, rest, rest + length)
+            else:
+                yield timetag, rest, length
+            rest += length
+
+
 cpdef tuple proxy_decode_osc(str data, int start, int end):
     """Converts a binary OSC message to a Python list.
     """
@@ -286,29 +671,269 @@ cpdef tuple proxy_decode_osc(str data, int start, int end):
         if not typetags.startswith(","):
             raise OSCError("OSCMessage's typetag-string lacks the magic ','")
 
+        args = decode_arguments(data, rest, end, typetags[1:])
         typetags = list(typetags[1:])
-        len_typetags = len(typetags)
-
-        for i in range(len_typetags):
-            typetag = typetags[i]
-            if typetag == "i":
-                argument, rest = decode_int(data, rest, end)
-            elif typetag == "s":
-                argument, rest = decode_string(data, rest, end)
-            elif typetag == "f":
-                argument, rest = decode_float(data, rest, end)
+
+    return address, typetags, args
+
+
+# byte sizes of the fixed size arguments
+_argument_sizes = {"i" : 4, "f" : 4, "d" : 8, "t" : 8, "h" : 8, "r" : 4,
+    "c" : 4, "m" : 4, "T" : 0, "F" : 0, "N" : 0, "I" : 0}
+
+
+class _ViewReader(object):
+    """Gives a memoryview the slicing and find of str, copying only the
+    bytes asked for"""
+
+    __slots__ = ("view",)
+
+    def __init__(self, view):
+        self.view = view
+
+    def __len__(self):
+        return len(self.view)
+
+    def __getitem__(self, index):
+        return self.view[index].tobytes()
+
+    def find(self, needle, start, end):
+        # searches in chunks, so only the bytes up to the match are copied
+        view = self.view
+        position = start
+        while position < end:
+            chunk_end = min(position + 64, end)
+            found = view[position:chunk_end].tobytes().find(needle)
+            if found >= 0:
+                return position + found
+            position = chunk_end
+        return -1
+
+
+def _to_str(data):
+    if isinstance(data, _ViewReader):
+        return data.view.tobytes()
+    return str(data)
+
+
+cdef class OSCMessageView(object):
+    """Read-only view of a binary osc message
+
+    Only the address and the typetag string are read when the view is
+    created. The offsets of the arguments are found on demand and an argument
+    is only converted to a python object when it's accessed. Indexing, len
+    and iteration work like on the args list returned by decode_osc.
+
+    The view pays off for consumers reading a few arguments of a message or
+    only routing by address and typetags. Iteration and values() decode all
+    arguments in one go and cost about as much as decode_osc, while
+    indexing every argument one by one is slower.
+
+    str and bytearray packets are read in place, memoryviews through a
+    reader copying only the bytes of the argument accessed, since python 2
+    memoryviews can't be searched. Other buffers are copied once.
+    :meth:`raw` returns a memoryview of a string or blob argument without
+    copying it.
+
+    Messages with arrays are decoded at once, since the arguments can't be
+    indexed by typetag. This copies packets which are no str.
+    """
+
+    cdef readonly object data
+    cdef readonly int end
+    cdef readonly str address
+    cdef readonly str typetags
+    cdef list offsets
+    cdef list args
+
+    def __init__(self, data, int start=0, end=None):
+        """Instantiate a new OSCMessageView
+
+        Raises OSCBundleFound if data is a bundle, OSCError if it's no valid
+        osc message.
+        """
+        cdef int address_end
+        cdef int typetags_end
+        cdef int rest
+
+        if isinstance(data, memoryview):
+            data = _ViewReader(data)
+        elif not hasattr(data, "find"):
+            data = str(data)
+        if end is None:
+            end = len(data)
+        if end - start <= 0:
+            raise OSCError("empty")
+        self.data = data
+        self.end = end
+
+        address_end = data.find("\0", start, end)
+        if address_end < 0:
+            raise OSCError("unterminated osc address")
+        address = str(data[start:address_end])
+        if address == "#bundle":
+            raise OSCBundleFound()
+        rest = (address_end + 4) & ~3
+
+        typetags = ","
+        if address.startswith(","):
+            typetags = address
+            address = ""
+        elif rest < self.end:
+            typetags_end = data.find("\0", rest, self.end)
+            if typetags_end < 0:
+                raise OSCError("unterminated typetag string")
+            typetags = str(data[rest:typetags_end])
+            rest = (typetags_end + 4) & ~3
+        if not typetags.startswith(","):
+            raise OSCError("OSCMessage's typetag-string lacks the magic ','")
+
+        self.address = address
+        self.typetags = typetags[1:]
+        self.offsets = [rest]
+        self.args = None
+        if "[" in typetags:
+            self.args = decode_arguments(_to_str(data), rest, end,
+                typetags[1:])
+
+    def __repr__(self):
+        return "OSCMessageView(%r, %r)" % (self.address, self.typetags)
+
+    def __len__(self):
+        if self.args is not None:
+            return len(self.args)
+        return len(self.typetags)
+
+    def __iter__(self):
+        return iter(self.values())
+
+    cdef int _offset(self, int index) except -1:
+        cdef list offsets = self.offsets
+        cdef int position
+
+        data = self.data
+        while len(offsets) <= index:
+            position = offsets[-1]
+            typetag = self.typetags[len(offsets) - 1]
+            size = _argument_sizes.get(typetag)
+            if size is not None:
+                position += size
+            elif typetag == "s" or typetag == "S":
+                position = data.find("\0", position, self.end)
+                if position < 0:
+                    raise OSCError("unterminated string argument")
+                position = (position + 4) & ~3
             elif typetag == "b":
-                argument, rest = decode_blob(data, rest, end)
-            elif typetag == "d":
-                argument, rest = decode_double(data, rest, end)
-            elif typetag == "t":
-                argument, rest = decode_timetag(data, rest, end)
+                if position + 4 > self.end:
+                    raise OSCError("truncated blob argument")
+                position += 4 + ((_int_struct.unpack(data[position:
+                    position + 4])[0] + 3) & ~3)
             else:
                 raise OSCError("unknown typetag %r" % typetag)
-            args.append(argument)
+            offsets.append(position)
+        return offsets[index]
 
-    return address, typetags, args
+    def __getitem__(self, index):
+        cdef int i
+        cdef int position
+        cdef int end
+        cdef int length = len(self.typetags)
+
+        if self.args is not None:
+            return self.args[index]
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(length))]
+        i = index
+        if i < 0:
+            i += length
+        if not 0 <= i < length:
+            raise IndexError("argument index out of range")
+
+        data = self.data
+        position = self._offset(i)
+        typetag = self.typetags[i]
+        size = _argument_sizes.get(typetag)
+        if size is not None and position + size > self.end:
+            raise OSCError("truncated osc message")
+        try:
+            fixed = _fixed_structs.get(typetag)
+            if fixed is not None:
+                return fixed.unpack(data[position:position + size])[0]
+            elif typetag == "s" or typetag == "S":
+                end = data.find("\0", position, self.end)
+                if end < 0:
+                    raise OSCError("unterminated string argument")
+                return str(data[position:end])
+            elif typetag == "b":
+                # like decode_blob including the padding
+                end = self._offset(i + 1)
+                if end > self.end:
+                    raise OSCError("truncated blob argument")
+                return str(data[position + 4:end])
+            elif typetag in _constants:
+                return _constants[typetag]
+            elif typetag in _decoders:
+                return _decoders[typetag](str(data[position:position + size]),
+                    0, size)[0]
+        except StructError:
+            raise OSCError("truncated osc message")
+        raise OSCError("unknown typetag %r" % typetag)
+
+    def raw(self, int index):
+        """Returns the bytes of a string or blob argument as memoryview
+        without copying them, excluding terminator, size and padding
+        """
+        cdef int position
+        cdef int end
+
+        if self.args is not None:
+            raise OSCError("raw is not supported for messages with arrays")
+        if index < 0:
+            index += len(self.typetags)
+        typetag = self.typetags[index]
+        position = self._offset(index)
+        if typetag == "s" or typetag == "S":
+            end = self.data.find("\0", position, self.end)
+            if end < 0:
+                raise OSCError("unterminated string argument")
+        elif typetag == "b":
+            if position + 4 > self.end:
+                raise OSCError("truncated blob argument")
+            end = position + 4 + _int_struct.unpack(self.data[position:
+                position + 4])[0]
+            if end > self.end:
+                raise OSCError("truncated blob argument")
+            position += 4
+        else:
+            raise OSCError("argument %d is no string or blob" % index)
+        data = self.data
+        if isinstance(data, _ViewReader):
+            return data.view[position:end]
+        return memoryview(data)[position:end]
+
+    def tags(self):
+        """Returns a list of the typetags
+        """
+        return list(self.typetags)
+
+    def values(self):
+        """Returns a list of all arguments
+
+        For str packets all arguments are decoded in one go like by
+        decode_osc, which is faster than indexing them one by one. Other
+        packets are indexed to avoid copying them.
+        """
+        if self.args is not None:
+            return list(self.args)
+        if type(self.data) is str:
+            return decode_arguments(self.data, self.offsets[0], self.end,
+                self.typetags)
+        return [self[i] for i in range(len(self.typetags))]
 
+    def items(self):
+        """Returns a list of (typetag, value) tuples of all arguments
+        """
+        return zip(self.typetags, self)
 
 
 cdef class OSCMessage(object):
@@ -568,34 +1193,112 @@ cdef class OSCMessage(object):
         """Returns the binary representation of the message
         """
 
-        cdef list tmp
-        cdef int len_typetags
-        cdef int i
+        typetags = "".join(self.typetags)
+        try:
+            arguments = encode_arguments(typetags, self.args)
+        except OSCError, error:
+            raise TypeError(str(error))
 
-        tmp = []
-        len_typetags = len(self.typetags)
-        for i in range(len_typetags):
-            typetag = self.typetags[i]
-            argument = self.args[i]
-            if typetag == "s":
-                tmp.append(encode_string(argument))
-            elif typetag == 'i':
-                tmp.append(pack(">i", argument))
-            elif typetag == 'f':
-                tmp.append(pack(">f", argument))
-            elif typetag == 'b':
-                tmp.append(encode_blob(argument))
-            elif typetag == 'd':
-                tmp.append(pack(">d", argument))
-            elif typetag == 't':
-                tmp.append(encode_timetag(argument))
-            else:
-                raise TypeError("unknown typetag %r" % typetag)
+        return "%s%s%s" % (encode_string(self.address),
+            encode_string("," + typetags), arguments)
+
+    cpdef int encoded_size(self) except -1:
+        """Returns the byte size of the binary representation
+        """
+        typetags = "".join(self.typetags)
+        try:
+            arguments_size = encoded_arguments_size(typetags, self.args)
+        except OSCError, error:
+            raise TypeError(str(error))
+        return ((len(self.address) & ~3) + 4 + ((len(typetags) + 1) & ~3) +
+            4 + arguments_size)
+
+    def encode_into(self, bytearray buffer, int offset=0):
+        """Writes the binary representation into a preallocated buffer and
+        returns the position after the message. Raises ValueError if the
+        buffer is too small, the bytes written up to then are undefined.
+        """
+        if offset < 0:
+            raise ValueError("negative offset %d" % offset)
+        return self._encode_into(buffer, offset)
+
+    cpdef int _encode_into(self, bytearray buffer, int offset) except -1:
+        typetags = "".join(self.typetags)
+        offset = _write_string(buffer, offset, self.address)
+        offset = _write_string(buffer, offset, "," + typetags)
+        try:
+            return encode_arguments_into(buffer, offset, typetags, self.args)
+        except OSCError, error:
+            raise TypeError(str(error))
 
-        return "%s%s%s" % (
-            encode_string(self.address),
-            encode_string(",%s" % "".join(self.typetags)),
-            "".join(tmp))
+
+
+cdef class OSCMessageTemplate(object):
+    """Encodes messages of one osc address and typetag string
+
+    The address and typetag string are encoded once, encode only packs the
+    arguments. If all arguments have a fixed width, that's a single
+    struct.pack call.
+    """
+
+    cdef readonly str address
+    cdef readonly str typetags
+    cdef readonly str prefix
+    cdef object fixed
+    cdef readonly int arguments
+    cdef public long used
+
+    def __init__(self, str address, str typetags):
+        """Instantiate a new OSCMessageTemplate, typetags without the
+        leading ','. Raises OSCError for unknown typetags.
+        """
+        self.address = address
+        self.typetags = typetags
+        self.prefix = encode_string(address) + encode_string("," + typetags)
+        codec = typetag_codec(typetags)
+        self.fixed = None
+        if len(codec) == 1 and type(codec[0]) is tuple:
+            self.fixed = codec[0][0]
+        self.arguments = argument_count(typetags)
+        self.used = 0
+
+    def __repr__(self):
+        return "OSCMessageTemplate(%r, %r)" % (self.address, self.typetags)
+
+    def encode(self, *args):
+        """Returns the binary representation of a message with the given
+        arguments
+        """
+        if len(args) != self.arguments:
+            raise TypeError("%r takes %d arguments, got %d" % (self,
+                self.arguments, len(args)))
+        if self.fixed is not None:
+            return self.prefix + self.fixed.pack(*args)
+        return self.prefix + encode_arguments(self.typetags, args)
+
+
+cpdef OSCMessageTemplate message_template(str address, str typetags):
+    """Returns a shared OSCMessageTemplate
+
+    Templates are cached per address and typetag string. The cache keeps the
+    1024 most recently used templates, if it's full the least recently used
+    quarter is dropped.
+    """
+    global _templates_clock
+    cdef OSCMessageTemplate template
+
+    _templates_clock += 1
+    key = (address, typetags)
+    template = _templates.get(key)
+    if template is None:
+        if len(_templates) >= _templates_size:
+            by_use = sorted(_templates.itervalues(),
+                key=attrgetter("used"))
+            for old in by_use[:_templates_size / 4]:
+                del _templates[(old.address, old.typetags)]
+        template = _templates[key] = OSCMessageTemplate(address, typetags)
+    template.used = _templates_clock
+    return template
 
 
 
@@ -615,7 +1318,7 @@ cdef class OSCBundle(object):
         The default timetag value (0) means 'immediately'
     """
 
-    cdef public float timetag
+    cdef public double timetag
     cdef public list args
 
     def __init__(self, timetag=0.0):
@@ -657,11 +1360,48 @@ cdef class OSCBundle(object):
         """Returns the binary representation of the message
         """
 
-        return "%s%s%s" % (
-            encode_string("#bundle"),
-            encode_timetag(self.timetag),
-            "".join([encode_blob(argument.encode_osc())
-                for argument in self.args]))
+        cdef bytearray buffer = bytearray(self.encoded_size())
+        self._encode_into(buffer, 0)
+        return str(buffer)
+
+    cpdef int encoded_size(self) except -1:
+        """Returns the byte size of the binary representation
+        """
+        cdef int size = 16
+        for element in self.args:
+            if type(element) is OSCMessage:
+                size += 4 + (<OSCMessage>element).encoded_size()
+            else:
+                size += 4 + element.encoded_size()
+        return size
+
+    def encode_into(self, bytearray buffer, int offset=0):
+        """Writes the binary representation into a preallocated buffer and
+        returns the position after the bundle. Raises ValueError if the
+        buffer is too small.
+
+        The tree is walked once and the sizes of the elements are filled in
+        after writing them. If the buffer is too small, the bytes written up
+        to then are undefined.
+        """
+        if offset < 0:
+            raise ValueError("negative offset %d" % offset)
+        return self._encode_into(buffer, offset)
+
+    cpdef int _encode_into(self, bytearray buffer, int offset) except -1:
+        cdef int end
+
+        offset = _write(buffer, offset, _bundle_address)
+        offset = _write(buffer, offset, encode_timetag(self.timetag))
+        for element in self.args:
+            _check_space(buffer, offset + 4)
+            if type(element) is OSCMessage:
+                end = (<OSCMessage>element)._encode_into(buffer, offset + 4)
+            else:
+                end = element._encode_into(buffer, offset + 4)
+            _write_size(buffer, offset, end - offset - 4)
+            offset = end
+        return offset
 
     def __richcmp__(self, other, cmd):
         if cmd == 2:
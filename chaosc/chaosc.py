@@ -22,21 +22,36 @@
 from __future__ import absolute_import
 
 import argparse
+import errno
 import os, os.path
+import select
+import signal
 import socket
 import sys
 import logging
 
 from collections import defaultdict
 from datetime import datetime
-from SocketServer import UDPServer, DatagramRequestHandler
+from SocketServer import UDPServer, DatagramRequestHandler, _eintr_retry
 from time import time, sleep
 from types import FunctionType, MethodType
 
 import chaosc._version
 
 from chaosc.argparser_groups import ArgParser
+from chaosc.federation import Federation, RELAY_ADDRESS
+from chaosc.handover import HandoverThread, receive_handover
+from chaosc.latency import WakeupStats, enable_busy_poll, pin_to_cpu, set_nice
 from chaosc.lib import resolve_host, logger
+from chaosc.osc_pattern import PatternDispatcher
+from chaosc.profiling import SamplingProfiler, default_profile_path
+from chaosc.sequencing import stamp, SEQUENCE_MASK
+from chaosc.ratelimit import RateLimiter, parse_rate, parse_prefix_rates
+from chaosc.recording import FlightRecorder, RecordingTap
+from chaosc.target_groups import TargetGroup
+from chaosc.target_health import (TargetHealth, enable_error_queue,
+    read_error_queue)
+from chaosc.tracing import Tracer
 
 
 try:
@@ -68,29 +83,119 @@ class Chaosc(UDPServer):
 
         logger.info("starting up chaosc-%s...",
             chaosc._version.__version__)
-        UDPServer.__init__(self, server_address, DatagramRequestHandler)
-        logger.info("binding to %s:%r",
-            self.socket.getsockname()[0], server_address[1])
+        UDPServer.__init__(self, server_address, DatagramRequestHandler,
+            bind_and_activate=False)
 
+        state = None
+        if args.takeover:
+            try:
+                fd, state = receive_handover(args.handover_path)
+            except (socket.error, OSError, ValueError, NotImplementedError), \
+                error:
+                logger.error("takeover from %r failed - %s. binding on my own",
+                    args.handover_path, error)
+            else:
+                self.socket.close()
+                self.socket = socket.fromfd(fd, self.address_family,
+                    socket.SOCK_DGRAM)
+                os.close(fd)
+                logger.info("took over socket %s:%r",
+                    *self.socket.getsockname()[:2])
+
+        if state is None:
+            try:
+                self.server_bind()
+                self.server_activate()
+            except:
+                self.server_close()
+                raise
+            logger.info("binding to %s:%r",
+                self.socket.getsockname()[0], server_address[1])
 
-        self.callbacks = {}
+
+        # patterns in incoming addresses are forwarded, not dispatched
+        self.dispatcher = PatternDispatcher(incoming_patterns=False)
 
         self.authenticate = args.authenticate
 
         self.socket.setblocking(0)
 
+        self.health = TargetHealth(args.suspend_after,
+            max_backoff=args.max_backoff)
+        self.error_queue = enable_error_queue(self.socket)
+
+        self.busy_poll = args.busy_poll
+        if self.busy_poll:
+            enable_busy_poll(self.socket)
+        self.wakeup_stats = WakeupStats()
+
+        self.tap = None
+        if args.record_path:
+            self.__start_recording(args.record_path)
+
+        self.profiler = SamplingProfiler()
+
+        self.tracer = None
+        if args.trace_every > 0:
+            self.tracer = Tracer(args.trace_every)
+
+        self.flight_recorder = None
+        if args.flight_size > 0:
+            self.flight_recorder = FlightRecorder(
+                int(args.flight_size * 1024 * 1024))
+
         self.targets = dict()
+        self.sequenced = dict()
+        self.loss_reports = dict()
+        self.groups = dict()
+        self.broadcast_targets = ()
+        self.balanced_groups = ()
         self.is_pause = False
+        self.handed_over = False
+
+        hub_id = args.hub_id or "%s:%d" % (socket.gethostname(),
+            self.socket.getsockname()[1])
+        self.federation = Federation(hub_id, args.max_hops)
+        self.federation.send_failed = self.__send_failed
+        self.peer_interest = [prefix for prefix in
+            args.peer_interest.split(",") if prefix]
+
+        self.rate_limiter = None
+        if args.source_rate or args.prefix_rates:
+            self.rate_limiter = RateLimiter(
+                args.source_rate and parse_rate(args.source_rate) or None,
+                parse_prefix_rates(args.prefix_rates or ""), args.overlimit)
 
         self.add_handler('/subscribe', self.__subscription_handler)
         self.add_handler('/unsubscribe', self.__unsubscription_handler)
         self.add_handler('/list', self.__list_handler)
         self.add_handler('/save', self.__save_subscriptions_handler)
         self.add_handler('/pause', self.__toggle_pause_hander)
-
-        if args.subscription_file:
+        self.add_handler('/group', self.__group_handler)
+        self.add_handler('/peer', self.__peer_handler)
+        self.add_handler('/unpeer', self.__unpeer_handler)
+        self.add_handler(RELAY_ADDRESS, self.__relay_handler)
+        self.add_handler('/limits', self.__limits_handler)
+        self.add_handler('/sequence', self.__sequence_handler)
+        self.add_handler('/loss_report', self.__loss_report_handler)
+        self.add_handler('/ping', self.__ping_handler)
+        self.add_handler('/latency', self.__latency_handler)
+        self.add_handler('/record', self.__record_handler)
+        self.add_handler('/dump_recent', self.__dump_recent_handler)
+        self.add_handler('/profile', self.__profile_handler)
+        self.add_handler('/traces', self.__traces_handler)
+
+        if state is not None:
+            self.set_state(state)
+        elif args.subscription_file:
             self.__load_subscriptions()
 
+        if args.peers:
+            for peer in args.peers.split(","):
+                host, port = peer.rsplit(":", 1)
+                self.__announce(resolve_host(host, int(port),
+                    self.address_family))
+
 
     def server_bind(self):
         # Override this method to be sure v6only is false: we want to
@@ -102,24 +207,24 @@ class Chaosc(UDPServer):
 
 
     def add_handler(self, address, callback):
-        """Registers a handler for an OSC-address
+        """Registers a handler for an OSC-address or OSC address pattern
 
         :param address: the OSC address-string. It should start with '/'
-            and may not contain '*'
+            and may contain the pattern characters '*?[]{}', but not ',# '
         :type address: str
 
         :param callback: is the procedure called for incoming OSCMessages
-            that equals `address`.
+            that match `address`.
         :type callback: method or function
 
         The callback-function must accept four arguments
         (str addr, tuple typetags, tuple args, tuple client_address),
         as returned by decode_osc.
         """
-        for chk in '*?,[]{}# ':
+        for chk in ',# ':
             if chk in address:
                 raise OSCError("OSC-address string may not contain any" \
-                    "characters in '*?,[]{}# '")
+                    "characters in ',# '")
 
         if type(callback) not in (FunctionType, MethodType):
             raise OSCError("Message callback '%s' is not callable" %
@@ -128,17 +233,19 @@ class Chaosc(UDPServer):
         if address != 'default':
             address = '/' + address.strip('/')
 
-        self.callbacks[address] = callback
+        try:
+            self.dispatcher.add(address, callback)
+        except ValueError, e:
+            raise OSCError(str(e))
 
 
     def remove_handler(self, address):
         """Remove the registered handler for the given OSC-address
 
-        :param address: the OSC address-string. It should start with '/'
-            and may not contain '*'
+        :param address: the OSC address-string or pattern as registered
         :type address: str
         """
-        del self.callbacks[address]
+        self.dispatcher.remove(address)
 
 
     def sendto(self, msg, address):
@@ -182,28 +289,146 @@ class Chaosc(UDPServer):
             return None
 
 
+    def serve_forever(self, poll_interval=0.5):
+        """Handle one request at a time until shutdown.
+
+        Works like :meth:`BaseServer.serve_forever`, but calls
+        :meth:`service_actions` after each iteration and wakes up in time
+        for conflated packets of the rate limiter.
+        """
+        if self.busy_poll:
+            return self.__serve_busy()
+
+        self._BaseServer__is_shut_down.clear()
+        try:
+            while not self._BaseServer__shutdown_request:
+                timeout = poll_interval
+                if self.rate_limiter is not None:
+                    deadline = self.rate_limiter.next_deadline(time())
+                    if deadline is not None and deadline < timeout:
+                        timeout = deadline
+                r, w, e = _eintr_retry(select.select, [self], [], [], timeout)
+                if self in r:
+                    self._handle_request_noblock()
+                self.service_actions()
+        finally:
+            self._BaseServer__shutdown_request = False
+            self._BaseServer__is_shut_down.set()
+
+
+    def __serve_busy(self):
+        """Like :meth:`serve_forever`, but spins on the non-blocking socket
+        instead of sleeping in select, trading a cpu core for wakeup latency.
+        """
+        self._BaseServer__is_shut_down.clear()
+        sock = self.socket
+        recvfrom = sock.recvfrom
+        max_packet_size = self.max_packet_size
+        packet_read = self.wakeup_stats.packet_read
+        try:
+            while not self._BaseServer__shutdown_request:
+                try:
+                    data, client_address = recvfrom(max_packet_size)
+                except socket.error, error:
+                    if error.errno == errno.ECONNREFUSED:
+                        self.__read_send_errors()
+                    elif error.errno not in (errno.EAGAIN, errno.EWOULDBLOCK,
+                        errno.EINTR):
+                        logger.error("receiving failed - %s", error)
+                    self.service_actions()
+                    continue
+                packet_read(sock)
+                request = (data, sock)
+                try:
+                    self.process_request(request, client_address)
+                except Exception:
+                    self.handle_error(request, client_address)
+                self.service_actions()
+        finally:
+            self._BaseServer__shutdown_request = False
+            self._BaseServer__is_shut_down.set()
+
+
+    def server_close(self):
+        self.__stop_recording()
+        UDPServer.server_close(self)
+
+
+    def get_request(self):
+        try:
+            data, client_address = self.socket.recvfrom(self.max_packet_size)
+        except socket.error, error:
+            # an icmp error for an earlier send
+            if error.errno == errno.ECONNREFUSED:
+                self.__read_send_errors()
+            raise
+        self.wakeup_stats.packet_read(self.socket)
+        return (data, self.socket), client_address
+
+
+    def service_actions(self):
+        """Called by :meth:`serve_forever` after each loop iteration
+
+        Forwards the conflated packets the rate limiter releases and
+        maintains the failing targets.
+        """
+        if self.rate_limiter is not None and self.rate_limiter.pending:
+            for packet, client_address, osc_address in \
+                self.rate_limiter.flush(time()):
+                self.__proxy_handler(packet, client_address, osc_address)
+
+        health = self.health
+        if health.failing:
+            now = time()
+            if now >= health.next_check:
+                if self.error_queue:
+                    self.__read_send_errors()
+                health.check(now)
+
+
     def process_request(self, request, client_address):
         """Handle incoming requests
         """
         packet = request[0]
         #print "packet", repr(packet), client_address
         len_packet = len(packet)
+        trace = self.tracer is not None and self.tracer.sample(request[1]) or None
         try:
             # using special decoding procedure for speed
             osc_address, typetags, args = proxy_decode_osc(packet, 0, len_packet)
         except OSCBundleFound:
             # by convention we only look for OSCMessages to control chaosc, we
             # can simply forward any bundles found - it's not for us
-            self.__proxy_handler(packet, client_address)
+            now = time()
+            if trace is not None:
+                trace.append(("decode", now))
+            if self.tap is not None:
+                self.tap.append(now, client_address, packet)
+            if self.flight_recorder is not None:
+                self.flight_recorder.add(now, client_address, packet)
+            if self.rate_limiter is None or self.rate_limiter.admit(packet,
+                client_address, None, now):
+                self.__proxy_handler(packet, client_address, None, trace)
         except OSCError, e:
             logger.exception(e)
         else:
-            try:
-                self.callbacks[osc_address](osc_address, typetags, args,
-                    client_address)
-            except KeyError:
-                if not self.is_pause:
-                    self.__proxy_handler(packet, client_address)
+            handlers = self.dispatcher.match(osc_address)
+            if handlers:
+                for handler in handlers:
+                    handler(osc_address, typetags, args, client_address)
+            else:
+                now = time()
+                if trace is not None:
+                    trace.append(("decode", now))
+                if self.tap is not None:
+                    self.tap.append(now, client_address, packet)
+                if self.flight_recorder is not None:
+                    self.flight_recorder.add(now, client_address, packet)
+                if not self.is_pause and (self.rate_limiter is None or
+                    self.rate_limiter.admit(packet, client_address,
+                        osc_address, now)):
+                    self.__proxy_handler(packet, client_address, osc_address,
+                        trace)
 
 
     def __str__(self):
@@ -221,6 +446,56 @@ class Chaosc(UDPServer):
 
         return out
 
+    def get_state(self):
+        """Returns the subscriptions, groups and pause state
+
+        The result only contains json serializable types and is used for
+        handing over to a new chaosc process.
+
+        :rtype: dict
+        """
+        return {
+            "targets" : [list(address) + list(target)
+                for address, target in self.targets.iteritems()],
+            "groups" : [(name, group.policy)
+                for name, group in self.groups.iteritems()],
+            "peers" : [list(address) + [peer.hub_id, peer.prefixes]
+                for address, peer in self.federation.peers.iteritems()],
+            "sequenced" : [list(address) + [sequence]
+                for address, sequence in self.sequenced.iteritems()],
+            # peers drop relayed packets with a sequence number they have
+            # seen, so the new process has to continue counting
+            "relay_sequence" : self.federation.sequence,
+            "is_pause" : self.is_pause}
+
+
+    def set_state(self, state):
+        """Restores the state returned by :meth:`get_state`
+
+        :param state: the state of another chaosc instance
+        :type state: dict
+        """
+        for name, policy in state["groups"]:
+            self.__set_group_policy(name.encode("utf-8"), policy.encode("utf-8"))
+        for target_host, target_port, label, host, port, group in state["targets"]:
+            group = group.encode("utf-8")
+            address = (target_host.encode("utf-8"), target_port)
+            if group:
+                self.groups[group].add(address)
+            self.targets[address] = (label.encode("utf-8"), host.encode("utf-8"), port, group)
+        for host, port, hub_id, prefixes in state.get("peers", ()):
+            self.federation.add_peer(hub_id.encode("utf-8"),
+                (host.encode("utf-8"), port),
+                [prefix.encode("utf-8") for prefix in prefixes])
+        for host, port, sequence in state.get("sequenced", ()):
+            self.sequenced[(host.encode("utf-8"), port)] = sequence
+        self.federation.sequence = state.get("relay_sequence", 0)
+        self.is_pause = state["is_pause"]
+        self.__update_routes()
+        logger.info("took over %d subscriptions and %d groups",
+            len(self.targets), len(self.groups))
+
+
     def __toggle_pause_hander(self, addr, typetags, args, client_address):
         self.is_pause = bool(args[0])
         response = OSCMessage("/OK")
@@ -246,13 +521,22 @@ class Chaosc(UDPServer):
             for line in lines:
                 data = line.strip("\n").split(";")
                 args = dict([arg.split("=") for arg in data])
+                group = args.get("group") or None
+                if "host" not in args:
+                    try:
+                        self.__set_group_policy(group, args["policy"])
+                    except (KeyError, ValueError), e:
+                        logger.error("invalid group definition %r by config", line)
+                    else:
+                        logger.info("group %r with policy %r by config", group, args["policy"])
+                    continue
                 host = args["host"]
                 port = int(args["port"])
                 label = args["label"]
                 try:
-                    self.__subscribe(host, port, label)
+                    self.__subscribe(host, port, label, group)
                 except KeyError, e:
-                    logger.error("subscription failed for %s:%d (%s) by config - already subscribed". host, port, label)
+                    logger.error("subscription failed for %s:%d (%s) by config - already subscribed", host, port, label)
                 else:
                     logger.info("subscription of %s:%d (%s) by config", host, port, label)
 
@@ -282,9 +566,13 @@ class Chaosc(UDPServer):
             logger.exception(e)
             return None
 
-        for (target_host, target_port), (label, host, port) in self.targets.iteritems():
-            line = "host={};port={};label={}\n".format(host, port, label)
-            sub_file.write(line)
+        for name, group in self.groups.iteritems():
+            sub_file.write("group={};policy={}\n".format(name, group.policy))
+        for (target_host, target_port), (label, host, port, group) in self.targets.iteritems():
+            line = "host={};port={};label={}".format(host, port, label)
+            if group:
+                line += ";group={}".format(group)
+            sub_file.write(line + "\n")
         sub_file.close()
         return path
 
@@ -324,29 +612,129 @@ class Chaosc(UDPServer):
             self.socket.sendto(response.encode_osc(), client_address)
 
 
-    def __proxy_handler(self,  packet, client_address):
+    def __proxy_handler(self,  packet, client_address, osc_address,
+        trace=None):
         """Sends incoming osc responses to subscribed receivers
+
+        `osc_address` is None for bundles. Interested peer hubs get the
+        packet too. `trace` is the trace of a sampled packet or None.
+        """
+
+        if trace is not None:
+            trace.append(("admit", time()))
+
+        self.__deliver_local(packet, osc_address, trace)
+
+        if self.federation.peers:
+            self.federation.forward(self.socket.sendto, packet, osc_address)
+
+        if trace is not None:
+            if self.federation.peers:
+                trace.append(("peers", time()))
+            self.tracer.finish(trace, osc_address, client_address)
+
+
+    def __deliver_local(self, packet, osc_address, trace=None):
+        """Sends a packet to the subscribed receivers
+
+        Ungrouped targets and members of broadcast groups get every packet,
+        the other groups select their receivers by policy. Packets for
+        sequenced targets are stamped with the next sequence number.
+        Suspended targets are skipped until their next probe is due. Groups
+        selecting a suspended member pick another one instead.
         """
 
         sendto = self.socket.sendto
+        sequenced = self.sequenced
+        suspended = self.health.suspended
+        may_send = self.health.may_send
+
+        for address in self.broadcast_targets:
+            if suspended and address in suspended and not may_send(address):
+                continue
+            data = packet
+            if sequenced and address in sequenced:
+                data = self.__stamp(packet, address)
+            try:
+                sendto(data, address)
+            except socket.error, error:
+                self.__send_failed(data, address, error)
+            if trace is not None:
+                trace.append(("send %s:%d" % address[:2], time()))
+
+        for group in self.balanced_groups:
+            selected = group.select(osc_address, packet)
+            if trace is not None:
+                trace.append(("route %s" % group.name, time()))
+            for address in selected:
+                if suspended and address in suspended and \
+                    not may_send(address):
+                    address = group.reselect(address, osc_address, packet,
+                        self.__unavailable)
+                    if address is None:
+                        continue
+                data = packet
+                if sequenced and address in sequenced:
+                    data = self.__stamp(packet, address)
+                try:
+                    sendto(data, address)
+                except socket.error, error:
+                    self.__send_failed(data, address, error)
+                if trace is not None:
+                    trace.append(("send %s:%d" % address[:2], time()))
+
+
+    def __unavailable(self, address):
+        suspended = self.health.suspended
+        return address in suspended and not self.health.may_send(address)
 
-        for address in self.targets.iterkeys():
+
+    def __send_failed(self, data, address, error):
+        """Counts a send error for the target it belongs to
+
+        With the error queue enabled, linux reports an icmp error of an
+        earlier packet as ECONNREFUSED of the next send, which did not go
+        out then. The queued errors name their targets, so they are read
+        and the send is retried once.
+        """
+        if error.errno == errno.ECONNREFUSED and self.error_queue:
+            self.__read_send_errors()
             try:
-                sendto(packet, address)
+                self.socket.sendto(data, address)
+                return
             except socket.error, error:
-                logger.exception(error)
                 pass
+        self.__target_failed(address, error.errno or errno.EIO)
+
+
+    def __read_send_errors(self):
+        for address, error_number in read_error_queue(self.socket):
+            self.__target_failed(address, error_number)
+
+
+    def __target_failed(self, address, error_number):
+        self.health.send_failed(address, error_number)
+        target = self.targets.get(address)
+        if target is not None and target[3]:
+            self.groups[target[3]].mark_failed(address)
+
+
+    def __stamp(self, packet, address):
+        sequence = self.sequenced[address] = \
+            (self.sequenced[address] + 1) & SEQUENCE_MASK
+        return stamp(packet, sequence)
 
 
     def __list_handler(self, addr, tags, data, client_address):
         """Sends a osc bundle with subscribed clients."""
 
         response = OSCBundle()
-        for (target_host, target_port), (label, host, port) in self.targets.iteritems():
+        for (target_host, target_port), (label, host, port, group) in self.targets.iteritems():
             message = OSCMessage("/li")
             message.appendTypedArg(target_host, "s")
             message.appendTypedArg(target_port, "i")
             message.appendTypedArg(label, "s")
+            message.appendTypedArg(group, "s")
             response.append(message)
 
         try:
@@ -355,12 +743,286 @@ class Chaosc(UDPServer):
                 pass
 
 
+    def __ping_handler(self, address, typetags, args, client_address):
+        """Answers a latency probe immediately
+
+        The provided 'typetags' starts with ["i", "d"] and 'args' with
+        [sequence number, send timestamp]. The "/pong" answer echoes them
+        and adds the time chaosc received the probe. Malformed probes are
+        dropped.
+        """
+        received = time()
+        if "".join(typetags[:2]) != "id":
+            return
+        response = OSCMessage("/pong")
+        response.appendTypedArg(args[0], "i")
+        response.appendTypedArg(args[1], "d")
+        response.appendTypedArg(received, "d")
+        try:
+            self.socket.sendto(response.encode_osc(), client_address)
+        except socket.error:
+            pass
+
+
+    def __latency_handler(self, address, typetags, args, client_address):
+        """Sends the measured wakeup latency
+
+        The response message "/latency" carries the number of samples, the
+        minimum, average, 99th percentile and maximum in microseconds and
+        whether busy polling is on.
+        """
+        samples, minimum, average, p99, maximum = self.wakeup_stats.summary()
+        response = OSCMessage("/latency")
+        response.appendTypedArg(samples, "i")
+        response.appendTypedArg(minimum, "f")
+        response.appendTypedArg(average, "f")
+        response.appendTypedArg(p99, "f")
+        response.appendTypedArg(maximum, "f")
+        response.appendTypedArg(int(self.busy_poll), "i")
+        try:
+            self.socket.sendto(response.encode_osc(), client_address)
+        except socket.error:
+            pass
+
+
+    def __start_recording(self, path):
+        self.__stop_recording()
+        self.tap = RecordingTap(path)
+        self.tap.start()
+        logger.info("recording to %r", self.tap.path)
+
+
+    def __stop_recording(self):
+        tap = self.tap
+        if tap is not None:
+            self.tap = None
+            tap.stop()
+
+
+    def __dump_path(self, name):
+        """Returns the path of a file name received in a control message
+
+        Control messages may only name files in the dump directory, so
+        whoever knows the token can not overwrite other files of the user
+        running chaosc.
+
+        :raises: ValueError if name is no plain file name
+        """
+        if not name or os.sep in name or (os.altsep and os.altsep in name) \
+            or ".." in name or "\0" in name:
+            raise ValueError("%r is no plain file name" % name)
+        return os.path.join(os.path.expanduser(self.args.dump_dir), name)
+
+
+    def __record_handler(self, address, typetags, args, client_address):
+        """Starts or stops recording incoming packets
+
+        The provided 'typetags' equals ["s", "s"] and 'args' contains
+        [authenticate, name]. The recording is written to the file name in
+        the dump directory. An empty name stops recording.
+        """
+        path = args[1]
+        try:
+            self.__authorize(args[0])
+            if path:
+                path = self.__dump_path(path)
+                self.__start_recording(path)
+            else:
+                self.__stop_recording()
+        except (ValueError, IOError), e:
+            logger.error("changing recording to %r failed - %s", path, e)
+            response = OSCMessage("/Failed")
+            response.appendTypedArg("record", "s")
+            response.appendTypedArg(str(e), "s")
+        else:
+            response = OSCMessage("/OK")
+            response.appendTypedArg("record", "s")
+        response.appendTypedArg(path, "s")
+        try:
+            self.socket.sendto(response.encode_osc(), client_address)
+        except socket.error:
+            pass
+
+
+    def dump_recent(self, path=None):
+        """Writes the packets kept by the flight recorder to a recording
+
+        :param path: file system path, defaults to a timestamped file in the
+            dump directory
+        :type path: str
+
+        :returns: the path of the recording
+        :rtype: str
+        :raises: ValueError if the flight recorder is disabled, IOError
+        """
+        if self.flight_recorder is None:
+            raise ValueError("flight recorder disabled")
+        if not path:
+            path = os.path.join(os.path.expanduser(self.args.dump_dir),
+                datetime.now().strftime("chaosc-recent-%Y%m%d-%H%M%S.chaosc-rec"))
+        count = self.flight_recorder.dump(path)
+        logger.info("dumped %d recent packets to %r", count, path)
+        return path
+
+
+    def __dump_recent_handler(self, address, typetags, args, client_address):
+        """Writes the packets kept by the flight recorder to disk
+
+        The provided 'typetags' equals ["s"] or ["s", "s"] and 'args' contains
+        [authenticate] or [authenticate, name] of a file in the dump
+        directory.
+        """
+        try:
+            self.__authorize(args[0])
+            path = None
+            if len(args) > 1 and args[1]:
+                path = self.__dump_path(args[1])
+            path = self.dump_recent(path)
+        except (ValueError, IOError), e:
+            logger.error("dumping recent packets failed - %s", e)
+            response = OSCMessage("/Failed")
+            response.appendTypedArg("dump_recent", "s")
+            response.appendTypedArg(str(e), "s")
+        else:
+            response = OSCMessage("/OK")
+            response.appendTypedArg("dump_recent", "s")
+            response.appendTypedArg(path, "s")
+        try:
+            self.socket.sendto(response.encode_osc(), client_address)
+        except socket.error:
+            pass
+
+
+    def toggle_profiling(self, path=None, duration=60.):
+        """Starts the sampling profiler or stops it and writes the profile
+
+        :param path: where to write the profile, defaults to a timestamped
+            file in the dump directory
+        :type path: str
+
+        :param duration: seconds until profiling stops on its own
+        :type duration: float
+
+        :returns: the path of the profile
+        :rtype: str
+        :raises: ValueError, IOError
+        """
+        if self.profiler.running:
+            return self.profiler.stop()
+        if not path:
+            path = default_profile_path(self.args.dump_dir, "chaosc")
+        self.profiler.start(path, duration)
+        return self.profiler.path
+
+
+    def __profile_handler(self, address, typetags, args, client_address):
+        """Starts or stops the sampling profiler
+
+        The provided 'typetags' equals ["s", "s"] followed by an optional "s"
+        and "f" or "i". 'args' contains [authenticate, "start" or "stop",
+        name of the profile in the dump directory, duration in seconds].
+        """
+        command = args[1]
+        try:
+            self.__authorize(args[0])
+            if command not in ("start", "stop"):
+                raise ValueError("unknown command %r" % command)
+            if (command == "start") == self.profiler.running:
+                raise ValueError("profiler %s" % (self.profiler.running and
+                    "already running" or "not running"))
+            path = None
+            if command == "start" and len(args) > 2 and args[2]:
+                path = self.__dump_path(args[2])
+            path = self.toggle_profiling(path, len(args) > 3 and args[3] or 60.)
+        except (ValueError, IOError), e:
+            logger.error("profile %s failed - %s", command, e)
+            response = OSCMessage("/Failed")
+            response.appendTypedArg("profile", "s")
+            response.appendTypedArg(str(e), "s")
+        else:
+            response = OSCMessage("/OK")
+            response.appendTypedArg("profile", "s")
+            response.appendTypedArg(command, "s")
+            response.appendTypedArg(path, "s")
+        try:
+            self.socket.sendto(response.encode_osc(), client_address)
+        except socket.error:
+            pass
+
+
+    def __traces_handler(self, address, typetags, args, client_address):
+        """Sends the per stage latency of the sampled packets and
+        optionally writes the traces to a file
+
+        The provided 'typetags' equals ["s"] or ["s", "s"] and 'args' contains
+        [authenticate] or [authenticate, name]. The response is a bundle of
+        "/trace" messages, one per stage with typetags "siff": stage, number
+        of samples, median and 99th percentile in microseconds. If a name is
+        given, the traces are written as json lines to this file in the dump
+        directory.
+        """
+        try:
+            self.__authorize(args[0])
+            if self.tracer is None:
+                raise ValueError("tracing disabled")
+            if len(args) > 1 and args[1]:
+                path = self.__dump_path(args[1])
+                count = self.tracer.dump(path)
+                logger.info("wrote %d traces to %r", count, path)
+        except (ValueError, IOError), e:
+            logger.error("exporting traces failed - %s", e)
+            response = OSCMessage("/Failed")
+            response.appendTypedArg("traces", "s")
+            response.appendTypedArg(str(e), "s")
+        else:
+            response = OSCBundle()
+            for stage, samples, median, p99 in self.tracer.summary():
+                message = OSCMessage("/trace")
+                message.appendTypedArg(stage, "s")
+                message.appendTypedArg(samples, "i")
+                message.appendTypedArg(median, "f")
+                message.appendTypedArg(p99, "f")
+                response.append(message)
+        try:
+            self.socket.sendto(response.encode_osc(), client_address)
+        except socket.error:
+            pass
+
+
     def __authorize(self, authenticate):
         if authenticate != self.authenticate:
             raise ValueError("unauthorized access attempt!")
 
 
-    def __subscribe(self, host, port, label=None):
+    def __update_routes(self):
+        """Rebuilds the receiver lists used by :meth:`__proxy_handler`"""
+
+        broadcast_targets = list()
+        balanced_groups = list()
+        for address, (label, host, port, group) in self.targets.iteritems():
+            if not group:
+                broadcast_targets.append(address)
+        for group in self.groups.itervalues():
+            if group.policy == "broadcast":
+                broadcast_targets.extend(group.members)
+            else:
+                balanced_groups.append(group)
+        self.broadcast_targets = tuple(broadcast_targets)
+        self.balanced_groups = tuple(balanced_groups)
+
+
+    def __set_group_policy(self, name, policy):
+        if not name:
+            raise ValueError("empty group name")
+
+        try:
+            self.groups[name].set_policy(policy)
+        except KeyError:
+            self.groups[name] = TargetGroup(name, policy)
+        self.__update_routes()
+
+
+    def __subscribe(self, host, port, label=None, group=None):
         try:
             target_host, target_port = resolve_host(host, port, self.address_family)
         except socket.gaierror:
@@ -370,7 +1032,13 @@ class Chaosc(UDPServer):
         if (target_host, target_port) in self.targets:
             raise KeyError("already subscribed")
 
-        self.targets[(target_host, target_port)] = (label is not None and label or "", host, port)
+        if group:
+            if group not in self.groups:
+                self.groups[group] = TargetGroup(group)
+            self.groups[group].add((target_host, target_port))
+
+        self.targets[(target_host, target_port)] = (label is not None and label or "", host, port, group or "")
+        self.__update_routes()
 
 
     def __unsubscribe(self, host, port):
@@ -378,17 +1046,23 @@ class Chaosc(UDPServer):
             target_host, target_port = resolve_host(host, port, self.address_family)
         except socket.gaierror:
             logger.info("no address associated with hostname %r. using unresolved hostname for unsubscription", host)
-            label = self.targets.pop((host, port))
-        else:
-            label = self.targets.pop((target_host, target_port))
+            target_host, target_port = host, port
+
+        label, host, port, group = self.targets.pop((target_host, target_port))
+        if group:
+            self.groups[group].remove((target_host, target_port))
+        self.sequenced.pop((target_host, target_port), None)
+        self.health.remove((target_host, target_port))
+        self.__update_routes()
 
 
     def __subscription_handler(self, addr, typetags, args, client_address):
         """handles a target subscription.
 
-        The provided 'typetags' equals ["s", "i", "s", "s"] and
-        'args' contains [host, portnumber, authenticate, label]
-        or ["s", "i", "s"] and 'args' contains [host, portnumber, authenticate]
+        The provided 'typetags' equals ["s", "i", "s", "s", "s"] and
+        'args' contains [host, portnumber, authenticate, label, group].
+        label and group are optional. A target in a group only receives what
+        the group's delivery policy selects for it.
 
         only subscription requests with valid host and authenticate will be granted.
         """
@@ -410,10 +1084,11 @@ class Chaosc(UDPServer):
                 pass
             return
 
-        label = len(args) == 4 and args[3] or None
+        label = len(args) >= 4 and args[3] or None
+        group = len(args) >= 5 and args[4] or None
 
         try:
-            self.__subscribe(host, port, label)
+            self.__subscribe(host, port, label, group)
         except KeyError:
             logger.error("subscription of '%s:%d' failed - already subscribed",
                 host, port)
@@ -432,8 +1107,8 @@ class Chaosc(UDPServer):
                 self.socket.sendto(response.encode_osc(), client_address)
             except socket.error:
                 pass
-            logger.info("subscription of '%s:%d (%s)' by %r",
-                host, port, label, client_address)
+            logger.info("subscription of '%s:%d (%s)' in group %r by %r",
+                host, port, label, group, client_address)
 
 
 
@@ -486,6 +1161,220 @@ class Chaosc(UDPServer):
                 pass
 
 
+    def __group_handler(self, address, typetags, args, client_address):
+        """Creates a target group or changes its delivery policy
+
+        The provided 'typetags' equals ["s", "s", "s"] and
+        'args' contains [group, policy, authenticate]
+
+        Only requests with a valid authenticate and policy will be granted.
+        """
+        name, policy = args[:2]
+        try:
+            self.__authorize(args[2])
+        except ValueError, e:
+            logger.error("setting policy of group %r failed - not authorized",
+                name)
+            response = OSCMessage("/Failed")
+            response.appendTypedArg("group", "s")
+            response.appendTypedArg("not authorized", "s")
+            response.appendTypedArg(name, "s")
+            response.appendTypedArg(policy, "s")
+            try:
+                self.socket.sendto(response.encode_osc(), client_address)
+            except socket.error:
+                pass
+            return
+
+        try:
+            self.__set_group_policy(name, policy)
+        except ValueError, e:
+            logger.error("setting policy of group %r failed - %s", name, e)
+            response = OSCMessage("/Failed")
+            response.appendTypedArg("group", "s")
+            response.appendTypedArg(str(e), "s")
+            response.appendTypedArg(name, "s")
+            response.appendTypedArg(policy, "s")
+        else:
+            logger.info("set policy of group %r to %r by %r",
+                name, policy, client_address)
+            response = OSCMessage("/OK")
+            response.appendTypedArg("group", "s")
+            response.appendTypedArg(name, "s")
+            response.appendTypedArg(policy, "s")
+        try:
+            self.socket.sendto(response.encode_osc(), client_address)
+        except socket.error:
+            pass
+
+
+    def __announce(self, address):
+        """Asks the hub at address to forward the packets matching our
+        peer_interest"""
+
+        message = OSCMessage("/peer")
+        message.appendTypedArg(self.federation.hub_id, "s")
+        message.appendTypedArg(self.authenticate, "s")
+        for prefix in self.peer_interest:
+            message.appendTypedArg(prefix, "s")
+        try:
+            self.socket.sendto(message.encode_osc(), address)
+        except socket.error, error:
+            logger.error("announcing to peer %r failed - %s", address, error)
+        else:
+            logger.info("announced to peer %r with interest %r", address,
+                self.peer_interest)
+
+
+    def __peer_handler(self, address, typetags, args, client_address):
+        """Handles the announcement of a peer hub
+
+        The provided 'typetags' equals ["s", "s", "s", ...] and
+        'args' contains [hub_id, authenticate, prefix, ...]
+
+        The sender of this message is registered as peer hub and gets all
+        packets starting with the given osc address prefixes. Peers we don't
+        know yet get our own announcement back, so restarted hubs rejoin.
+        No response is sent.
+        """
+        try:
+            self.__authorize(args[1])
+        except ValueError, e:
+            logger.error("peering with %r failed - not authorized",
+                client_address)
+            return
+
+        if self.federation.add_peer(args[0], client_address, args[2:]):
+            self.__announce(client_address)
+        logger.info("peering with %r (%s) for %r", client_address, args[0],
+            args[2:])
+
+
+    def __unpeer_handler(self, address, typetags, args, client_address):
+        """Handles the departure of a peer hub
+
+        The provided 'typetags' equals ["s", "s"] and
+        'args' contains [hub_id, authenticate]
+        """
+        try:
+            self.__authorize(args[1])
+            self.federation.remove_peer(client_address)
+        except ValueError, e:
+            logger.error("unpeering of %r failed - not authorized",
+                client_address)
+        except KeyError:
+            logger.error("unpeering of %r failed - not peered", client_address)
+        else:
+            logger.info("unpeering of %r (%s)", client_address, args[0])
+
+
+    def __relay_handler(self, address, typetags, args, client_address):
+        """Delivers packets relayed by peer hubs"""
+
+        result = self.federation.relay(self.socket.sendto, typetags, args,
+            client_address)
+        if result is not None and not self.is_pause:
+            self.__deliver_local(*result)
+
+
+    def __limits_handler(self, address, typetags, args, client_address):
+        """Sends a osc bundle with the rate limiter counters
+
+        Each message "/rl" has the typetags ["s", "i", "i", "i"] and
+        contains [source host or prefix, passed, dropped, conflated].
+        """
+
+        response = OSCBundle()
+        if self.rate_limiter is not None:
+            for name, passed, dropped, conflated in self.rate_limiter.stats():
+                message = OSCMessage("/rl")
+                message.appendTypedArg(name, "s")
+                message.appendTypedArg(min(passed, 0x7fffffff), "i")
+                message.appendTypedArg(min(dropped, 0x7fffffff), "i")
+                message.appendTypedArg(min(conflated, 0x7fffffff), "i")
+                response.append(message)
+
+        try:
+            self.socket.sendto(response.encode_osc(), client_address)
+        except socket.error:
+            pass
+
+
+    def __sequence_handler(self, address, typetags, args, client_address):
+        """Turns sequence numbering for a target on or off
+
+        The provided 'typetags' equals ["s", "i", "s", "i"] and
+        'args' contains [host, portnumber, authenticate, enabled]
+
+        Packets to sequenced targets are wrapped in a bundle which starts
+        with the message "/chaosc/seq ,i number", see
+        :mod:`chaosc.sequencing`. Only subscribed targets can be sequenced.
+        """
+        host, port = args[:2]
+        enabled = bool(args[3])
+        try:
+            self.__authorize(args[2])
+            try:
+                target = resolve_host(host, port, self.address_family)
+            except socket.gaierror:
+                target = host, port
+            if target not in self.targets:
+                raise KeyError("not subscribed")
+        except ValueError, e:
+            logger.error("sequencing of '%s:%d' failed - not authorized",
+                host, port)
+            reason = "not authorized"
+        except KeyError, e:
+            logger.error("sequencing of '%s:%d' failed - not subscribed",
+                host, port)
+            reason = "not subscribed"
+        else:
+            if enabled:
+                self.sequenced.setdefault(target, 0)
+            else:
+                self.sequenced.pop(target, None)
+            logger.info("sequencing of '%s:%d' set to %r by %r",
+                host, port, enabled, client_address)
+            reason = None
+
+        if reason is None:
+            response = OSCMessage("/OK")
+            response.appendTypedArg("sequence", "s")
+        else:
+            response = OSCMessage("/Failed")
+            response.appendTypedArg("sequence", "s")
+            response.appendTypedArg(reason, "s")
+        response.appendTypedArg(host, "s")
+        response.appendTypedArg(port, "i")
+        try:
+            self.socket.sendto(response.encode_osc(), client_address)
+        except socket.error:
+            pass
+
+
+    def __loss_report_handler(self, address, typetags, args, client_address):
+        """Stores and logs the loss report of a sequenced target
+
+        The provided 'typetags' equals ["i", "i", "i", "i"] and
+        'args' contains [received, lost, reordered, duplicates] as counted
+        by the target since its start, modulo 2 ** 31. No response is sent.
+        Malformed reports and reports of hosts which are no subscribed
+        targets are dropped.
+        """
+        if "".join(typetags) != "iiii":
+            logger.error("malformed loss report of %r - typetags %r",
+                client_address, "".join(typetags))
+            return
+        if client_address[:2] not in self.targets:
+            logger.error("loss report of %r dropped - not subscribed",
+                client_address)
+            return
+        self.loss_reports[client_address] = (time(),) + tuple(args)
+        logger.info("loss report of %r: sent %r, received %d, lost %d, "
+            "reordered %d, duplicates %d", client_address,
+            self.sequenced.get(client_address[:2]), *args)
+
+
 def main():
     """configures cli argument parser and starts chaosc"""
     arg_parser = ArgParser("chaosc")
@@ -495,11 +1384,94 @@ def main():
         help="load subscriptions from the specified file")
     arg_parser.add_argument(main_group, '-a', '--authenticate', type=str, default="sekret",
         help='token to authorize interaction with chaosc, default="sekret"')
+    arg_parser.add_argument(main_group, '-U', '--handover_path',
+        help='unix socket path where a new chaosc process can take over the socket and subscriptions of this one')
+    arg_parser.add_argument(main_group, '-t', '--takeover', action="store_true",
+        help='take over socket and subscriptions from the chaosc process listening on handover_path instead of binding')
+
+    arg_parser.add_argument(main_group, '-I', '--hub_id',
+        help='unique id of this hub among its peers, defaults to "hostname:port"')
+    arg_parser.add_argument(main_group, '-E', '--peers',
+        help='comma separated list of host:port of peer hubs to announce to')
+    arg_parser.add_argument(main_group, '-i', '--peer_interest', default="",
+        help='comma separated list of osc address prefixes peers should forward to us, default is none, "/" for all')
+    arg_parser.add_argument(main_group, '-M', '--max_hops', type=int, default=4,
+        help='how many hubs a packet may traverse, default=4')
+
+    arg_parser.add_argument(main_group, '-R', '--source_rate',
+        help='token bucket limit per source host as "RATE[:BURST]" in packets per second')
+    arg_parser.add_argument(main_group, '-X', '--prefix_rates',
+        help='comma separated token bucket limits per osc address prefix as "PREFIX=RATE[:BURST]"')
+    arg_parser.add_argument(main_group, '-O', '--overlimit', default="drop",
+        choices=("drop", "conflate"),
+        help='what to do with packets over the limit: "drop" them or "conflate" to the latest packet per source and osc address, default="drop"')
+    arg_parser.add_argument(main_group, '-W', '--record_path',
+        help='record all incoming packets with arrival time and source to this file')
+    arg_parser.add_argument(main_group, '-F', '--flight_size', type=float, default=16.,
+        help='MiB of recent packets kept in memory for /dump_recent and SIGUSR1, 0 disables it, default=16')
+    arg_parser.add_argument(main_group, '-G', '--dump_dir', default="~/.chaosc",
+        help='directory for dumps of recent packets, default="~/.chaosc"')
+    arg_parser.add_argument(main_group, '-T', '--trace_every', type=int, default=0,
+        help='trace the pipeline stages of one in TRACE_EVERY packets, 0 disables tracing, default=0')
+    arg_parser.add_argument(main_group, '-B', '--busy_poll', action="store_true",
+        help='latency mode: spin on the socket instead of sleeping, uses a whole cpu core')
+    arg_parser.add_argument(main_group, '-c', '--cpu', type=int,
+        help='pin chaosc to this cpu core, linux only')
+    arg_parser.add_argument(main_group, '-N', '--nice', type=int, default=0,
+        help='niceness increment, negative values raise the priority and need privileges, default=0')
+    arg_parser.add_argument(main_group, '-K', '--suspend_after', type=int, default=5,
+        help='send errors until a target is suspended and probed with exponential backoff, default=5')
+    arg_parser.add_argument(main_group, '-Y', '--max_backoff', type=float, default=60.,
+        help='upper bound of seconds between probes of a suspended target, default=60')
 
     args = arg_parser.finalize()
 
+    if args.takeover and not args.handover_path:
+        arg_parser.arg_parser.error("--takeover needs --handover_path")
+
+    if args.cpu is not None:
+        try:
+            pin_to_cpu(args.cpu)
+        except (OSError, ValueError), error:
+            logger.error("pinning to cpu %d failed - %s", args.cpu, error)
+    if args.nice:
+        try:
+            set_nice(args.nice)
+        except OSError, error:
+            logger.error("changing niceness by %d failed - %s", args.nice,
+                error)
+
     server = Chaosc(args)
-    server.serve_forever()
+
+    def dump_recent(signum, frame):
+        try:
+            server.dump_recent()
+        except (ValueError, IOError), error:
+            logger.error("dumping recent packets failed - %s", error)
+    signal.signal(signal.SIGUSR1, dump_recent)
+
+    def toggle_profiling(signum, frame):
+        try:
+            server.toggle_profiling()
+        except (ValueError, IOError), error:
+            logger.error("toggling the profiler failed - %s", error)
+    signal.signal(signal.SIGUSR2, toggle_profiling)
+
+    handover = None
+    if args.handover_path:
+        handover = HandoverThread(server, args.handover_path)
+        handover.start()
+
+    while True:
+        server.serve_forever()
+        if handover is None:
+            break
+        # serve_forever returned for a handover attempt
+        handover.attempted.wait()
+        handover.attempted.clear()
+        if server.handed_over:
+            break
+    server.server_close()
 
 if __name__ == '__main__':
     main()
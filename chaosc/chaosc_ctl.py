@@ -26,17 +26,19 @@ import os.path
 import threading
 
 from datetime import datetime
-from time import sleep
+from time import sleep, time
 
 from chaosc.simpleOSCServer import SimpleOSCServer
 
 try:
-    from chaosc.c_osc_lib import OSCMessage
+    from chaosc.c_osc_lib import OSCMessage, message_template
 except ImportError:
-    from chaosc.osc_lib  import OSCMessage
+    from chaosc.osc_lib  import OSCMessage, message_template
 
 from chaosc.argparser_groups import ArgParser
+from chaosc.latency import summarize
 from chaosc.lib import logger
+from chaosc.target_groups import POLICIES
 
 class OSCCTLServer(SimpleOSCServer):
     def __init__(self, args):
@@ -58,12 +60,23 @@ class OSCCTLServer(SimpleOSCServer):
             msg.appendTypedArg(args.host, "s")
             msg.appendTypedArg(args.port, "i")
             msg.appendTypedArg(args.authenticate, "s")
-            if args.subscriber_label:
-                msg.appendTypedArg(args.subscriber_label, "s")
+            if args.subscriber_label or args.group:
+                msg.appendTypedArg(args.subscriber_label or "", "s")
+            if args.group:
+                msg.appendTypedArg(args.group, "s")
             self.sendto(msg, self.chaosc_address)
             logger.info("subscribe %r:%r to %r:%r",
                 args.host, args.port, args.chaosc_host, args.chaosc_port)
 
+        elif "group" == args.subparser_name:
+            msg = OSCMessage("/group")
+            msg.appendTypedArg(args.name, "s")
+            msg.appendTypedArg(args.policy, "s")
+            msg.appendTypedArg(args.authenticate, "s")
+            self.sendto(msg, self.chaosc_address)
+            logger.info("set policy of group %r to %r on %r:%r",
+                args.name, args.policy, args.chaosc_host, args.chaosc_port)
+
         elif "list" == args.subparser_name:
             msg = OSCMessage("/list")
             msg.appendTypedArg(args.client_host, "s")
@@ -73,6 +86,40 @@ class OSCCTLServer(SimpleOSCServer):
             msg = OSCMessage("/save")
             msg.appendTypedArg(args.authenticate, "s")
             self.sendto(msg, self.chaosc_address)
+        elif "ping" == args.subparser_name:
+            self.rtts = list()
+            self.probes = 0
+            self.addMsgHandler("/pong", self.pong_handler)
+            self.ping_thread = threading.Thread(target=self.ping)
+            self.ping_thread.daemon = True
+            self.ping_thread.start()
+        elif "record" == args.subparser_name:
+            msg = OSCMessage("/record")
+            msg.appendTypedArg(args.authenticate, "s")
+            msg.appendTypedArg(args.path, "s")
+            self.sendto(msg, self.chaosc_address)
+        elif "dump_recent" == args.subparser_name:
+            msg = OSCMessage("/dump_recent")
+            msg.appendTypedArg(args.authenticate, "s")
+            if args.path:
+                msg.appendTypedArg(args.path, "s")
+            self.sendto(msg, self.chaosc_address)
+        elif "profile" == args.subparser_name:
+            msg = OSCMessage("/profile")
+            msg.appendTypedArg(args.authenticate, "s")
+            msg.appendTypedArg(args.command, "s")
+            msg.appendTypedArg(args.path, "s")
+            msg.appendTypedArg(args.duration, "f")
+            self.sendto(msg, self.chaosc_address)
+        elif "traces" == args.subparser_name:
+            msg = OSCMessage("/traces")
+            msg.appendTypedArg(args.authenticate, "s")
+            if args.path:
+                msg.appendTypedArg(args.path, "s")
+            self.sendto(msg, self.chaosc_address)
+        elif "latency" == args.subparser_name:
+            msg = OSCMessage("/latency")
+            self.sendto(msg, self.chaosc_address)
         elif "pause" == args.subparser_name:
             msg = OSCMessage("/pause")
             msg.appendTypedArg(args.pause_state, "i")
@@ -82,15 +129,55 @@ class OSCCTLServer(SimpleOSCServer):
             sys.exit(1)
 
     def stats_handler(self, name, desc, messages, packet, client_address):
-        if name == "#bundle":
+        if name == "#bundle" and self.args.subparser_name == "traces":
+            print "%-30s %8s %10s %10s" % ("stage", "samples", "p50 us", "p99 us")
+            for osc_address, typetags, args in messages:
+                print "%-30s %8d %10.1f %10.1f" % tuple(args[:4])
+        elif name == "#bundle":
             logger.info("subscribed client count: %d", len(messages))
             for osc_address, typetags, args in messages:
-                logger.info("    host=%r, port=%r, label=%r", args[0], args[1], args[2])
+                logger.info("    host=%r, port=%r, label=%r, group=%r", args[0], args[1], args[2], args[3])
+        elif name == "/latency":
+            print "%d samples, wakeup latency min/avg/p99/max = %.1f/%.1f/%.1f/%.1f us, busy polling %s" % (
+                messages[0], messages[1], messages[2], messages[3], messages[4],
+                messages[5] and "on" or "off")
         else:
             logger.info("chaosc returned status %r with args %r", name, messages)
 
         sys.exit(0)
 
+    def ping(self):
+        """Sends "/ping" probes with the requested rate, then prints the
+        round trip times and the loss"""
+        interval = 1. / self.args.rate
+        template = message_template("/ping", "id")
+        start = time()
+        for sequence in xrange(self.args.count):
+            delay = start + sequence * interval - time()
+            if delay > 0:
+                sleep(delay)
+            self.socket.sendto(template.encode(sequence, time()),
+                self.chaosc_address)
+            self.probes += 1
+        sleep(self.args.wait)
+
+        answered, minimum, average, p99, maximum = summarize(self.rtts, 1000.)
+        lost = self.probes - answered
+        print "%d probes sent, %d answered, %.1f%% loss" % (self.probes,
+            answered, lost * 100. / max(self.probes, 1))
+        if answered:
+            print "rtt min/avg/p99/max = %.3f/%.3f/%.3f/%.3f ms" % (
+                minimum, average, p99, maximum)
+        sys.stdout.flush()
+        os._exit(lost and 1 or 0)
+
+    def pong_handler(self, name, desc, messages, packet, client_address):
+        received = time()
+        sequence, sent, hub_received = messages[:3]
+        self.rtts.append(received - sent)
+        logger.info("pong %d: rtt %.3f ms, to chaosc %.3f ms", sequence,
+            (received - sent) * 1000., (hub_received - sent) * 1000.)
+
     def handle_error(self, request, client_address):
         """Handle an error gracefully.  May be overridden.
 
@@ -120,9 +207,21 @@ def main():
         type=int, help='port number')
     arg_parser.add_argument(parser_subscribe, '-l', '--subscriber_label',
         help='the string to use for subscription label, default="chaosc_transcoder"')
+    arg_parser.add_argument(parser_subscribe, '-g', '--group',
+        help='the target group to join, default=None')
     arg_parser.add_argument(parser_subscribe, '-a', '--authenticate', type=str, default="sekret",
         help='token to authorize interaction with chaosc, default="sekret"')
 
+    parser_group = subparsers.add_parser('group',
+        help='create a target group or change its delivery policy')
+    arg_parser.add_argument(parser_group, 'name', metavar="name",
+        type=str, help='group name')
+    arg_parser.add_argument(parser_group, 'policy', metavar="policy",
+        type=str, choices=POLICIES,
+        help='delivery policy, one of %s' % ", ".join(POLICIES))
+    arg_parser.add_argument(parser_group, '-a', '--authenticate', type=str, default="sekret",
+        help='token to authorize interaction with chaosc, default="sekret"')
+
     parser_unsubscribe = subparsers.add_parser('unsubscribe',
         help='unsubscribe a target')
     arg_parser.add_argument(parser_unsubscribe, 'host', metavar="url", type=str,
@@ -142,18 +241,74 @@ def main():
     arg_parser.add_argument(parser_save, '-a', '--authenticate', type=str, default="sekret",
         help='token to authorize interaction with chaosc, default="sekret"')
 
+    parser_ping = subparsers.add_parser('ping',
+        help='measure the round trip time to chaosc')
+    arg_parser.add_argument(parser_ping, '-r', '--rate', type=float, default=10.,
+        help='probes per second, default=10')
+    arg_parser.add_argument(parser_ping, '-n', '--count', type=int, default=50,
+        help='number of probes, default=50')
+    arg_parser.add_argument(parser_ping, '-w', '--wait', type=float, default=1.,
+        help='seconds to wait for late answers, default=1')
+
+    parser_record = subparsers.add_parser('record',
+        help='record incoming packets inside chaosc')
+    arg_parser.add_argument(parser_record, 'path', metavar="path", type=str,
+        nargs="?", default="",
+        help='file name in the dump directory of chaosc, omit it to stop recording')
+    arg_parser.add_argument(parser_record, '-a', '--authenticate', type=str, default="sekret",
+        help='token to authorize interaction with chaosc, default="sekret"')
+
+    parser_dump = subparsers.add_parser('dump_recent',
+        help='write the recent packets kept by chaosc to disk')
+    arg_parser.add_argument(parser_dump, 'path', metavar="path", type=str,
+        nargs="?", default="",
+        help='file name in the dump directory of chaosc, defaults to a timestamped name')
+    arg_parser.add_argument(parser_dump, '-a', '--authenticate', type=str, default="sekret",
+        help='token to authorize interaction with chaosc, default="sekret"')
+
+    parser_profile = subparsers.add_parser('profile',
+        help='start or stop the sampling profiler of chaosc')
+    arg_parser.add_argument(parser_profile, 'command', metavar="command",
+        type=str, choices=("start", "stop"), help='start or stop')
+    arg_parser.add_argument(parser_profile, 'path', metavar="path", type=str,
+        nargs="?", default="",
+        help='profile file name in the dump directory of chaosc, defaults to a timestamped name')
+    arg_parser.add_argument(parser_profile, '-D', '--duration', type=float, default=60.,
+        help='seconds until profiling stops on its own, default=60')
+    arg_parser.add_argument(parser_profile, '-a', '--authenticate', type=str, default="sekret",
+        help='token to authorize interaction with chaosc, default="sekret"')
+
+    parser_traces = subparsers.add_parser('traces',
+        help='retrieve the per stage latency of traced packets')
+    arg_parser.add_argument(parser_traces, 'path', metavar="path", type=str,
+        nargs="?", default="",
+        help='also write the traces as json lines to this file in the dump directory of chaosc')
+    arg_parser.add_argument(parser_traces, '-a', '--authenticate', type=str, default="sekret",
+        help='token to authorize interaction with chaosc, default="sekret"')
+
+    parser_latency = subparsers.add_parser('latency',
+        help='retrieve the wakeup latency of chaosc')
+
     parser_pause = subparsers.add_parser('pause',
         help='make save subscriptions to file')
     arg_parser.add_argument(parser_pause, 'pause_state', metavar="pause_state", type=int,
         help='1 means chaosc should stop serving packages, 0 means start serving packages')
 
     result = arg_parser.finalize()
+    if result.subparser_name == "ping":
+        if result.rate <= 0:
+            arg_parser.arg_parser.error("--rate must be positive")
+        if result.count <= 0:
+            arg_parser.arg_parser.error("--count must be positive")
 
     def exit():
         logger.info("the command seems to get no response - I'm dying now gracefully")
         os._exit(-1)
 
-    killit = threading.Timer(6.0, exit)
+    timeout = 6.0
+    if result.subparser_name == "ping":
+        timeout += result.count / result.rate + result.wait
+    killit = threading.Timer(timeout, exit)
     killit.start()
 
     client = OSCCTLServer(result)
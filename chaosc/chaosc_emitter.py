@@ -1 +1,293 @@
-__author__ = 'stefan'
+# -*- coding: utf-8 -*-
+
+'''chaosc_emitter generates osc load with a given rate to measure how much
+traffic chaosc and its targets can handle'''
+
+# This file is part of chaosc
+#
+# chaosc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# chaosc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with chaosc.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2012-2014 Stefan Kögl
+
+from __future__ import absolute_import
+
+import errno
+import random
+import socket
+import sys
+
+from itertools import cycle
+from time import time, sleep
+
+try:
+    from chaosc.c_osc_lib import OSCMessage, OSCBundle, message_template
+except ImportError:
+    from chaosc.osc_lib import OSCMessage, OSCBundle, message_template
+
+from chaosc.argparser_groups import ArgParser
+from chaosc.lib import logger, resolve_host
+
+
+__all__ = ["expand_addresses", "build_packets", "Emitter", "main"]
+
+
+# the last part of a wait is spent busy polling, since sleep() oversleeps
+SPIN_THRESHOLD = 0.001
+
+# if the emitter falls behind more than this, it drops the missed sends
+# instead of catching up with a burst
+MAX_BACKLOG = 0.1
+
+SEND_BUFFER = 4 * 1024 * 1024
+
+_string_pool = ["foo", "bar", "chaosc", "a longer string argument", ""]
+
+
+def expand_addresses(spec, address_count):
+    """Returns the osc addresses for a comma separated address specification
+
+    :param spec: e.g "/foo/%d,/bar"
+    :type spec: str
+
+    :param address_count: replacements for "%d"
+    :type address_count: int
+
+    :rtype: list
+    """
+    result = list()
+    for address in spec.split(","):
+        if not address:
+            continue
+        if "%d" in address:
+            result.extend([address % i for i in xrange(address_count)])
+        else:
+            result.append(address)
+    return result
+
+
+def _random_arg(typetag, rand):
+    if typetag == "i":
+        return rand.randint(-2 ** 31, 2 ** 31 - 1)
+    elif typetag in "fd":
+        return rand.uniform(-1000., 1000.)
+    elif typetag == "s":
+        return rand.choice(_string_pool)
+    elif typetag == "b":
+        return "".join([chr(rand.randint(0, 255)) for i in range(rand.randint(0, 64))])
+    elif typetag == "t":
+        return time()
+    raise ValueError("unsupported typetag %r" % typetag)
+
+
+def build_packets(addresses, typetags, bundle_size=0, variants=256, seed=0):
+    """Pre-encodes packets with random arguments
+
+    Addresses and typetag strings are used in turn, so every combination
+    occurs if their counts are coprime.
+
+    :param addresses: osc addresses
+    :type addresses: list
+
+    :param typetags: typetag strings, e.g ["i", "ff"]
+    :type typetags: list
+
+    :param bundle_size: messages per bundle, 0 for plain messages
+    :type bundle_size: int
+
+    :param variants: how many packets to build
+    :type variants: int
+
+    :param seed: seed of the random arguments
+    :type seed: int
+
+    :rtype: list of str
+    """
+    rand = random.Random(seed)
+    address_iter = cycle(addresses)
+    typetag_iter = cycle(typetags)
+
+    def make_message():
+        message = OSCMessage(address_iter.next())
+        for typetag in typetag_iter.next():
+            message.appendTypedArg(_random_arg(typetag, rand), typetag)
+        return message
+
+    packets = list()
+    for i in xrange(variants):
+        if bundle_size > 0:
+            bundle = OSCBundle()
+            for j in xrange(bundle_size):
+                bundle.append(make_message())
+            packets.append(bundle.encode_osc())
+        else:
+            tags = typetag_iter.next()
+            template = message_template(address_iter.next(), tags)
+            packets.append(template.encode(*[_random_arg(typetag, rand)
+                for typetag in tags]))
+    return packets
+
+
+class Emitter(object):
+    """Sends pre-encoded packets with an accurate rate
+
+    Packets are sent in batches of `batch` packets back to back. The start
+    time of each batch is scheduled from the start time of the run, so
+    pacing errors don't accumulate. If the emitter falls behind, e.g because
+    the socket buffer is full, missed batches are skipped rather than sent in
+    a burst.
+    """
+
+    def __init__(self, sock, address, packets, rate, batch=16):
+        """Instantiate a new Emitter
+
+        :param sock: udp socket
+        :type sock: socket.socket
+
+        :param address: the (host, port) to send to
+        :type address: tuple
+
+        :param packets: the pre-encoded packets, sent in turn
+        :type packets: list
+
+        :param rate: packets per second, 0 for as fast as possible
+        :type rate: float
+
+        :param batch: packets per batch
+        :type batch: int
+        """
+        super(Emitter, self).__init__()
+        self.sock = sock
+        self.address = address
+        self.packets = packets
+        self.rate = rate
+        self.batch = max(1, batch)
+        self.sent = 0
+        self.sent_bytes = 0
+        self.errors = 0
+        self.skipped = 0
+        self.started = None
+        self.running = True
+
+    def run(self, duration=0., report_interval=1., report=None):
+        """Sends packets for `duration` seconds or until `running` is False
+
+        :param duration: seconds to run, 0 for no limit
+        :type duration: float
+
+        :param report_interval: seconds between calls of `report`
+        :type report_interval: float
+
+        :param report: called with (elapsed seconds, packets, bytes, errors)
+            of the interval
+        :type report: callable
+
+        :returns: elapsed seconds
+        :rtype: float
+        """
+        sendto = self.sock.sendto
+        address = self.address
+        packets = self.packets
+        count = len(packets)
+        batch = self.batch
+        interval = self.rate > 0. and batch / self.rate or 0.
+
+        index = 0
+        self.started = start = last_report = time()
+        next_batch = start
+        end = duration > 0. and start + duration or None
+        reported = (0, 0, 0)
+
+        while self.running:
+            now = time()
+            if end is not None and now >= end:
+                break
+
+            if report is not None and now - last_report >= report_interval:
+                report(now - last_report, self.sent - reported[0],
+                    self.sent_bytes - reported[1], self.errors - reported[2])
+                reported = (self.sent, self.sent_bytes, self.errors)
+                last_report = now
+
+            if interval:
+                delay = next_batch - now
+                if delay > SPIN_THRESHOLD:
+                    sleep(delay - SPIN_THRESHOLD)
+                    continue
+                elif delay > 0.:
+                    continue
+                elif delay < -MAX_BACKLOG:
+                    missed = int(-delay / interval)
+                    self.skipped += missed * batch
+                    next_batch += missed * interval
+                next_batch += interval
+
+            for i in xrange(batch):
+                packet = packets[index]
+                index += 1
+                if index == count:
+                    index = 0
+                try:
+                    sendto(packet, address)
+                except socket.error, error:
+                    if error.errno not in (errno.ENOBUFS, errno.EAGAIN):
+                        raise
+                    self.errors += 1
+                else:
+                    self.sent += 1
+                    self.sent_bytes += len(packet)
+
+        return time() - start
+
+
+def print_report(elapsed, packets, sent_bytes, errors):
+    print "%10.1f packets/s %10.3f MBit/s %6d send errors" % (
+        packets / elapsed, sent_bytes * 8 / elapsed / 1000000., errors)
+    sys.stdout.flush()
+
+
+def main():
+    arg_parser = ArgParser("chaosc_emitter")
+    arg_parser.add_global_group()
+    arg_parser.add_chaosc_group()
+    arg_parser.add_emitter_group()
+    args = arg_parser.finalize()
+
+    addresses = expand_addresses(args.addresses, args.address_count)
+    typetags = [typetag for typetag in args.typetags.split(",") if typetag]
+    packets = build_packets(addresses, typetags, args.bundle_size,
+        args.variants)
+    logger.info("pre-encoded %d packets with %d addresses, mean size %d bytes",
+        len(packets), len(addresses),
+        sum(map(len, packets)) / len(packets))
+
+    chaosc_address = resolve_host(args.chaosc_host, args.chaosc_port,
+        args.address_family)
+    sock = socket.socket(args.address_family, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER)
+
+    emitter = Emitter(sock, chaosc_address, packets, args.rate, args.batch)
+    print "sending to %s:%d with %s packets/s..." % (chaosc_address[0],
+        chaosc_address[1], args.rate > 0. and args.rate or "max")
+    try:
+        elapsed = emitter.run(args.duration, args.report_interval, print_report)
+    except KeyboardInterrupt:
+        elapsed = time() - emitter.started
+    print "sent %d packets, %d bytes in %.3f s: %.1f packets/s (target %s), " \
+        "%d send errors, %d packets skipped" % (
+        emitter.sent, emitter.sent_bytes, elapsed, emitter.sent / elapsed,
+        args.rate > 0. and args.rate or "max", emitter.errors, emitter.skipped)
+
+
+if __name__ == '__main__':
+    main()
@@ -48,6 +48,9 @@ class FilterOSCServer(SimpleOSCServer):
     """OSC filtering/transcoding middleware
     """
 
+    # filtering only needs the osc address
+    message_views = True
+
     def __init__(self, args):
         """ctor for filter server
 
@@ -131,10 +134,10 @@ class FilterOSCServer(SimpleOSCServer):
         :type osc_address: str
 
         :param typetags: the typetags of args
-        :type typetags: list
+        :type typetags: str
 
         :param args: the osc message args
-        :type args: list
+        :type args: OSCMessageView
 
         :param packet: the binary representation of a osc message
         :type packet: str
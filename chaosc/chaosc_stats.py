@@ -26,20 +26,23 @@ import random, socket, time, argparse, sys, math, os.path, re
 import numpy
 
 try:
-    from chaosc.c_osc_lib import decode_osc
+    from chaosc.c_osc_lib import (decode_osc, OSCMessageView, OSCError,
+        OSCBundleFound)
 except ImportError, e:
     print e
-    from chaosc.osc_lib import decode_osc
+    from chaosc.osc_lib import (decode_osc, OSCMessageView, OSCError,
+        OSCBundleFound)
 
 from chaosc.argparser_groups import ArgParser
+from chaosc.osc_batch import decode_batch
 from collections import defaultdict
 
-from operator import itemgetter
-
 class OSCAnalyzer(object):
     def __init__(self, args):
         self.args = args
-        self.data = list()
+        # (osc_address, typetags) -> packets
+        self.packets = defaultdict(list)
+        self.total = 0
         self.rec_start = None
         self.rec_end = None
         self.annotations = dict()
@@ -74,20 +77,36 @@ class OSCAnalyzer(object):
                 try:
                     timestamp, packet = line.split(": ")
                     packet = packet.strip(" ").strip("\n").strip("\r")
-                    osc_address, typetags, args = decode_osc(packet, 0, len(packet))
-                    self.data.append((time, osc_address, typetags, args))
-                except ValueError:
+                    # only the address and typetags are decoded here, the
+                    # arguments per address in one batch
+                    view = OSCMessageView(packet)
+                    self.packets[(view.address, view.typetags)].append(packet)
+                    self.total += 1
+                except (ValueError, OSCError, OSCBundleFound):
                     self.error_count += 1
-                    pass
+
+
+    def columns(self, osc_address, typetags, packets):
+        """Returns one sequence of values per argument"""
+        try:
+            args, rejects = decode_batch(packets, osc_address, typetags)
+        except ValueError:
+            # strings and blobs have no fixed width
+            args = [decode_osc(packet, 0, len(packet))[2]
+                for packet in packets]
+            return zip(*args)
+        self.error_count += len(rejects)
+        return [args[name] for name in args.dtype.names]
 
 
     def analyze(self):
         per_address = defaultdict(list)
-        for time, osc_address, typetags, args in self.data:
-            per_address[osc_address].append(args)
+        for (osc_address, typetags), packets in self.packets.iteritems():
+            per_address[osc_address].append((typetags, self.columns(
+                osc_address, typetags, packets)))
 
         duration = self.rec_end - self.rec_start
-        total = len(self.data)
+        total = self.total
         print "error count", self.error_count
         print "Record Start: ", time.ctime(self.rec_start)
         print "Record End: ", time.ctime(self.rec_end)
@@ -95,23 +114,29 @@ class OSCAnalyzer(object):
         print "Total OSCMessages: ", total
         print "OSCMessages/s: ", total / duration
         print "Used OSCMessages:"
-        for address, args in per_address.iteritems():
+        for address, shapes in per_address.iteritems():
             annotation = self.get_annotation(address)
-            arg_total = len(args)
             print "    %r:" % address
-            print "        Total: %r" % arg_total
-            print "OSCMessages/s: ", arg_total / duration
-            for i in range(len(args[0])):
-                print "        Argument %d:" % i
-                if annotation is not None:
-                    type_tags, arg_names = annotation
-                    print "            Typetag: %r" % type_tags[i]
-                    print "            Argument name: %r" % arg_names[i]
-                print "            Min: %r" % min(args, key=itemgetter(i))[0]
-                print "            Max: %r" % max(args, key=itemgetter(i))[0]
-                print "            Mean: %r" % (sum([item[i] for item in args]) / float(arg_total))
-                median = numpy.median(numpy.array([item[i] for item in args]))
-                print "            Median: %r" % median
+            for typetags, columns in shapes:
+                arg_total = len(columns) and len(columns[0])
+                print "        Typetags: %r" % typetags
+                print "        Total: %r" % arg_total
+                print "OSCMessages/s: ", arg_total / duration
+                for i, column in enumerate(columns):
+                    print "        Argument %d:" % i
+                    if annotation is not None:
+                        type_tags, arg_names = annotation
+                        print "            Typetag: %r" % type_tags[i]
+                        print "            Argument name: %r" % arg_names[i]
+                    if typetags[i] not in "ifd":
+                        print "            Min: %r" % min(column)
+                        print "            Max: %r" % max(column)
+                        continue
+                    column = numpy.asarray(column)
+                    print "            Min: %r" % column.min()
+                    print "            Max: %r" % column.max()
+                    print "            Mean: %r" % column.mean()
+                    print "            Median: %r" % numpy.median(column)
 
 def main():
     arg_parser = ArgParser("chaosc_stats")
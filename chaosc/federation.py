@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+
+'''This module implements the peering of chaosc hubs'''
+
+# This file is part of chaosc
+#
+# chaosc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# chaosc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with chaosc.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2012-2014 Stefan Kögl
+
+from __future__ import absolute_import
+
+import socket
+
+from collections import deque
+from struct import pack
+
+from chaosc.lib import logger
+from chaosc.target_groups import bundle_address
+
+try:
+    from chaosc.c_osc_lib import encode_string
+except ImportError:
+    from chaosc.osc_lib import encode_string
+
+
+__all__ = ["Federation", "Peer", "RELAY_ADDRESS"]
+
+
+RELAY_ADDRESS = "/chaosc/relay"
+
+_relay_header = encode_string(RELAY_ADDRESS) + encode_string(",siib")
+
+# upper bound of cached osc address to interest lookups per peer
+INTEREST_CACHE_SIZE = 4096
+
+
+class Peer(object):
+    """A remote chaosc hub and the osc address prefixes it is interested in
+
+    The prefixes are the ones the remote hub announced. They are not derived
+    from its targets, so a peer without prefixes gets nothing and a peer
+    interested in "/" gets every packet.
+    """
+
+    def __init__(self, hub_id, address, prefixes):
+        """Instantiate a new Peer
+
+        :param hub_id: the unique id of the remote hub
+        :type hub_id: str
+
+        :param address: (host, port) of the remote hub
+        :type address: tuple
+
+        :param prefixes: osc address prefixes to forward to the remote hub
+        :type prefixes: list
+        """
+        super(Peer, self).__init__()
+        self.hub_id = hub_id
+        self.address = address
+        self.prefixes = tuple(prefixes)
+        self.interest_cache = dict()
+
+    def __repr__(self):
+        return "Peer(%r, %r, %r)" % (self.hub_id, self.address, self.prefixes)
+
+    def wants(self, osc_address):
+        """Returns True if the peer is interested in the given osc address
+
+        :param osc_address: the osc address of a packet
+        :type osc_address: str
+
+        :rtype: bool
+        """
+        try:
+            return self.interest_cache[osc_address]
+        except KeyError:
+            pass
+
+        result = osc_address.startswith(self.prefixes)
+        if len(self.interest_cache) >= INTEREST_CACHE_SIZE:
+            self.interest_cache.clear()
+        self.interest_cache[osc_address] = result
+        return result
+
+
+class Federation(object):
+    """Forwards packets between peered chaosc hubs without loops
+
+    Packets for peers are wrapped in a relay message::
+
+        /chaosc/relay ,siib origin_hub_id sequence_number hops_left packet
+
+    A hub drops relayed packets it originated itself, which it has seen
+    before, or which run out of hops. Relayed packets are delivered to the
+    local targets and forwarded to all other interested peers except the
+    origin and the peer it came from. Peers only get packets matching the
+    osc address prefixes they announced.
+    """
+
+    def __init__(self, hub_id, max_hops=4, history=4096):
+        """Instantiate a new Federation
+
+        :param hub_id: the unique id of this hub
+        :type hub_id: str
+
+        :param max_hops: how many hubs a packet may traverse
+        :type max_hops: int
+
+        :param history: how many (origin, sequence number) pairs are
+            remembered for dropping duplicates
+        :type history: int
+        """
+        super(Federation, self).__init__()
+        self.hub_id = hub_id
+        self.max_hops = max_hops
+        self.peers = dict()
+        self.sequence = 0
+        self.seen = set()
+        self.seen_order = deque(maxlen=history)
+        self.own_origin = encode_string(hub_id)
+        self.dropped = 0
+        # called with (packet, address, socket.error) if set
+        self.send_failed = None
+
+    def add_peer(self, hub_id, address, prefixes):
+        """Adds or updates a peer
+
+        :returns: True if the peer was unknown
+        :rtype: bool
+        """
+        is_new = address not in self.peers
+        self.peers[address] = Peer(hub_id, address, prefixes)
+        return is_new
+
+    def remove_peer(self, address):
+        """Removes a peer
+
+        :raises: KeyError if the peer is unknown
+        """
+        del self.peers[address]
+
+    def is_duplicate(self, origin, sequence):
+        """Remembers the given packet id and returns True if it was seen before
+        """
+        key = (origin, sequence)
+        seen = self.seen
+        if key in seen:
+            return True
+        seen_order = self.seen_order
+        if len(seen_order) == seen_order.maxlen:
+            seen.discard(seen_order[0])
+        seen_order.append(key)
+        seen.add(key)
+        return False
+
+    def forward(self, sendto, packet, osc_address):
+        """Wraps a packet received from a local source and sends it to all
+        interested peers
+
+        :param sendto: the sendto method of the hub socket
+        :type sendto: method
+
+        :param packet: the binary representation of an osc message
+        :type packet: str
+
+        :param osc_address: the osc address of the packet, None for bundles
+        :type osc_address: str
+        """
+        self.sequence = sequence = (self.sequence + 1) & 0x7fffffff
+        self.__send(sendto, packet, osc_address, self.own_origin, sequence,
+            self.max_hops, None, None)
+
+    def relay(self, sendto, typetags, args, client_address):
+        """Handles a relay message from a peer
+
+        Malformed relay messages are dropped.
+
+        :param sendto: the sendto method of the hub socket
+        :type sendto: method
+
+        :param typetags: the typetags of the relay message
+        :type typetags: list
+
+        :param args: the args of the relay message
+        :type args: list
+
+        :param client_address: (host, port) of the sending peer
+        :type client_address: tuple
+
+        :returns: the unwrapped packet and its osc address or None if the
+            packet has to be dropped
+        :rtype: tuple
+        """
+        if client_address not in self.peers:
+            self.dropped += 1
+            return None
+
+        if "".join(typetags) != "siib":
+            logger.error("malformed relay message from %r - typetags %r",
+                client_address, "".join(typetags))
+            self.dropped += 1
+            return None
+
+        origin, sequence, hops, packet = args
+        if packet.startswith("#bundle"):
+            osc_address = None
+        else:
+            address_end = packet.find("\0")
+            if address_end < 0:
+                self.dropped += 1
+                return None
+            osc_address = packet[:address_end]
+
+        if origin == self.hub_id or self.is_duplicate(origin, sequence):
+            self.dropped += 1
+            return None
+
+        if hops > 1:
+            self.__send(sendto, packet, osc_address, encode_string(origin),
+                sequence, hops - 1, client_address, origin)
+        return packet, osc_address
+
+    def __send(self, sendto, packet, osc_address, encoded_origin, sequence,
+        hops, exclude_address, exclude_hub_id):
+
+        interest_address = osc_address
+        if interest_address is None:
+            interest_address = bundle_address(packet)
+
+        relay_packet = None
+        for address, peer in self.peers.iteritems():
+            if (address == exclude_address or peer.hub_id == exclude_hub_id or
+                not peer.wants(interest_address)):
+                continue
+            if relay_packet is None:
+                length = len(packet)
+                relay_packet = "%s%s%s%s%s" % (_relay_header, encoded_origin,
+                    pack(">iii", sequence, hops, length), packet,
+                    "\0" * (-length % 4))
+            try:
+                sendto(relay_packet, address)
+            except socket.error, error:
+                if self.send_failed is not None:
+                    self.send_failed(relay_packet, address, error)
+                else:
+                    logger.exception(error)
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+
+'''This module implements the socket and state handover between two chaosc
+processes for restarts without packet loss'''
+
+# This file is part of chaosc
+#
+# chaosc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# chaosc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with chaosc.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2012-2014 Stefan Kögl
+
+from __future__ import absolute_import
+
+import json
+import os
+import os.path
+import socket
+
+from select import select
+from threading import Thread, Event
+
+from chaosc.lib import logger
+
+try:
+    # passes file descriptors with SCM_RIGHTS over unix sockets
+    from _multiprocessing import sendfd, recvfd
+except ImportError:
+    sendfd = recvfd = None
+
+
+__all__ = ["HandoverThread", "receive_handover"]
+
+# the receive buffer size requested while no process is serving. Linux caps it
+# at net.core.rmem_max.
+HANDOVER_RCVBUF = 8 * 1024 * 1024
+
+
+def _check_support():
+    if sendfd is None:
+        raise NotImplementedError(
+            "file descriptor passing is not supported on this platform")
+
+
+class HandoverThread(Thread):
+    """Waits on a unix socket for a new chaosc process taking over
+
+    When a process connects, `server` stops serving requests, the bound
+    udp socket and the state returned by `server.get_state()` are sent to the
+    new process and the thread waits for the acknowledgement. The event
+    `attempted` is set after each handover attempt. If `server.handed_over`
+    is True by then, the old process can exit, otherwise it's up to the caller
+    to serve again.
+
+    Packets arriving meanwhile stay in the socket's receive buffer, which is
+    shared by both processes, so no packet gets lost.
+
+    The protocol is: one file descriptor, one line with the json encoded
+    state, answered by the line "ok".
+    """
+
+    def __init__(self, server, path):
+        """Instantiate a new HandoverThread
+
+        :param server: the chaosc instance to hand over
+        :type server: Chaosc
+
+        :param path: file system path of the unix socket
+        :type path: str
+        """
+        super(HandoverThread, self).__init__()
+        _check_support()
+        self.daemon = True
+        self.server = server
+        self.attempted = Event()
+        self.path = os.path.expanduser(path)
+
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(self.path)
+        self.listener.listen(1)
+
+    def run(self):
+        while True:
+            connection = self.listener.accept()[0]
+            try:
+                self.handover(connection)
+            except (socket.error, IOError, OSError, TypeError, ValueError), \
+                error:
+                # the new process failed, keep serving and wait for the next
+                logger.exception(error)
+                connection.close()
+            finally:
+                self.attempted.set()
+            if self.server.handed_over:
+                return
+
+    def handover(self, connection):
+        logger.info("handing over to a new chaosc process...")
+        udp_socket = self.server.socket
+        if udp_socket.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF) < HANDOVER_RCVBUF:
+            udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF,
+                HANDOVER_RCVBUF)
+        self.server.shutdown()
+
+        sendfd(connection.fileno(), udp_socket.fileno())
+        connection.settimeout(10.)
+        connection.sendall(json.dumps(self.server.get_state()) + "\n")
+        answer = connection.makefile("r").readline()
+        if answer.strip() != "ok":
+            raise IOError("handover not acknowledged: %r" % answer)
+
+        self.server.handed_over = True
+        os.unlink(self.path)
+        self.listener.close()
+        connection.close()
+        logger.info("handover done")
+
+
+def receive_handover(path, timeout=10.):
+    """Takes over the udp socket and the state from a running chaosc process
+
+    :param path: file system path of the unix socket
+    :type path: str
+
+    :param timeout: seconds to wait for the old process
+    :type timeout: float
+
+    :returns: the file descriptor of the bound udp socket and the state
+    :rtype: tuple
+    :raises: socket.error if no process is listening on `path`, OSError if
+        no file descriptor was received, ValueError for a malformed state
+    """
+    _check_support()
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.settimeout(timeout)
+    connection.connect(os.path.expanduser(path))
+    try:
+        # recvfd needs a blocking file descriptor
+        connection.setblocking(1)
+        if not select([connection], [], [], timeout)[0]:
+            raise socket.timeout("no handover from the running process")
+        fd = recvfd(connection.fileno())
+        try:
+            connection.settimeout(timeout)
+            state = json.loads(connection.makefile("r").readline())
+            if not isinstance(state, dict):
+                raise ValueError("malformed handover state %r" % state)
+            connection.sendall("ok\n")
+        except:
+            os.close(fd)
+            raise
+        # the old process unlinks the path before closing the connection. It
+        # stopped serving after "ok", so the socket is ours in any case.
+        try:
+            connection.recv(1)
+        except socket.error:
+            pass
+    finally:
+        connection.close()
+    return fd, state
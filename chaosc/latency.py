@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+
+'''This module implements the low latency mode of chaosc: busy polling, cpu
+pinning, scheduling priority and wakeup latency measurement'''
+
+# This file is part of chaosc
+#
+# chaosc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# chaosc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with chaosc.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2012-2014 Stefan Kögl
+
+from __future__ import absolute_import
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import socket
+import struct
+import sys
+
+from collections import deque
+from time import time
+
+from chaosc.lib import logger
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+__all__ = ["WakeupStats", "enable_busy_poll", "kernel_timestamp", "pin_to_cpu",
+    "set_nice", "summarize"]
+
+
+# not exported by the socket module of python 2
+SO_BUSY_POLL = getattr(socket, "SO_BUSY_POLL",
+    sys.platform.startswith("linux") and 46 or None)
+
+# microseconds the kernel busy polls the device queue on blocking reads
+BUSY_POLL_USEC = 50
+
+# ioctl returning the kernel receive timestamp of the last packet
+SIOCGSTAMP = 0x8906
+
+_timeval = struct.Struct("@ll")
+
+
+def enable_busy_poll(sock, usec=BUSY_POLL_USEC):
+    """Enables SO_BUSY_POLL on the socket if the platform supports it
+
+    :returns: True on success
+    :rtype: bool
+    """
+    if SO_BUSY_POLL is None:
+        logger.warning("SO_BUSY_POLL is not available on this platform")
+        return False
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, SO_BUSY_POLL, usec)
+    except socket.error, error:
+        logger.warning("could not enable SO_BUSY_POLL - %s", error)
+        return False
+    return True
+
+
+def kernel_timestamp(sock):
+    """Returns the time the kernel received the last packet read from `sock`
+
+    The first call only enables timestamping for the socket and returns None.
+
+    :rtype: float
+    :raises: IOError if not supported
+    """
+    try:
+        seconds, microseconds = _timeval.unpack(fcntl.ioctl(sock.fileno(),
+            SIOCGSTAMP, _timeval.pack(0, 0)))
+    except IOError, error:
+        if error.errno == errno.ENOENT:
+            return None
+        raise
+    return seconds + microseconds / 1000000.
+
+
+def pin_to_cpu(cpu):
+    """Restricts the current process to the given cpu core
+
+    :param cpu: the index of the core
+    :type cpu: int
+
+    :raises: OSError if the affinity could not be set, ValueError if `cpu`
+        is out of range
+    """
+    libc_name = ctypes.util.find_library("c")
+    if not sys.platform.startswith("linux") or libc_name is None:
+        raise OSError("cpu pinning is only supported on linux")
+    # cpu_set_t of glibc holds 1024 bits
+    if not 0 <= cpu < 1024:
+        raise ValueError("cpu %d out of range 0-1023" % cpu)
+    libc = ctypes.CDLL(libc_name, use_errno=True)
+    mask = (ctypes.c_ulong * (1024 / (8 * ctypes.sizeof(ctypes.c_ulong))))()
+    bits = 8 * ctypes.sizeof(ctypes.c_ulong)
+    mask[cpu / bits] = 1 << (cpu % bits)
+    if libc.sched_setaffinity(0, ctypes.sizeof(mask), ctypes.byref(mask)) != 0:
+        error = ctypes.get_errno()
+        raise OSError(error, os.strerror(error))
+
+
+def set_nice(increment):
+    """Changes the niceness of the process, negative values raise the
+    scheduling priority and need privileges
+
+    :raises: OSError if not permitted
+    """
+    return os.nice(increment)
+
+
+def summarize(samples, scale=1.):
+    """Returns (count, min, avg, p99, max) of samples multiplied by scale,
+    zeros if there are no samples
+
+    :param samples: the measured values
+    :type samples: iterable of float
+
+    :param scale: factor for the unit of the result, e.g. 1000. for ms
+    :type scale: float
+
+    :rtype: tuple
+    """
+    samples = sorted(samples)
+    if not samples:
+        return 0, 0., 0., 0., 0.
+    return (len(samples), samples[0] * scale,
+        sum(samples) / len(samples) * scale,
+        samples[min(len(samples) - 1, int(len(samples) * 0.99))] * scale,
+        samples[-1] * scale)
+
+
+class WakeupStats(object):
+    """Measures how long packets wait in the kernel until chaosc reads them
+
+    Every `sample_every` packet the kernel receive timestamp is fetched with
+    SIOCGSTAMP and compared with the time the packet was read. The last
+    `history` samples are kept for the percentiles.
+    """
+
+    def __init__(self, sample_every=16, history=4096):
+        super(WakeupStats, self).__init__()
+        self.sample_every = sample_every
+        self.countdown = sample_every
+        self.samples = deque(maxlen=history)
+        self.count = 0
+        self.supported = fcntl is not None and sys.platform.startswith("linux")
+
+    def packet_read(self, sock):
+        """Called after each packet read from `sock`, takes a sample if due
+
+        :param sock: the socket the packet was read from
+        :type sock: socket.socket
+        """
+        self.countdown -= 1
+        if self.countdown or not self.supported:
+            return
+        self.countdown = self.sample_every
+        now = time()
+        try:
+            received = kernel_timestamp(sock)
+        except IOError, error:
+            logger.warning("wakeup latency measurement disabled - %s", error)
+            self.supported = False
+            return
+        if received is None:
+            return
+        latency = now - received
+        # packets queued before timestamping was enabled carry no timestamp,
+        # the kernel reports the current time for them
+        if latency >= 0.:
+            self.samples.append(latency)
+            self.count += 1
+
+    def summary(self):
+        """Returns (samples, min, avg, p99, max) of the wakeup latency in
+        microseconds, zeros if there are no samples"""
+        return summarize(self.samples, 1e6)
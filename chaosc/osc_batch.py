@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+
+'''This module decodes many osc messages of the same address and typetags at
+once into numpy structured arrays and encodes arrays into packets'''
+
+# This file is part of chaosc
+#
+# chaosc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# chaosc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with chaosc.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2012-2014 Stefan Kögl
+
+from __future__ import absolute_import
+
+import numpy
+
+from chaosc.osc_lib import encode_string, encode_timetag
+
+
+__all__ = ["batch_dtype", "decode_batch", "encode_batch"]
+
+
+# typetag -> big-endian numpy type of the fixed width osc arguments
+_dtypes = {"i" : ">i4", "f" : ">f4", "d" : ">f8", "h" : ">i8", "r" : ">u4"}
+
+
+def batch_dtype(typetags, names=None):
+    """Returns the structured numpy dtype of messages with the given typetags
+
+    Fields are big-endian like on the wire and named "f0", "f1"... unless
+    `names` are given.
+
+    :param typetags: the typetags without the leading ','
+    :type typetags: str
+
+    :param names: optional field names, one per typetag
+    :type names: list
+
+    :rtype: numpy.dtype
+    :raises: ValueError if a typetag has no fixed width
+    """
+    if names is None:
+        names = ["f%d" % i for i in xrange(len(typetags))]
+    elif len(names) != len(typetags):
+        raise ValueError("%d names for %d typetags" % (len(names),
+            len(typetags)))
+    formats = list()
+    for typetag in typetags:
+        try:
+            formats.append(_dtypes[typetag])
+        except KeyError:
+            raise ValueError("typetag %r has no fixed width" % typetag)
+    return numpy.dtype({"names" : list(names), "formats" : formats})
+
+
+def decode_batch(packets, address, typetags, names=None):
+    """Decodes osc messages sharing address and typetags into one array
+
+    A packet matches if it starts with the encoded address and typetags and
+    has the size of these arguments. The matching packets are joined and
+    decoded by numpy in one go instead of one unpack call per message.
+    Everything else, e.g other addresses, bundles or truncated packets, is
+    returned unchanged in order.
+
+    :param packets: binary osc messages
+    :type packets: list
+
+    :param address: the osc address
+    :type address: str
+
+    :param typetags: the typetags without the leading ','
+    :type typetags: str
+
+    :param names: optional field names, see :func:`batch_dtype`
+    :type names: list
+
+    :returns: (structured array of the matching messages, rejected packets)
+    :rtype: tuple
+    :raises: ValueError if a typetag has no fixed width
+    """
+    dtype = batch_dtype(typetags, names)
+    prefix = encode_string(address) + encode_string("," + typetags)
+    skip = len(prefix)
+    size = skip + dtype.itemsize
+
+    matching = [packet for packet in packets
+        if len(packet) == size and packet.startswith(prefix)]
+    if len(matching) == len(packets):
+        rejects = list()
+    else:
+        rejects = [packet for packet in packets
+            if len(packet) != size or not packet.startswith(prefix)]
+
+    # the same fields behind the address and typetags of each packet
+    packed = numpy.dtype({"names" : dtype.names,
+        "formats" : [dtype.fields[name][0] for name in dtype.names],
+        "offsets" : [skip + dtype.fields[name][1] for name in dtype.names],
+        "itemsize" : size})
+    result = numpy.empty(len(matching), dtype=dtype)
+    if matching and dtype.names:
+        data = numpy.frombuffer("".join(matching), dtype=packed)
+        for name in dtype.names:
+            result[name] = data[name]
+    return result, rejects
+
+
+def encode_batch(address, typetags, values, max_size=None):
+    """Encodes one osc message per row of `values`
+
+    The rows are cast and byteswapped by numpy into one contiguous buffer
+    of encoded messages, which is then sliced into packets. A frame of
+    many channels is a single call.
+
+    If `max_size` is given, the messages are packed into bundles of at most
+    `max_size` bytes instead, e.g the MTU of the network minus the ip and
+    udp headers.
+
+    :param address: the osc address
+    :type address: str
+
+    :param typetags: the typetags without the leading ','
+    :type typetags: str
+
+    :param values: array of shape (N, len(typetags)), or a structured array
+        with one field per typetag
+    :type values: numpy.ndarray
+
+    :param max_size: upper bound of the bundle size in bytes, None for
+        plain messages
+    :type max_size: int
+
+    :returns: the binary packets
+    :rtype: list of str
+    :raises: ValueError if a typetag has no fixed width, the shape of
+        `values` does not match or a message does not fit into `max_size`
+    """
+    dtype = batch_dtype(typetags)
+    values = numpy.asarray(values)
+    if values.dtype.names:
+        if len(values.dtype.names) != len(typetags):
+            raise ValueError("%d fields for %d typetags" % (
+                len(values.dtype.names), len(typetags)))
+        columns = [values[name] for name in values.dtype.names]
+    else:
+        if values.ndim == 1 and len(typetags) == 1:
+            values = values.reshape(-1, 1)
+        if values.ndim != 2 or values.shape[1] != len(typetags):
+            raise ValueError("values of shape %r for %d typetags" % (
+                values.shape, len(typetags)))
+        columns = [values[:, i] for i in xrange(len(typetags))]
+
+    prefix = encode_string(address) + encode_string("," + typetags)
+    size = len(prefix) + dtype.itemsize
+    names = ["size", "prefix"] + list(dtype.names)
+    formats = [">i4", "S%d" % len(prefix)] + [dtype.fields[name][0]
+        for name in dtype.names]
+    if max_size is None:
+        # without the size field of bundle elements
+        names, formats = names[1:], formats[1:]
+    messages = numpy.empty(len(columns[0]) if columns else len(values),
+        dtype=numpy.dtype({"names" : names, "formats" : formats}))
+    messages["prefix"] = prefix
+    for name, column in zip(dtype.names, columns):
+        messages[name] = column
+    if max_size is None:
+        buffer = messages.tostring()
+        return [buffer[i:i + size] for i in xrange(0, len(buffer), size)]
+
+    messages["size"] = size
+    per_bundle = (max_size - 16) / (size + 4)
+    if per_bundle < 1:
+        raise ValueError("a message of %d bytes does not fit into bundles "
+            "of %d bytes" % (size, max_size))
+    header = "#bundle\0" + encode_timetag(0.)
+    buffer = messages.tostring()
+    step = per_bundle * (size + 4)
+    return [header + buffer[i:i + step] for i in xrange(0, len(buffer), step)]
@@ -57,14 +57,15 @@ from __future__ import absolute_import
 
 import types, time
 
-from math import ceil, modf
-from struct import pack, unpack
+from math import modf
+from struct import pack, unpack, Struct, error as StructError
 from copy import deepcopy
-from itertools import izip
+from operator import attrgetter
 
 
 __all__ = ["OSCError", "OSCBundleFound", "OSCMessage", "OSCBundle",
-    "proxy_decode_osc", "encode_string", "decode_osc"]
+    "OSCMessageView", "OSCMessageTemplate", "message_template",
+    "proxy_decode_osc", "encode_string", "decode_osc", "walk_bundle"]
 
 class OSCError(Exception):
     """Base Class for all OSC-related errors
@@ -88,6 +89,42 @@ del timegm
 
 NTP_units_per_second = 0x100000000 # about 232 picoseconds
 
+_int_struct = Struct(">i")
+_uint_struct = Struct(">I")
+_float_struct = Struct(">f")
+_double_struct = Struct(">d")
+_long_struct = Struct(">q")
+_midi_struct = Struct(">BBBB")
+
+# typetag -> struct format of the fixed width numbers, runs of them are coded
+# by one struct.Struct. 'r' is a 32 bit rgba color
+_fixed_formats = {"i" : "i", "f" : "f", "d" : "d", "h" : "q", "r" : "I"}
+_fixed_structs = {"i" : _int_struct, "f" : _float_struct,
+    "d" : _double_struct, "h" : _long_struct, "r" : _uint_struct}
+
+# typetags without argument data and their values
+_constants = {"T" : True, "F" : False, "N" : None, "I" : float("inf")}
+
+# zero bytes terminating a string of length % 4
+_string_padding = ("\0\0\0\0", "\0\0\0", "\0\0", "\0")
+_blob_padding = ("", "\0\0\0", "\0\0", "\0")
+
+_bundle_address = "#bundle\0"
+
+# default limits of decoded bundles, the top level bundle counts as depth 1
+MAX_BUNDLE_DEPTH = 32
+MAX_BUNDLE_ELEMENTS = 65536
+
+# typetag string -> list of (struct.Struct, count) for runs of fixed width
+# arguments and single typetags of the others
+_typetag_codecs = dict()
+_typetag_codecs_size = 1024
+
+# (address, typetags) -> OSCMessageTemplate, see message_template
+_templates = dict()
+_templates_size = 1024
+_templates_clock = 0
+
 
 try:
     from numpy import typeDict
@@ -121,8 +158,14 @@ def get_type_tag(argument):
     ta = type(argument)
     if ta in float_types:
         return 'f'
-    elif ta in IntTypes:
-        return 'i'
+    elif ta in IntTypes or ta is long:
+        if -0x80000000 <= argument <= 0x7fffffff:
+            return 'i'
+        return 'h'
+    elif ta is bool:
+        return argument and 'T' or 'F'
+    elif argument is None:
+        return 'N'
     else:
         return 's'
 
@@ -138,7 +181,10 @@ def encode_string(argument):
     :rtype: str
     """
 
-    return pack(">%ds" % (ceil((len(argument)+1) / 4.0) * 4), argument)
+    length = len(argument)
+    if argument.__class__ is not str:
+        return pack(">%ds" % ((length & ~3) + 4), argument)
+    return argument + _string_padding[length & 3]
 
 
 def encode_blob(argument):
@@ -153,8 +199,12 @@ def encode_blob(argument):
     :rtype: str
     """
 
-    if isinstance(argument, basestring):
-        length = ceil((len(argument)) / 4.0) * 4
+    if argument.__class__ is str:
+        padding = _blob_padding[len(argument) & 3]
+        return "%s%s%s" % (_int_struct.pack(len(argument) + len(padding)),
+            argument, padding)
+    elif isinstance(argument, basestring):
+        length = (len(argument) + 3) & ~3
         return pack(">i%ds" % length, length, argument)
     else:
         return ""
@@ -194,10 +244,12 @@ def decode_string(data, start, end):
 
     :returns: the string and the start position of remaining data
     :rtype: str, int
+    :raises: OSCError if the string is not terminated before end
     """
-    end = data.find("\0", start)
-    nextData = int(ceil(0.25 * (end+1)) * 4)
-    return data[start:end], nextData
+    end = data.find("\0", start, end)
+    if end < 0:
+        raise OSCError("unterminated osc string")
+    return data[start:end], (end + 4) & ~3
 
 
 def decode_blob(data, start, end):
@@ -214,11 +266,16 @@ def decode_blob(data, start, end):
 
     :returns: the blob string and the start position of remaining data
     :rtype: str, int
+    :raises: OSCError if the size is negative or the blob exceeds end
     """
 
     blob_start = start + 4
-    length = unpack(">i", data[start:blob_start])[0]
-    nextData = int(blob_start + int(ceil((length) / 4.0) * 4))
+    if blob_start > end:
+        raise OSCError("too few bytes for blob size")
+    length = _int_struct.unpack_from(data, start)[0]
+    if length < 0 or length > end - blob_start:
+        raise OSCError("invalid blob size %d" % length)
+    nextData = blob_start + ((length + 3) & ~3)
     return data[blob_start:nextData], nextData
 
 
@@ -263,8 +320,9 @@ def decode_long(data, start, end):
     :rtype: long, int
     """
 
-    end = start + 8
-    return unpack(">q", data[start:end]), end
+    if end - start < 8:
+        raise OSCError("too few bytes for long")
+    return _long_struct.unpack_from(data, start)[0], start + 8
 
 
 def decode_timetag(data, start, end):
@@ -290,7 +348,7 @@ def decode_timetag(data, start, end):
     if (high == 0) and (low <= 1):
         return 0.0, end
     else:
-        return int(NTP_epoch + high) + float(low / NTP_units_per_second), end
+        return int(NTP_epoch + high) + low / float(NTP_units_per_second), end
 
 
 def decode_float(data, start, end):
@@ -341,9 +399,354 @@ def decode_double(data, start, end):
     return unpack(">d", data[start:end])[0], end
 
 
-def decode_osc(data, start, end):
+def decode_char(data, start, end):
+    """Reads a character sent as 32 bit integer
+
+    :param data: the binary representation of an osc message
+    :type data: str
+
+    :param start: position to start parsing
+    :type start: int
+
+    :param end: length of data
+    :type end: int
+
+    :returns: the character and the start position of remaining data
+    :rtype: str, int
+    """
+
+    if end - start < 4:
+        raise OSCError("too few bytes for char")
+    value = _uint_struct.unpack_from(data, start)[0]
+    return value < 256 and chr(value) or unichr(value), start + 4
+
+
+def decode_midi(data, start, end):
+    """Reads a 4 byte midi message
+
+    :param data: the binary representation of an osc message
+    :type data: str
+
+    :param start: position to start parsing
+    :type start: int
+
+    :param end: length of data
+    :type end: int
+
+    :returns: (port id, status, data1, data2) and the start position of
+        remaining data
+    :rtype: tuple, int
+    """
+
+    if end - start < 4:
+        raise OSCError("too few bytes for midi message")
+    return _midi_struct.unpack_from(data, start), start + 4
+
+
+def encode_char(argument):
+    """Convert a character into its OSC binary representation
+
+    :param argument: the character
+    :type argument: str
+
+    :rtype: str
+    """
+
+    return _uint_struct.pack(ord(argument))
+
+
+def encode_midi(argument):
+    """Convert a midi message into its OSC binary representation
+
+    :param argument: (port id, status, data1, data2)
+    :type argument: tuple
+
+    :rtype: str
+    """
+
+    return _midi_struct.pack(*argument)
+
+
+# typetag -> decoder and encoder of the other typetags with argument data
+_decoders = {"s" : decode_string, "S" : decode_string, "b" : decode_blob,
+    "t" : decode_timetag, "c" : decode_char, "m" : decode_midi}
+_encoders = {"s" : encode_string, "S" : encode_string, "b" : encode_blob,
+    "t" : encode_timetag, "c" : encode_char, "m" : encode_midi}
+
+
+def argument_count(typetags):
+    """Returns the number of arguments of a typetag string, an array counts
+    as one argument
+
+    :param typetags: the typetags without the leading ','
+    :type typetags: str
+
+    :rtype: int
+    """
+    if "[" not in typetags:
+        return len(typetags)
+    count = 0
+    depth = 0
+    for typetag in typetags:
+        if typetag == "[":
+            if not depth:
+                count += 1
+            depth += 1
+        elif typetag == "]":
+            depth -= 1
+        elif not depth:
+            count += 1
+    return count
+
+
+def typetag_codec(typetags):
+    """Returns the codec of a typetag string
+
+    Runs of fixed width numbers (i, f, d, h, r) are coded by one
+    precompiled struct.Struct, so e.g. ",ffff" is decoded and encoded in one
+    call. The other typetags of OSC 1.1 are kept as single characters and
+    handled one by one by the codec tables, '[' and ']' delimit arrays.
+    Codecs are cached per typetag string.
+
+    :param typetags: the typetags without the leading ','
+    :type typetags: str
+
+    :returns: list of (struct.Struct, count) tuples and typetag characters
+    :rtype: list
+    :raises: OSCError for unknown typetags or unbalanced arrays
+    """
+    try:
+        return _typetag_codecs[typetags]
+    except KeyError:
+        pass
+
+    codec = list()
+    fixed = ""
+    depth = 0
+    for typetag in typetags:
+        if typetag in _fixed_formats:
+            fixed += _fixed_formats[typetag]
+            continue
+        if fixed:
+            codec.append((Struct(">" + fixed), len(fixed)))
+            fixed = ""
+        if typetag == "[":
+            depth += 1
+        elif typetag == "]":
+            depth -= 1
+            if depth < 0:
+                raise OSCError("unbalanced array in %r" % typetags)
+        elif typetag not in _decoders and typetag not in _constants:
+            raise OSCError("unknown typetag %r" % typetag)
+        codec.append(typetag)
+    if fixed:
+        codec.append((Struct(">" + fixed), len(fixed)))
+    if depth:
+        raise OSCError("unbalanced array in %r" % typetags)
+
+    # typetag strings come from the network, keep the cache bounded
+    if len(_typetag_codecs) >= _typetag_codecs_size:
+        _typetag_codecs.clear()
+    _typetag_codecs[typetags] = codec
+    return codec
+
+
+def decode_arguments(data, start, end, typetags):
+    """Decodes the arguments of an osc message
+
+    :param data: the binary representation of an osc message
+    :type data: str
+
+    :param start: position of the first argument
+    :type start: int
+
+    :param end: length of data
+    :type end: int
+
+    :param typetags: the typetags without the leading ','
+    :type typetags: str
+
+    Arrays are decoded as nested lists.
+
+    :rtype: list
+    :raises: OSCError if data is too short or a typetag unknown
+    """
+    args = list()
+    arrays = list()
+    rest = start
+    for segment in typetag_codec(typetags):
+        if segment.__class__ is tuple:
+            codec = segment[0]
+            if rest + codec.size > end:
+                raise OSCError("too few bytes for arguments %r" % typetags)
+            args.extend(codec.unpack_from(data, rest))
+            rest += codec.size
+        elif segment in _decoders:
+            argument, rest = _decoders[segment](data, rest, end)
+            args.append(argument)
+        elif segment in _constants:
+            args.append(_constants[segment])
+        elif segment == "[":
+            arrays.append(args)
+            args = list()
+        else:
+            array = args
+            args = arrays.pop()
+            args.append(array)
+    if rest > end:
+        raise OSCError("too few bytes for arguments %r" % typetags)
+    return args
+
+
+def encode_arguments(typetags, args):
+    """Encodes the arguments of an osc message
+
+    :param typetags: the typetags without the leading ','
+    :type typetags: str
+
+    :param args: the arguments
+    :type args: list
+
+    Arrays are passed as nested lists, typetags without data (T, F, N, I)
+    take an argument which is ignored.
+
+    :rtype: str
+    :raises: OSCError for unknown typetags
+    """
+    tmp = list()
+    arrays = list()
+    index = 0
+    for segment in typetag_codec(typetags):
+        if segment.__class__ is tuple:
+            count = segment[1]
+            tmp.append(segment[0].pack(*args[index:index + count]))
+            index += count
+        elif segment in _encoders:
+            tmp.append(_encoders[segment](args[index]))
+            index += 1
+        elif segment in _constants:
+            index += 1
+        elif segment == "[":
+            arrays.append((args, index + 1))
+            args = args[index]
+            index = 0
+        else:
+            args, index = arrays.pop()
+    return "".join(tmp)
+
+
+def encoded_arguments_size(typetags, args):
+    """Returns the byte size of the encoded arguments of an osc message
+
+    :param typetags: the typetags without the leading ','
+    :type typetags: str
+
+    :param args: the arguments
+    :type args: list
+
+    :rtype: int
+    :raises: OSCError for unknown typetags
+    """
+    size = 0
+    arrays = list()
+    index = 0
+    for segment in typetag_codec(typetags):
+        if segment.__class__ is tuple:
+            size += segment[0].size
+            index += segment[1]
+        elif segment == "[":
+            arrays.append((args, index + 1))
+            args = args[index]
+            index = 0
+        elif segment == "]":
+            args, index = arrays.pop()
+        else:
+            argument = args[index]
+            index += 1
+            if segment == "s" or segment == "S":
+                size += (len(argument) & ~3) + 4
+            elif segment == "b":
+                if isinstance(argument, basestring):
+                    size += 4 + ((len(argument) + 3) & ~3)
+            else:
+                size += _argument_sizes[segment]
+    return size
+
+
+def _write(buffer, offset, data):
+    """Writes data into buffer at offset and returns the position after it
+
+    :raises: ValueError if buffer is too small
+    """
+    end = offset + len(data)
+    if end > len(buffer):
+        raise ValueError("buffer too small, %d bytes needed" % end)
+    buffer[offset:end] = data
+    return end
+
+
+def encode_arguments_into(buffer, offset, typetags, args):
+    """Writes the encoded arguments of an osc message into buffer
+
+    Runs of fixed width arguments are packed in place by struct.pack_into.
+
+    :param buffer: the buffer to write to
+    :type buffer: bytearray
+
+    :param offset: position in buffer to start writing
+    :type offset: int
+
+    :param typetags: the typetags without the leading ','
+    :type typetags: str
+
+    :param args: the arguments
+    :type args: list
+
+    :returns: the position after the arguments
+    :rtype: int
+    :raises: OSCError for unknown typetags or arguments not matching them,
+        ValueError if the buffer is too small
+    """
+    arrays = list()
+    index = 0
+    for segment in typetag_codec(typetags):
+        if segment.__class__ is tuple:
+            codec, count = segment
+            end = offset + codec.size
+            if end > len(buffer):
+                raise ValueError("buffer too small, %d bytes needed" % end)
+            try:
+                codec.pack_into(buffer, offset, *args[index:index + count])
+            except StructError, error:
+                raise OSCError("invalid arguments for %r - %s" % (typetags,
+                    error))
+            offset = end
+            index += count
+        elif segment == "s" or segment == "S":
+            argument = args[index]
+            offset = _write(buffer, offset,
+                argument + _string_padding[len(argument) & 3])
+            index += 1
+        elif segment in _encoders:
+            offset = _write(buffer, offset, _encoders[segment](args[index]))
+            index += 1
+        elif segment in _constants:
+            index += 1
+        elif segment == "[":
+            arrays.append((args, index + 1))
+            args = args[index]
+            index = 0
+        else:
+            args, index = arrays.pop()
+    return offset
+
+
+def decode_osc(data, start, end, depth=0):
     """Converts a binary OSC message to a Python list.
 
+    Bundles are decoded into nested lists, see :func:`walk_bundle` for
+    processing big bundles one message at a time.
+
     :param data: the binary representation of an osc message
     :type data: str
 
@@ -353,8 +756,12 @@ def decode_osc(data, start, end):
     :param end: length of data
     :type end: int
 
+    :param depth: number of bundles enclosing this one
+    :type depth: int
+
     :returns: osc_address, typetags, args
     :rtype: tuple
+    :raises: OSCError if bundles are nested deeper than MAX_BUNDLE_DEPTH
     """
 
     if end == 0:
@@ -369,11 +776,17 @@ def decode_osc(data, start, end):
         address = ""
 
     if address == "#bundle":
+        if depth >= MAX_BUNDLE_DEPTH:
+            raise OSCError("bundles nested deeper than %d" % MAX_BUNDLE_DEPTH)
         typetags, rest = decode_timetag(data, rest, end)
         while rest - end:
+            if end - rest < 4:
+                raise OSCError("truncated bundle element")
             length, rest = decode_int(data, rest, end)
             new_end = rest + length
-            args.append(decode_osc(data, rest, new_end))
+            if length <= 0 or new_end > end:
+                raise OSCError("invalid bundle element size %d" % length)
+            args.append(decode_osc(data, rest, new_end, depth + 1))
             rest = new_end
     elif rest - end:
         if typetags is None:
@@ -382,30 +795,90 @@ def decode_osc(data, start, end):
         if not typetags.startswith(","):
             raise OSCError("OSCMessage's typetag-string lacks the magic ','")
 
+        args = decode_arguments(data, rest, end, typetags[1:])
         typetags = list(typetags[1:])
-        len_typetags = len(typetags)
-
-        for i in range(len_typetags):
-            typetag = typetags[i]
-            if typetag == "i":
-                argument, rest = decode_int(data, rest, end)
-            elif typetag == "s":
-                argument, rest = decode_string(data, rest, end)
-            elif typetag == "f":
-                argument, rest = decode_float(data, rest, end)
-            elif typetag == "b":
-                argument, rest = decode_blob(data, rest, end)
-            elif typetag == "d":
-                argument, rest = decode_double(data, rest, end)
-            elif typetag == "t":
-                argument, rest = decode_timetag(data, rest, end)
-            else:
-                raise OSCError("unknown typetag %r" % typetag)
-            args.append(argument)
 
     return address, typetags, args
 
 
+def walk_bundle(data, start=0, end=None, max_depth=MAX_BUNDLE_DEPTH,
+    max_elements=MAX_BUNDLE_ELEMENTS, views=False):
+    """Yields the messages of a binary bundle one at a time
+
+    Nested bundles are walked iteratively with a stack of the enclosing
+    bundles, so neither the nesting depth nor the size of a bundle costs
+    more than constant memory per level. Nothing is decoded before the
+    consumer asks for the next message, so a malformed element is only
+    reported when the walk reaches it.
+
+    :param data: the binary representation of an osc bundle
+    :type data: str
+
+    :param start: position of the bundle in data
+    :type start: int
+
+    :param end: end position of the bundle in data, defaults to the length
+        of data
+    :type end: int
+
+    :param max_depth: how deep bundles may be nested, the outermost bundle
+        has depth 1
+    :type max_depth: int
+
+    :param max_elements: how many messages and bundles the bundle may
+        contain at all levels
+    :type max_elements: int
+
+    :param views: if True, yield an :class:`OSCMessageView` instead of the
+        position of each message
+    :type views: bool
+
+    :returns: generator of (timetag, offset, length) tuples of the messages,
+        or (timetag, OSCMessageView) tuples, the timetag being the one of
+        the innermost enclosing bundle
+    :raises: OSCError if data is no bundle, a limit is exceeded or an
+        element does not fit into its bundle
+    """
+    if end is None:
+        end = len(data)
+    if start < 0 or end > len(data) or end - start < 16 or \
+        not data.startswith(_bundle_address, start):
+        raise OSCError("no osc bundle")
+    unpack_size = _int_struct.unpack_from
+    # (end, timetag) of the bundles enclosing the current position
+    stack = [(end, decode_timetag(data, start + 8, end)[0])]
+    rest = start + 16
+    elements = 0
+    while stack:
+        end, timetag = stack[-1]
+        if rest == end:
+            stack.pop()
+            continue
+        if end - rest < 4:
+            raise OSCError("truncated bundle element")
+        length = unpack_size(data, rest)[0]
+        rest += 4
+        if length <= 0 or rest + length > end:
+            raise OSCError("invalid bundle element size %d" % length)
+        elements += 1
+        if elements > max_elements:
+            raise OSCError("bundle has more than %d elements" % max_elements)
+        if data.startswith(_bundle_address, rest, rest + length):
+            if len(stack) >= max_depth:
+                raise OSCError("bundles nested deeper than %d" % max_depth)
+            if length < 16:
+                raise OSCError("truncated bundle")
+            stack.append((rest + length,
+                decode_timetag(data, rest + 8, rest + length)[0]))
+            rest += 16
+        else:
+            if views:
+                yield timetag, OSCMessageView(data, rest, rest + length)
+            else:
+                yield timetag, rest, length
+            rest += length
+
+
 def proxy_decode_osc(data, start, end):
     """Converts a binary OSC message to a Python list.
     """
@@ -430,28 +903,278 @@ def proxy_decode_osc(data, start, end):
         if not typetags.startswith(","):
             raise OSCError("OSCMessage's typetag-string lacks the magic ','")
 
+        args = decode_arguments(data, rest, end, typetags[1:])
         typetags = list(typetags[1:])
-        len_typetags = len(typetags)
-
-        for i in range(len_typetags):
-            typetag = typetags[i]
-            if typetag == "i":
-                argument, rest = decode_int(data, rest, end)
-            elif typetag == "s":
-                argument, rest = decode_string(data, rest, end)
-            elif typetag == "f":
-                argument, rest = decode_float(data, rest, end)
+
+    return address, typetags, args
+
+
+# byte sizes of the fixed size arguments
+_argument_sizes = {"i" : 4, "f" : 4, "d" : 8, "t" : 8, "h" : 8, "r" : 4,
+    "c" : 4, "m" : 4, "T" : 0, "F" : 0, "N" : 0, "I" : 0}
+
+
+class _ViewReader(object):
+    """Gives a memoryview the slicing and find of str, copying only the
+    bytes asked for"""
+
+    __slots__ = ("view",)
+
+    def __init__(self, view):
+        self.view = view
+
+    def __len__(self):
+        return len(self.view)
+
+    def __getitem__(self, index):
+        return self.view[index].tobytes()
+
+    def find(self, needle, start, end):
+        # searches in chunks, so only the bytes up to the match are copied
+        view = self.view
+        position = start
+        while position < end:
+            chunk_end = min(position + 64, end)
+            found = view[position:chunk_end].tobytes().find(needle)
+            if found >= 0:
+                return position + found
+            position = chunk_end
+        return -1
+
+
+def _to_str(data):
+    if isinstance(data, _ViewReader):
+        return data.view.tobytes()
+    return str(data)
+
+
+class OSCMessageView(object):
+    """Read-only view of a binary osc message
+
+    Only the address and the typetag string are read when the view is
+    created. The offsets of the arguments are found on demand and an argument
+    is only converted to a python object when it's accessed, so consumers
+    looking at a few arguments don't pay for the others. Indexing, len and
+    iteration work like on the args list returned by :func:`decode_osc` and
+    yield the same values.
+
+    The view pays off for consumers reading a few arguments of a message or
+    only routing by address and typetags. Iteration and :meth:`values`
+    decode all arguments in one go and cost about as much as
+    :func:`decode_osc`, while indexing every argument one by one is slower.
+
+    str and bytearray packets are read in place, memoryviews through a
+    reader copying only the bytes of the argument accessed, since python 2
+    memoryviews can't be searched. Other buffers are copied once.
+    :meth:`raw` returns a memoryview of a string or blob argument without
+    copying it.
+
+    Messages with arrays are decoded at once, since the arguments can't be
+    indexed by typetag. This copies packets which are no str.
+
+    >>> binary = OSCMessage("/fader").encode_osc()
+    >>> view = OSCMessageView(binary)
+    >>> view.address, len(view)
+    ('/fader', 0)
+    """
+
+    __slots__ = ("data", "end", "address", "typetags", "offsets", "args")
+
+    def __init__(self, data, start=0, end=None):
+        """Instantiate a new OSCMessageView
+
+        :param data: the binary representation of an osc message
+        :type data: str
+
+        :param start: position of the message in data
+        :type start: int
+
+        :param end: end position of the message in data, defaults to the
+            length of data
+        :type end: int
+
+        :raises: OSCBundleFound if data is a bundle, OSCError if it's no
+            valid osc message
+        """
+        if isinstance(data, memoryview):
+            data = _ViewReader(data)
+        elif not hasattr(data, "find"):
+            data = str(data)
+        if end is None:
+            end = len(data)
+        if end - start <= 0:
+            raise OSCError("empty")
+        self.data = data
+        self.end = end
+
+        address_end = data.find("\0", start, end)
+        if address_end < 0:
+            raise OSCError("unterminated osc address")
+        address = str(data[start:address_end])
+        if address == "#bundle":
+            raise OSCBundleFound()
+        rest = (address_end + 4) & ~3
+
+        typetags = ","
+        if address.startswith(","):
+            typetags = address
+            address = ""
+        elif rest < end:
+            typetags_end = data.find("\0", rest, end)
+            if typetags_end < 0:
+                raise OSCError("unterminated typetag string")
+            typetags = str(data[rest:typetags_end])
+            rest = (typetags_end + 4) & ~3
+        if not typetags.startswith(","):
+            raise OSCError("OSCMessage's typetag-string lacks the magic ','")
+
+        self.address = address
+        self.typetags = typetags[1:]
+        self.offsets = [rest]
+        self.args = None
+        if "[" in typetags:
+            self.args = decode_arguments(_to_str(data), rest, end,
+                typetags[1:])
+
+    def __repr__(self):
+        return "OSCMessageView(%r, %r)" % (self.address, self.typetags)
+
+    def __len__(self):
+        if self.args is not None:
+            return len(self.args)
+        return len(self.typetags)
+
+    def __iter__(self):
+        return iter(self.values())
+
+    def __offset(self, index):
+        """Returns the start of the argument at index, scanning the
+        arguments before it if they were not scanned yet"""
+        offsets = self.offsets
+        data = self.data
+        typetags = self.typetags
+        while len(offsets) <= index:
+            position = offsets[-1]
+            typetag = typetags[len(offsets) - 1]
+            size = _argument_sizes.get(typetag)
+            if size is not None:
+                position += size
+            elif typetag == "s" or typetag == "S":
+                position = data.find("\0", position, self.end)
+                if position < 0:
+                    raise OSCError("unterminated string argument")
+                position = (position + 4) & ~3
             elif typetag == "b":
-                argument, rest = decode_blob(data, rest, end)
-            elif typetag == "d":
-                argument, rest = decode_double(data, rest, end)
-            elif typetag == "t":
-                argument, rest = decode_timetag(data, rest, end)
+                if position + 4 > self.end:
+                    raise OSCError("truncated blob argument")
+                position += 4 + ((_int_struct.unpack(data[position:
+                    position + 4])[0] + 3) & ~3)
             else:
                 raise OSCError("unknown typetag %r" % typetag)
-            args.append(argument)
+            offsets.append(position)
+        return offsets[index]
 
-    return address, typetags, args
+    def __getitem__(self, index):
+        if self.args is not None:
+            return self.args[index]
+        typetags = self.typetags
+        if isinstance(index, slice):
+            return [self[i] for i in xrange(*index.indices(len(typetags)))]
+        if index < 0:
+            index += len(typetags)
+        if not 0 <= index < len(typetags):
+            raise IndexError("argument index out of range")
+
+        data = self.data
+        position = self.__offset(index)
+        typetag = typetags[index]
+        size = _argument_sizes.get(typetag)
+        if size is not None and position + size > self.end:
+            raise OSCError("truncated osc message")
+        try:
+            fixed = _fixed_structs.get(typetag)
+            if fixed is not None:
+                return fixed.unpack(data[position:position + size])[0]
+            elif typetag == "s" or typetag == "S":
+                end = data.find("\0", position, self.end)
+                if end < 0:
+                    raise OSCError("unterminated string argument")
+                return str(data[position:end])
+            elif typetag == "b":
+                # like decode_blob including the padding
+                end = self.__offset(index + 1)
+                if end > self.end:
+                    raise OSCError("truncated blob argument")
+                return str(data[position + 4:end])
+            elif typetag in _constants:
+                return _constants[typetag]
+            elif typetag in _decoders:
+                return _decoders[typetag](str(data[position:position + size]),
+                    0, size)[0]
+        except StructError:
+            raise OSCError("truncated osc message")
+        raise OSCError("unknown typetag %r" % typetag)
+
+    def raw(self, index):
+        """Returns the bytes of a string or blob argument as memoryview
+        without copying them, excluding terminator, size and padding
+
+        :rtype: memoryview
+        """
+        if self.args is not None:
+            raise OSCError("raw is not supported for messages with arrays")
+        if index < 0:
+            index += len(self.typetags)
+        typetag = self.typetags[index]
+        position = self.__offset(index)
+        if typetag == "s" or typetag == "S":
+            end = self.data.find("\0", position, self.end)
+            if end < 0:
+                raise OSCError("unterminated string argument")
+        elif typetag == "b":
+            if position + 4 > self.end:
+                raise OSCError("truncated blob argument")
+            end = position + 4 + _int_struct.unpack(self.data[position:
+                position + 4])[0]
+            if end > self.end:
+                raise OSCError("truncated blob argument")
+            position += 4
+        else:
+            raise OSCError("argument %d is no string or blob" % index)
+        data = self.data
+        if isinstance(data, _ViewReader):
+            return data.view[position:end]
+        return memoryview(data)[position:end]
+
+    def tags(self):
+        """Returns a list of the typetags
+
+        :rtype: list of str
+        """
+        return list(self.typetags)
+
+    def values(self):
+        """Returns a list of all arguments
+
+        For str packets all arguments are decoded in one go like by
+        :func:`decode_osc`, which is faster than indexing them one by one.
+        Other packets are indexed to avoid copying them.
+
+        :rtype: list
+        """
+        if self.args is not None:
+            return list(self.args)
+        if type(self.data) is str:
+            return decode_arguments(self.data, self.offsets[0], self.end,
+                self.typetags)
+        return [self[i] for i in xrange(len(self.typetags))]
+
+    def items(self):
+        """Returns a list of (typetag, value) tuples of all arguments
+
+        :rtype: list
+        """
+        return zip(self.typetags, self)
 
 
 class OSCMessage(object):
@@ -851,27 +1574,156 @@ class OSCMessage(object):
         :rtype: str
         """
 
-        tmp = list()
-        for typetag, argument in izip(self.typetags, self.args):
-            if typetag == "s":
-                tmp.append(encode_string(argument))
-            elif typetag == 'i':
-                tmp.append(pack(">i", argument))
-            elif typetag == 'f':
-                tmp.append(pack(">f", argument))
-            elif typetag == 'b':
-                tmp.append(encode_blob(argument))
-            elif typetag == 'd':
-                tmp.append(pack(">d", argument))
-            elif typetag == 't':
-                tmp.append(encode_timetag(argument))
-            else:
-                raise TypeError("unknown typetag %r" % typetag)
+        typetags = "".join(self.typetags)
+        try:
+            arguments = encode_arguments(typetags, self.args)
+        except OSCError, error:
+            raise TypeError(str(error))
 
-        return "%s%s%s" % (
-            encode_string(self.address),
-            encode_string(",%s" % "".join(self.typetags)),
-            "".join(tmp))
+        return "%s%s%s" % (encode_string(self.address),
+            encode_string("," + typetags), arguments)
+
+    def _encode_parts(self, parts):
+        data = self.encode_osc()
+        parts.append(data)
+        return len(data)
+
+    def encoded_size(self):
+        """Returns the byte size of the binary representation
+
+        :rtype: int
+        """
+        typetags = "".join(self.typetags)
+        try:
+            arguments_size = encoded_arguments_size(typetags, self.args)
+        except OSCError, error:
+            raise TypeError(str(error))
+        return ((len(self.address) & ~3) + 4 + ((len(typetags) + 1) & ~3) +
+            4 + arguments_size)
+
+    def encode_into(self, buffer, offset=0):
+        """Writes the binary representation into a preallocated buffer
+
+        The arguments are packed directly into the buffer. If it's too
+        small, the bytes written up to then are undefined. In this pure
+        python codec it is not faster than :meth:`encode_osc`, it only saves
+        copying the result; the C codec packs messages and bundles into the
+        buffer at the speed of encode_osc or faster.
+
+        :param buffer: the buffer to write to
+        :type buffer: bytearray
+
+        :param offset: position in buffer to start writing
+        :type offset: int
+
+        :returns: the position after the message
+        :rtype: int
+        :raises: ValueError if the buffer is too small
+        """
+        if offset < 0:
+            raise ValueError("negative offset %d" % offset)
+        return self._encode_into(buffer, offset)
+
+    def _encode_into(self, buffer, offset):
+        typetags = "".join(self.typetags)
+        address = self.address
+        typetags_string = "," + typetags
+        prefix = "%s%s%s%s" % (address, _string_padding[len(address) & 3],
+            typetags_string, _string_padding[len(typetags_string) & 3])
+        end = offset + len(prefix)
+        if end > len(buffer):
+            raise ValueError("buffer too small, %d bytes needed" % end)
+        buffer[offset:end] = prefix
+        try:
+            return encode_arguments_into(buffer, end, typetags, self.args)
+        except OSCError, error:
+            raise TypeError(str(error))
+
+
+
+class OSCMessageTemplate(object):
+    """Encodes messages of one osc address and typetag string
+
+    The address and typetag string are encoded once, :meth:`encode` only
+    packs the arguments. If all arguments have a fixed width, that's a single
+    struct.pack call.
+
+    >>> template = OSCMessageTemplate("/fader", "if")
+    >>> msg = OSCMessage("/fader")
+    >>> msg.appendTypedArg(1, "i")
+    >>> msg.appendTypedArg(0.5, "f")
+    >>> template.encode(1, 0.5) == msg.encode_osc()
+    True
+    """
+
+    def __init__(self, address, typetags):
+        """Instantiate a new OSCMessageTemplate
+
+        :param address: the osc address
+        :type address: str
+
+        :param typetags: the typetags without the leading ','
+        :type typetags: str
+
+        :raises: OSCError for unknown typetags
+        """
+        super(OSCMessageTemplate, self).__init__()
+        self.address = address
+        self.typetags = typetags
+        self.prefix = encode_string(address) + encode_string("," + typetags)
+        codec = typetag_codec(typetags)
+        self.fixed = None
+        if len(codec) == 1 and codec[0].__class__ is tuple:
+            self.fixed = codec[0][0]
+        self.arguments = argument_count(typetags)
+        self.used = 0
+
+    def __repr__(self):
+        return "OSCMessageTemplate(%r, %r)" % (self.address, self.typetags)
+
+    def encode(self, *args):
+        """Returns the binary representation of a message with the given
+        arguments
+
+        :rtype: str
+        """
+        if len(args) != self.arguments:
+            raise TypeError("%s takes %d arguments, got %d" % (self,
+                self.arguments, len(args)))
+        if self.fixed is not None:
+            return self.prefix + self.fixed.pack(*args)
+        return self.prefix + encode_arguments(self.typetags, args)
+
+
+def message_template(address, typetags):
+    """Returns a shared :class:`OSCMessageTemplate`
+
+    Templates are cached per address and typetag string. The cache keeps the
+    1024 most recently used templates, if it's full the least recently used
+    quarter is dropped.
+
+    :param address: the osc address
+    :type address: str
+
+    :param typetags: the typetags without the leading ','
+    :type typetags: str
+
+    :rtype: OSCMessageTemplate
+    """
+    global _templates_clock
+    _templates_clock += 1
+    key = (address, typetags)
+    try:
+        template = _templates[key]
+    except KeyError:
+        if len(_templates) >= _templates_size:
+            by_use = sorted(_templates.itervalues(),
+                key=attrgetter("used"))
+            for template in by_use[:_templates_size / 4]:
+                del _templates[(template.address, template.typetags)]
+        template = _templates[key] = OSCMessageTemplate(address, typetags)
+    template.used = _templates_clock
+    return template
 
 
 
@@ -941,15 +1793,72 @@ class OSCBundle(object):
     def encode_osc(self):
         """Returns the binary representation of the message
 
+        The tree is walked once, collecting the encoded messages and the
+        headers and sizes of the bundles in one list, which is joined at the
+        end. So nested elements are copied once, not once per nesting level.
+
         :returns: the binary representation
         :rtype: str
         """
+        parts = list()
+        self._encode_parts(parts)
+        return "".join(parts)
+
+    def _encode_parts(self, parts):
+        """Appends the parts of the binary representation to parts and
+        returns their total size"""
+        parts.append(_bundle_address + encode_timetag(self.timetag))
+        size = 16
+        for element in self.args:
+            index = len(parts)
+            parts.append(None)
+            length = element._encode_parts(parts)
+            parts[index] = _int_struct.pack(length)
+            size += 4 + length
+        return size
+
+    def encoded_size(self):
+        """Returns the byte size of the binary representation
+
+        :rtype: int
+        """
+        size = 16
+        for element in self.args:
+            size += 4 + element.encoded_size()
+        return size
+
+    def encode_into(self, buffer, offset=0):
+        """Writes the binary representation into a preallocated buffer
+
+        The tree is walked once, the sizes of the elements are filled in
+        after writing them. If the buffer is too small, the bytes written up
+        to then are undefined.
+
+        :param buffer: the buffer to write to
+        :type buffer: bytearray
 
-        return "%s%s%s" % (
-            encode_string("#bundle"),
-            encode_timetag(self.timetag),
-            "".join([encode_blob(argument.encode_osc())
-                for argument in self.args]))
+        :param offset: position in buffer to start writing
+        :type offset: int
+
+        :returns: the position after the bundle
+        :rtype: int
+        :raises: ValueError if the buffer is too small
+        """
+        if offset < 0:
+            raise ValueError("negative offset %d" % offset)
+        return self._encode_into(buffer, offset)
+
+    def _encode_into(self, buffer, offset):
+        offset = _write(buffer, offset,
+            _bundle_address + encode_timetag(self.timetag))
+        for element in self.args:
+            if offset + 4 > len(buffer):
+                raise ValueError("buffer too small, %d bytes needed" %
+                    (offset + 4))
+            end = element._encode_into(buffer, offset + 4)
+            _int_struct.pack_into(buffer, offset, end - offset - 4)
+            offset = end
+        return offset
 
     def __eq__(self, other):
         """Return True if two OSCBundles have the same timetag & content
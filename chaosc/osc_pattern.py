@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+
+'''This module implements OSC 1.0 address pattern matching and a dispatcher
+mapping osc addresses to the handlers registered for matching patterns'''
+
+# This file is part of chaosc
+#
+# chaosc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# chaosc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with chaosc.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2012-2014 Stefan Kögl
+
+from __future__ import absolute_import
+
+import re
+
+
+__all__ = ["PatternDispatcher", "compile_pattern", "is_pattern",
+    "translate_pattern"]
+
+
+_pattern_chars = re.compile(r"[*?\[\]{}]")
+
+# pattern -> match method of the compiled regular expression
+_compiled = dict()
+_compiled_size = 1024
+
+
+def is_pattern(address):
+    """Returns True if the osc address contains pattern characters
+
+    :rtype: bool
+    """
+    return _pattern_chars.search(address) is not None
+
+
+def translate_pattern(pattern):
+    """Translates an OSC 1.0 address pattern into a regular expression
+
+    '?' matches one character and '*' any number of characters of a part of
+    the address, but never '/'. '[a-z]' matches one character of the list
+    or range, '[!a-z]' one character not in it, neither of them '/'.
+    '{foo,bar}' matches one of the comma separated strings.
+
+    :param pattern: the osc address pattern
+    :type pattern: str
+
+    :rtype: str
+    :raises: ValueError if a '[' or '{' is not closed
+    """
+    result = list()
+    position = 0
+    length = len(pattern)
+    while position < length:
+        char = pattern[position]
+        position += 1
+        if char == "*":
+            result.append("[^/]*")
+        elif char == "?":
+            result.append("[^/]")
+        elif char == "[":
+            end = pattern.find("]", position)
+            if end < 0:
+                raise ValueError("unterminated '[' in %r" % pattern)
+            chars = pattern[position:end]
+            position = end + 1
+            negate = chars.startswith("!")
+            if negate:
+                chars = chars[1:]
+            if not chars:
+                raise ValueError("empty '[]' in %r" % pattern)
+            chars = chars.replace("\\", "\\\\").replace("^", "\\^").replace(
+                "[", "\\[")
+            result.append(negate and "[^/%s]" % chars or "(?!/)[%s]" % chars)
+        elif char == "{":
+            end = pattern.find("}", position)
+            if end < 0:
+                raise ValueError("unterminated '{' in %r" % pattern)
+            result.append("(?:%s)" % "|".join([re.escape(alternative)
+                for alternative in pattern[position:end].split(",")]))
+            position = end + 1
+        elif char in "]}":
+            raise ValueError("unmatched %r in %r" % (char, pattern))
+        else:
+            match = _pattern_chars.search(pattern, position)
+            end = match is None and length or match.start()
+            result.append(re.escape(pattern[position - 1:end]))
+            position = end
+    result.append(r"\Z")
+    return "".join(result)
+
+
+def compile_pattern(pattern):
+    """Returns a function matching osc addresses against an osc address
+    pattern
+
+    The function returns a true value if the whole address matches. Compiled
+    patterns are cached.
+
+    :param pattern: the osc address pattern
+    :type pattern: str
+
+    :rtype: callable
+    :raises: ValueError for invalid patterns
+    """
+    try:
+        return _compiled[pattern]
+    except KeyError:
+        pass
+    try:
+        match = re.compile(translate_pattern(pattern)).match
+    except re.error, error:
+        raise ValueError("invalid pattern %r - %s" % (pattern, error))
+    if len(_compiled) >= _compiled_size:
+        _compiled.clear()
+    _compiled[pattern] = match
+    return match
+
+
+class _Node(object):
+    """A segment of registered osc addresses"""
+
+    __slots__ = ("children", "handlers", "prefix_handlers")
+
+    def __init__(self):
+        self.children = dict()
+        self.handlers = list()
+        self.prefix_handlers = list()
+
+
+class PatternDispatcher(object):
+    """Finds the handlers of osc addresses
+
+    Handlers are registered for concrete addresses, for prefixes matching
+    all addresses below them, or for OSC 1.0 address patterns. Concrete
+    addresses and prefixes are kept in a trie of the address segments, so
+    all of them are found in one walk along the address. :meth:`match`
+    returns the handlers of all registrations matching an address: the
+    concrete ones first, then the prefixes from the longest to the shortest
+    and the patterns in the order of registration. If `incoming_patterns` is
+    True, incoming addresses can be patterns too as in OSC 1.0 and are
+    matched against the registered concrete addresses.
+
+    Results are cached per address, so resolving only costs something for
+    the first packet of an address. The cache keeps two generations of
+    `cache_size` addresses. If the current one is full, it replaces the
+    older one, and addresses found in the older generation are moved back
+    into the current one. So the least recently used addresses are dropped
+    without bookkeeping per lookup.
+    """
+
+    def __init__(self, cache_size=1024, incoming_patterns=True):
+        """Instantiate a new PatternDispatcher
+
+        :param cache_size: addresses per cache generation
+        :type cache_size: int
+
+        :param incoming_patterns: if incoming addresses with pattern
+            characters are matched against the registered addresses
+        :type incoming_patterns: bool
+        """
+        super(PatternDispatcher, self).__init__()
+        self.cache_size = cache_size
+        self.incoming_patterns = incoming_patterns
+        self.root = _Node()
+        # address -> handlers of the concrete address, shared with its node
+        self.exact = dict()
+        # prefix -> handlers of the prefix, shared with its node
+        self.prefixes = dict()
+        # list of (pattern, match, handler)
+        self.patterns = list()
+        self.recent = dict()
+        self.older = dict()
+
+    def __len__(self):
+        return len(self.exact) + len(self.prefixes) + len(self.patterns)
+
+    def __contains__(self, pattern):
+        return pattern in self.exact or pattern in [registered for
+            registered, match, handler in self.patterns]
+
+    def __key(self, pattern, prefix):
+        if prefix:
+            if is_pattern(pattern):
+                raise ValueError("prefix %r can not be a pattern" % pattern)
+            return pattern.rstrip("/")
+        return pattern
+
+    def add(self, pattern, handler, prefix=False, replace=True):
+        """Registers a handler for an osc address or address pattern
+
+        :param pattern: the osc address or address pattern
+        :type pattern: str
+
+        :param handler: the handler
+        :type handler: callable
+
+        :param prefix: if True, the handler gets all messages with
+            addresses below `pattern`, which may not contain pattern
+            characters
+        :type prefix: bool
+
+        :param replace: if True, the handler replaces the handlers
+            registered for the same pattern, else it is added to them
+        :type replace: bool
+
+        :raises: ValueError for invalid patterns
+        """
+        if not prefix and is_pattern(pattern):
+            match = compile_pattern(pattern)
+            if replace:
+                self.patterns = [item for item in self.patterns
+                    if item[0] != pattern]
+            self.patterns.append((pattern, match, handler))
+        else:
+            key = self.__key(pattern, prefix)
+            node = self.root
+            for part in key.split("/")[1:]:
+                child = node.children.get(part)
+                if child is None:
+                    child = node.children[part] = _Node()
+                node = child
+            if prefix:
+                handlers = self.prefixes[key] = node.prefix_handlers
+            else:
+                handlers = self.exact[key] = node.handlers
+            if replace:
+                del handlers[:]
+            handlers.append(handler)
+        self.clear_cache()
+
+    def remove(self, pattern, handler=None, prefix=False):
+        """Removes the handlers of an osc address or address pattern
+
+        :param handler: only this handler is removed if given
+        :type handler: callable
+
+        :param prefix: if `pattern` was registered as prefix
+        :type prefix: bool
+
+        :raises: KeyError if nothing is registered for pattern
+        """
+        if not prefix and is_pattern(pattern):
+            patterns = [item for item in self.patterns if item[0] != pattern
+                or handler is not None and item[2] != handler]
+            if len(patterns) == len(self.patterns):
+                raise KeyError(pattern)
+            self.patterns = patterns
+            self.clear_cache()
+            return
+
+        key = self.__key(pattern, prefix)
+        if prefix:
+            registered = self.prefixes
+        else:
+            registered = self.exact
+        handlers = registered[key]
+        remaining = [item for item in handlers
+            if handler is not None and item != handler]
+        if len(remaining) == len(handlers):
+            raise KeyError(pattern)
+        handlers[:] = remaining
+        if not handlers:
+            del registered[key]
+            # prunes the nodes left without handlers and children
+            path = key.split("/")[1:]
+            nodes = [self.root]
+            for part in path:
+                nodes.append(nodes[-1].children[part])
+            for depth in xrange(len(path), 0, -1):
+                node = nodes[depth]
+                if node.children or node.handlers or node.prefix_handlers:
+                    break
+                del nodes[depth - 1].children[path[depth - 1]]
+        self.clear_cache()
+
+    def clear_cache(self):
+        self.recent = dict()
+        self.older = dict()
+
+    def match(self, address):
+        """Returns the handlers for an osc address
+
+        :param address: the osc address of a message
+        :type address: str
+
+        :returns: tuple of handlers, empty if none matches
+        :rtype: tuple
+        """
+        handlers = self.recent.get(address)
+        if handlers is not None:
+            return handlers
+        handlers = self.older.get(address)
+        if handlers is None:
+            handlers = self.__resolve(address)
+        if len(self.recent) >= self.cache_size:
+            self.older = self.recent
+            self.recent = dict()
+        self.recent[address] = handlers
+        return handlers
+
+    def __resolve(self, address):
+        if self.incoming_patterns and is_pattern(address):
+            try:
+                match = compile_pattern(address)
+            except ValueError:
+                return ()
+            result = list()
+            for registered in sorted(self.exact):
+                if match(registered):
+                    result.extend(self.exact[registered])
+            return tuple(result)
+
+        # the prefix handlers of the nodes above the address
+        prefixes = list()
+        node = self.root
+        for part in address.split("/")[1:]:
+            if node.prefix_handlers:
+                prefixes.append(node.prefix_handlers)
+            node = node.children.get(part)
+            if node is None:
+                break
+
+        result = list()
+        if node is not None:
+            result.extend(node.handlers)
+        for handlers in reversed(prefixes):
+            result.extend(handlers)
+        for pattern, match, handler in self.patterns:
+            if match(address):
+                result.append(handler)
+        return tuple(result)
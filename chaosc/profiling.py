@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+'''This module implements a sampling profiler which can be started and stopped
+while chaosc or a tool is running'''
+
+# This file is part of chaosc
+#
+# chaosc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# chaosc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with chaosc.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2012-2014 Stefan Kögl
+
+from __future__ import absolute_import
+
+import os.path
+import signal
+
+from collections import defaultdict
+from datetime import datetime
+from time import time
+
+from chaosc.lib import logger
+
+
+__all__ = ["SamplingProfiler", "default_profile_path"]
+
+
+def default_profile_path(directory, name):
+    """Returns a timestamped path for a profile of the named program"""
+    return os.path.join(os.path.expanduser(directory), datetime.now().strftime(
+        "%s-profile-%%Y%%m%%d-%%H%%M%%S.collapsed" % name))
+
+
+class SamplingProfiler(object):
+    """Samples the stack of the main thread every `interval` seconds of cpu
+    time
+
+    Uses the ITIMER_PROF interval timer and SIGPROF, so only one instance can
+    run per process and it has to be started from the main thread. Samples
+    are only taken while the process is busy, waiting in select costs
+    nothing. Profiling stops after `duration` seconds or `max_samples`
+    samples at the latest.
+
+    The result is written in the collapsed stack format, one line per
+    distinct stack with its sample count, which flamegraph.pl, speedscope
+    and similar tools read.
+    """
+
+    def __init__(self, interval=0.005, max_samples=100000):
+        """Instantiate a new SamplingProfiler
+
+        :param interval: seconds of cpu time between samples
+        :type interval: float
+
+        :param max_samples: upper bound of samples per run
+        :type max_samples: int
+        """
+        super(SamplingProfiler, self).__init__()
+        self.interval = interval
+        self.max_samples = max_samples
+        self.stacks = defaultdict(int)
+        self.samples = 0
+        self.path = None
+        self.deadline = None
+        self.previous_handler = None
+        self.names = dict()
+
+    @property
+    def running(self):
+        return self.path is not None
+
+    def start(self, path, duration=60.):
+        """Starts sampling
+
+        :param path: where to write the profile when stopped
+        :type path: str
+
+        :param duration: seconds until profiling stops on its own, None for
+            no limit
+        :type duration: float
+
+        :raises: ValueError if already running or not supported
+        """
+        if self.running:
+            raise ValueError("profiler already running")
+        if not hasattr(signal, "setitimer"):
+            raise ValueError("sampling profiler not supported on this platform")
+        self.stacks.clear()
+        self.samples = 0
+        self.path = os.path.expanduser(path)
+        self.deadline = duration and time() + duration or None
+        self.previous_handler = signal.signal(signal.SIGPROF, self.__sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        logger.info("profiling to %r", self.path)
+
+    def stop(self):
+        """Stops sampling and writes the profile
+
+        :returns: the path of the profile
+        :rtype: str
+        :raises: ValueError if not running, IOError
+        """
+        if not self.running:
+            raise ValueError("profiler not running")
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self.previous_handler or signal.SIG_DFL)
+        path = self.path
+        self.path = None
+        with open(path, "w") as fileobj:
+            for stack, count in sorted(self.stacks.iteritems(),
+                key=lambda item: -item[1]):
+                fileobj.write("%s %d\n" % (stack, count))
+        logger.info("wrote %d samples of %d stacks to %r", self.samples,
+            len(self.stacks), path)
+        return path
+
+    def __name(self, code):
+        try:
+            return self.names[code]
+        except KeyError:
+            name = self.names[code] = "%s (%s:%d)" % (code.co_name,
+                os.path.basename(code.co_filename), code.co_firstlineno)
+            return name
+
+    def __sample(self, signum, frame):
+        names = list()
+        while frame is not None:
+            names.append(self.__name(frame.f_code))
+            frame = frame.f_back
+        names.reverse()
+        self.stacks[";".join(names)] += 1
+        self.samples += 1
+
+        if self.samples >= self.max_samples or (
+            self.deadline is not None and time() >= self.deadline):
+            try:
+                self.stop()
+            except IOError, error:
+                logger.error("writing profile failed - %s", error)
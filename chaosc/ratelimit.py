@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+
+'''This module implements token bucket rate limiting for the chaosc ingress'''
+
+# This file is part of chaosc
+#
+# chaosc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# chaosc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with chaosc.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2012-2014 Stefan Kögl
+
+from __future__ import absolute_import
+
+from heapq import heappush, heappop
+
+from chaosc.target_groups import bundle_address
+
+
+__all__ = ["TokenBucket", "RateLimiter", "parse_rate", "parse_prefix_rates"]
+
+
+# upper bound of cached osc address to prefix bucket lookups
+PREFIX_CACHE_SIZE = 4096
+
+# upper bound of source host buckets
+SOURCE_BUCKETS_SIZE = 4096
+
+# upper bound of conflated packets waiting for their buckets
+PENDING_SIZE = 4096
+
+
+def parse_rate(spec):
+    """Parses a rate specification "RATE[:BURST]"
+
+    BURST defaults to RATE, but at least 1.
+
+    :param spec: e.g "100" or "100:20"
+    :type spec: str
+
+    :returns: rate in packets per second and burst size
+    :rtype: tuple
+    """
+    if ":" in spec:
+        rate, burst = spec.split(":")
+        return float(rate), float(burst)
+    rate = float(spec)
+    return rate, max(rate, 1.)
+
+
+def parse_prefix_rates(spec):
+    """Parses a comma separated list of "PREFIX=RATE[:BURST]" items
+
+    :param spec: e.g "/sensor=100:20,/video=30"
+    :type spec: str
+
+    :returns: list of (prefix, rate, burst) tuples
+    :rtype: list
+    """
+    result = list()
+    for item in spec.split(","):
+        if not item:
+            continue
+        prefix, rate = item.split("=")
+        result.append((prefix,) + parse_rate(rate))
+    return result
+
+
+class TokenBucket(object):
+    """Allows `rate` packets per second on average and bursts up to `burst`
+    packets.
+
+    The bucket also counts its passed, dropped and conflated packets.
+    """
+
+    def __init__(self, rate, burst, now):
+        super(TokenBucket, self).__init__()
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = now
+        self.passed = 0
+        self.dropped = 0
+        self.conflated = 0
+
+    def refill(self, now):
+        tokens = self.tokens + (now - self.last) * self.rate
+        if tokens > self.burst:
+            tokens = self.burst
+        self.tokens = tokens
+        self.last = now
+        return tokens
+
+    def delay(self, now):
+        """Returns the seconds until the next token is available"""
+        missing = 1. - self.refill(now)
+        if missing > 0.:
+            return missing / self.rate
+        return 0.
+
+
+class RateLimiter(object):
+    """Limits the packets per source host, per osc address prefix or both
+
+    A packet passes if all its buckets have a token left: the one of its
+    source host and the one of the longest matching prefix. Over limit
+    packets are dropped or, in mode "conflate", the latest packet per
+    source host and osc address is kept and forwarded as soon as the
+    buckets allow. Conflated packets superseded by newer ones are counted as
+    conflated.
+
+    Conflated packets are kept in a heap ordered by the time their buckets
+    allow them, so flushing only looks at the packets which are due. The
+    time is computed when a packet gets pending and is a lower bound, since
+    other packets may take tokens from shared buckets in the meantime. A
+    packet popped too early is pushed back with its new time.
+
+    Both tables keyed by source hosts are bounded. The source buckets are
+    kept in two generations of `SOURCE_BUCKETS_SIZE` / 2 hosts like the cache
+    of :class:`chaosc.osc_pattern.PatternDispatcher`: hosts sending again are
+    moved to the current generation, so only the buckets of the least
+    recently seen hosts are evicted. If `PENDING_SIZE` packets are pending,
+    further over limit packets are dropped.
+    """
+
+    def __init__(self, source_rate=None, prefix_rates=(), mode="drop"):
+        """Instantiate a new RateLimiter
+
+        :param source_rate: (rate, burst) per source host or None
+        :type source_rate: tuple
+
+        :param prefix_rates: list of (prefix, rate, burst)
+        :type prefix_rates: list
+
+        :param mode: "drop" or "conflate"
+        :type mode: str
+        """
+        super(RateLimiter, self).__init__()
+        if mode not in ("drop", "conflate"):
+            raise ValueError("unknown over limit mode %r" % mode)
+        self.mode = mode
+        self.source_rate = source_rate
+        self.source_buckets = dict()
+        self.older_source_buckets = dict()
+        # longest prefixes first
+        self.prefix_rates = sorted(prefix_rates, key=lambda item: -len(item[0]))
+        self.prefix_buckets = dict()
+        self.prefix_cache = dict()
+        # (source host, osc address) -> (packet, client_address,
+        # osc_address, buckets)
+        self.pending = dict()
+        # heap of (due time, serial number, key of pending)
+        self.pending_order = list()
+        self.serial = 0
+
+    def __prefix_bucket(self, osc_address, now):
+        try:
+            return self.prefix_cache[osc_address]
+        except KeyError:
+            pass
+
+        bucket = None
+        for prefix, rate, burst in self.prefix_rates:
+            if osc_address.startswith(prefix):
+                try:
+                    bucket = self.prefix_buckets[prefix]
+                except KeyError:
+                    bucket = self.prefix_buckets[prefix] = TokenBucket(rate,
+                        burst, now)
+                break
+        if len(self.prefix_cache) >= PREFIX_CACHE_SIZE:
+            self.prefix_cache.clear()
+        self.prefix_cache[osc_address] = bucket
+        return bucket
+
+    def __buckets(self, host, osc_address, now):
+        buckets = list()
+        if self.source_rate is not None:
+            bucket = self.source_buckets.get(host)
+            if bucket is None:
+                bucket = self.__source_bucket(host, now)
+            buckets.append(bucket)
+        if self.prefix_rates:
+            bucket = self.__prefix_bucket(osc_address, now)
+            if bucket is not None:
+                buckets.append(bucket)
+        return buckets
+
+    def __source_bucket(self, host, now):
+        bucket = self.older_source_buckets.pop(host, None)
+        if bucket is None:
+            bucket = TokenBucket(self.source_rate[0], self.source_rate[1], now)
+        if len(self.source_buckets) >= SOURCE_BUCKETS_SIZE // 2:
+            self.older_source_buckets = self.source_buckets
+            self.source_buckets = dict()
+        self.source_buckets[host] = bucket
+        return bucket
+
+    def __due(self, buckets, now):
+        return now + max([bucket.delay(now) for bucket in buckets] or [0.])
+
+    def admit(self, packet, client_address, osc_address, now):
+        """Returns True if the packet may be forwarded now
+
+        :param packet: the binary representation of an osc message
+        :type packet: str
+
+        :param client_address: (host, port) of the source
+        :type client_address: tuple
+
+        :param osc_address: the osc address of the packet, None for bundles
+        :type osc_address: str
+
+        :param now: the current time in seconds
+        :type now: float
+
+        :rtype: bool
+        """
+        limit_address = osc_address
+        if limit_address is None:
+            limit_address = bundle_address(packet)
+        buckets = self.__buckets(client_address[0], limit_address, now)
+
+        if self.pending:
+            # newer packets must not overtake a pending one
+            key = (client_address[0], limit_address)
+            if key in self.pending:
+                for bucket in buckets:
+                    bucket.conflated += 1
+                self.pending[key] = (packet, client_address, osc_address,
+                    buckets)
+                return False
+
+        for bucket in buckets:
+            if bucket.refill(now) < 1.:
+                break
+        else:
+            for bucket in buckets:
+                bucket.tokens -= 1.
+                bucket.passed += 1
+            return True
+
+        if self.mode == "drop" or len(self.pending) >= PENDING_SIZE:
+            for bucket in buckets:
+                bucket.dropped += 1
+        else:
+            key = (client_address[0], limit_address)
+            self.pending[key] = (packet, client_address, osc_address, buckets)
+            self.serial += 1
+            heappush(self.pending_order, (self.__due(buckets, now),
+                self.serial, key))
+        return False
+
+    def next_deadline(self, now):
+        """Returns the seconds until the next conflated packet may be sent
+        or None if there are no pending packets"""
+        if not self.pending:
+            return None
+        return max(self.pending_order[0][0] - now, 0.)
+
+    def flush(self, now):
+        """Returns the conflated packets which may be forwarded now
+
+        :rtype: list of (packet, client_address, osc_address) tuples
+        """
+        if not self.pending:
+            return ()
+
+        result = list()
+        postponed = list()
+        pending_order = self.pending_order
+        while pending_order and pending_order[0][0] <= now:
+            due, serial, key = heappop(pending_order)
+            packet, client_address, osc_address, buckets = self.pending[key]
+            for bucket in buckets:
+                if bucket.refill(now) < 1.:
+                    postponed.append((self.__due(buckets, now), serial, key))
+                    break
+            else:
+                for bucket in buckets:
+                    bucket.tokens -= 1.
+                    bucket.passed += 1
+                del self.pending[key]
+                result.append((packet, client_address, osc_address))
+        for item in postponed:
+            heappush(pending_order, item)
+        return result
+
+    def stats(self):
+        """Returns the counters of all buckets
+
+        :returns: list of (name, passed, dropped, conflated) tuples where
+            name is a source host or an osc address prefix. Evicted source
+            hosts are not listed.
+        :rtype: list
+        """
+        result = list()
+        for source_buckets in (self.older_source_buckets,
+            self.source_buckets):
+            for host, bucket in source_buckets.iteritems():
+                result.append((host, bucket.passed, bucket.dropped,
+                    bucket.conflated))
+        for prefix, bucket in self.prefix_buckets.iteritems():
+            result.append((prefix, bucket.passed, bucket.dropped,
+                bucket.conflated))
+        return result
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+
+'''This module implements the recording tap of chaosc and its file format'''
+
+# This file is part of chaosc
+#
+# chaosc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# chaosc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with chaosc.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2012-2014 Stefan Kögl
+
+from __future__ import absolute_import
+
+import os
+import os.path
+import struct
+
+from array import array
+from collections import deque
+from threading import Thread
+from time import sleep
+
+from chaosc.lib import logger
+
+
+__all__ = ["MAGIC", "FlightRecorder", "RecordingTap", "write_record",
+    "read_records"]
+
+
+MAGIC = "#chaosc-recording 1\n"
+
+# arrival timestamp, source port, length of source host, length of packet
+_record_header = struct.Struct(">dHHI")
+
+
+def write_record(fileobj, timestamp, client_address, packet):
+    """Writes one record
+
+    :param fileobj: file opened in binary mode
+    :type fileobj: file
+
+    :param timestamp: arrival time in seconds since the epoch
+    :type timestamp: float
+
+    :param client_address: (host, port, ...) of the source
+    :type client_address: tuple
+
+    :param packet: the binary representation of an osc message or bundle
+    :type packet: str
+    """
+    host = client_address[0]
+    fileobj.write(_record_header.pack(timestamp, client_address[1], len(host),
+        len(packet)))
+    fileobj.write(host)
+    fileobj.write(packet)
+
+
+def read_records(fileobj):
+    """Yields (timestamp, (host, port), packet) tuples of a recording
+
+    :param fileobj: file opened in binary mode
+    :type fileobj: file
+
+    :raises: ValueError if the file is no chaosc recording or truncated
+    """
+    if fileobj.read(len(MAGIC)) != MAGIC:
+        raise ValueError("not a chaosc recording")
+    header_size = _record_header.size
+    while True:
+        header = fileobj.read(header_size)
+        if not header:
+            return
+        if len(header) < header_size:
+            raise ValueError("truncated record")
+        timestamp, port, host_length, packet_length = \
+            _record_header.unpack(header)
+        host = fileobj.read(host_length)
+        packet = fileobj.read(packet_length)
+        if len(packet) < packet_length:
+            raise ValueError("truncated record")
+        yield timestamp, (host, port), packet
+
+
+class RecordingTap(Thread):
+    """Writes packets handed over by chaosc to a recording file
+
+    chaosc only appends (timestamp, client_address, packet) tuples to
+    `queue`. Appending to and popping from a deque are atomic, so no lock is
+    taken in the hot path. The thread writes the queued records in the
+    background and sleeps `interval` seconds when the queue is empty. If more
+    than `max_pending` records are waiting, new ones are counted as dropped.
+    """
+
+    def __init__(self, path, interval=0.01, max_pending=100000):
+        """Instantiate a new RecordingTap and open the file for appending
+
+        :param path: file system path of the recording
+        :type path: str
+
+        :param interval: seconds to sleep if there is nothing to write
+        :type interval: float
+
+        :param max_pending: upper bound of queued records
+        :type max_pending: int
+        """
+        super(RecordingTap, self).__init__()
+        self.daemon = True
+        self.path = os.path.expanduser(path)
+        self.interval = interval
+        self.max_pending = max_pending
+        self.queue = deque()
+        self.written = 0
+        self.dropped = 0
+        self.running = True
+        # appending lets a chaosc process taking over continue the recording
+        self.fileobj = open(self.path, "ab")
+        self.fileobj.seek(0, os.SEEK_END)
+        if self.fileobj.tell() == 0:
+            self.fileobj.write(MAGIC)
+
+    def append(self, timestamp, client_address, packet):
+        """Queues a packet for recording, called by chaosc"""
+        queue = self.queue
+        if len(queue) < self.max_pending:
+            queue.append((timestamp, client_address, packet))
+        else:
+            self.dropped += 1
+
+    def run(self):
+        queue = self.queue
+        fileobj = self.fileobj
+        while self.running or queue:
+            if not queue:
+                fileobj.flush()
+                sleep(self.interval)
+                continue
+            try:
+                while True:
+                    timestamp, client_address, packet = queue.popleft()
+                    write_record(fileobj, timestamp, client_address, packet)
+                    self.written += 1
+            except IndexError:
+                pass
+            except (IOError, OSError), error:
+                logger.error("recording to %r failed - %s", self.path, error)
+                self.running = False
+                queue.clear()
+        fileobj.close()
+
+    def stop(self):
+        """Writes the remaining records and closes the file"""
+        self.running = False
+        self.join()
+        logger.info("recorded %d packets to %r, dropped %d", self.written,
+            self.path, self.dropped)
+
+
+class FlightRecorder(object):
+    """Keeps the most recent packets in preallocated memory
+
+    Packets are copied into one byte ring of `size` bytes, their timestamps,
+    offsets and lengths into preallocated arrays of `max_packets` entries, so
+    memory stays constant and recording allocates nothing per packet. The
+    oldest packets are overwritten first. If a packet does not fit before the
+    end of the ring, it's stored at the start and the rest is left unused.
+
+    :meth:`dump` writes the packets in the recording format, oldest first.
+    """
+
+    def __init__(self, size=16 * 1024 * 1024, max_packets=65536):
+        """Instantiate a new FlightRecorder
+
+        :param size: bytes of packet data to keep
+        :type size: int
+
+        :param max_packets: upper bound of packets to keep
+        :type max_packets: int
+        """
+        super(FlightRecorder, self).__init__()
+        self.size = size
+        self.max_packets = max_packets
+        self.buffer = bytearray(size)
+        self.timestamps = array("d", [0.]) * max_packets
+        self.offsets = array("l", [0]) * max_packets
+        self.lengths = array("l", [0]) * max_packets
+        self.addresses = [None] * max_packets
+        # index of the oldest packet, number of packets, write offset
+        self.tail = 0
+        self.count = 0
+        self.position = 0
+
+    def __len__(self):
+        return self.count
+
+    def add(self, timestamp, client_address, packet):
+        """Stores a packet, called by chaosc
+
+        Packets larger than the ring are ignored.
+        """
+        length = len(packet)
+        size = self.size
+        if length > size:
+            return
+        max_packets = self.max_packets
+        offsets = self.offsets
+        position = self.position
+
+        if position + length > size:
+            # the packets behind the write offset are the oldest ones
+            while self.count and offsets[self.tail] >= position:
+                self.tail = (self.tail + 1) % max_packets
+                self.count -= 1
+            position = 0
+        end = position + length
+        while self.count and (self.count == max_packets or
+            position <= offsets[self.tail] < end):
+            self.tail = (self.tail + 1) % max_packets
+            self.count -= 1
+
+        index = (self.tail + self.count) % max_packets
+        self.buffer[position:end] = packet
+        self.timestamps[index] = timestamp
+        offsets[index] = position
+        self.lengths[index] = length
+        self.addresses[index] = client_address
+        self.count += 1
+        self.position = end
+
+    def records(self):
+        """Yields (timestamp, client_address, packet) tuples, oldest first"""
+        buffer = self.buffer
+        for i in xrange(self.count):
+            index = (self.tail + i) % self.max_packets
+            offset = self.offsets[index]
+            yield (self.timestamps[index], self.addresses[index],
+                str(buffer[offset:offset + self.lengths[index]]))
+
+    def dump(self, path):
+        """Writes the kept packets to a new recording file
+
+        :param path: file system path of the recording
+        :type path: str
+
+        :returns: the number of written packets
+        :rtype: int
+        """
+        count = 0
+        with open(os.path.expanduser(path), "wb") as fileobj:
+            fileobj.write(MAGIC)
+            for timestamp, client_address, packet in self.records():
+                write_record(fileobj, timestamp, client_address, packet)
+                count += 1
+        return count
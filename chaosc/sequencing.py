@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+
+'''This module implements sequence numbering and loss detection between
+chaosc and its targets'''
+
+# This file is part of chaosc
+#
+# chaosc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# chaosc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with chaosc.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2012-2014 Stefan Kögl
+
+from __future__ import absolute_import
+
+from collections import deque
+from struct import pack, unpack_from
+
+try:
+    from chaosc.c_osc_lib import encode_string, encode_timetag
+except ImportError:
+    from chaosc.osc_lib import encode_string, encode_timetag
+
+
+__all__ = ["SEQUENCE_ADDRESS", "SEQUENCE_PREFIX", "SequenceTracker",
+    "stamp", "unstamp"]
+
+
+SEQUENCE_ADDRESS = "/chaosc/seq"
+
+# sequence numbers wrap at 2**31
+SEQUENCE_MASK = 0x7fffffff
+
+# A stamped packet is an immediate bundle whose first element is the message
+# "/chaosc/seq ,i number" followed by the original packet.
+SEQUENCE_PREFIX = "%s%s%s%s%s" % (encode_string("#bundle"), encode_timetag(0.),
+    pack(">i", 20), encode_string(SEQUENCE_ADDRESS), encode_string(",i"))
+
+_prefix_length = len(SEQUENCE_PREFIX)
+_packet_offset = _prefix_length + 8
+
+
+def stamp(packet, sequence):
+    """Wraps a packet into a bundle carrying the sequence number
+
+    :param packet: the binary representation of an osc message or bundle
+    :type packet: str
+
+    :param sequence: the sequence number
+    :type sequence: int
+
+    :rtype: str
+    """
+    return "%s%s%s" % (SEQUENCE_PREFIX, pack(">ii", sequence, len(packet)),
+        packet)
+
+
+def unstamp(packet):
+    """Returns the sequence number and the original packet of a stamped packet
+
+    :param packet: a packet wrapped by :func:`stamp`
+    :type packet: str
+
+    :returns: sequence number, original packet or None if the packet is not
+        stamped
+    :rtype: tuple
+    """
+    if not packet.startswith(SEQUENCE_PREFIX) or len(packet) < _packet_offset:
+        return None
+    sequence, length = unpack_from(">ii", packet, _prefix_length)
+    return sequence, packet[_packet_offset:_packet_offset + length]
+
+
+class SequenceTracker(object):
+    """Detects lost, reordered and duplicated packets by sequence number
+
+    A gap in the sequence numbers counts as lost packets. If a missing
+    packet arrives later, it's counted as reordered instead. Late packets
+    which were never missing are duplicates. Gaps larger than
+    `reset_threshold` are treated as a restart of the sender.
+    """
+
+    def __init__(self, window=1024, reset_threshold=0x10000):
+        """Instantiate a new SequenceTracker
+
+        :param window: how many missing sequence numbers are remembered to
+            detect reordering
+        :type window: int
+
+        :param reset_threshold: gap size considered as sender restart
+        :type reset_threshold: int
+        """
+        super(SequenceTracker, self).__init__()
+        self.window = window
+        self.reset_threshold = reset_threshold
+        self.highest = None
+        self.missing = set()
+        self.missing_order = deque()
+        self.received = 0
+        self.lost = 0
+        self.reordered = 0
+        self.duplicates = 0
+
+    def counters(self):
+        """Returns (received, lost, reordered, duplicates)"""
+        return self.received, self.lost, self.reordered, self.duplicates
+
+    def update(self, sequence):
+        """Accounts a received sequence number
+
+        :param sequence: the sequence number
+        :type sequence: int
+        """
+        self.received += 1
+        highest = self.highest
+        if highest is None:
+            self.highest = sequence
+            return
+
+        ahead = (sequence - highest) & SEQUENCE_MASK
+        if ahead == 1:
+            self.highest = sequence
+        elif ahead == 0:
+            self.duplicates += 1
+        elif ahead < self.reset_threshold:
+            self.lost += ahead - 1
+            for gap in range(max(1, ahead - self.window), ahead):
+                self.__remember((highest + gap) & SEQUENCE_MASK)
+            self.highest = sequence
+        elif ahead > SEQUENCE_MASK - self.reset_threshold:
+            # a late packet
+            if sequence in self.missing:
+                self.missing.discard(sequence)
+                self.lost -= 1
+                self.reordered += 1
+            else:
+                self.duplicates += 1
+        else:
+            self.highest = sequence
+            self.missing.clear()
+            self.missing_order.clear()
+
+    def __remember(self, sequence):
+        missing_order = self.missing_order
+        missing_order.append(sequence)
+        self.missing.add(sequence)
+        if len(missing_order) > self.window:
+            self.missing.discard(missing_order.popleft())
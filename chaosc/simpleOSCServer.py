@@ -19,14 +19,18 @@
 
 from __future__ import absolute_import
 
+import os.path
+import select
+import signal
 import socket
 import sys
 import atexit
 
 from datetime import datetime
 from struct import pack
+from time import time
 from types import TupleType, IntType, StringTypes, FunctionType, MethodType
-from SocketServer import UDPServer, DatagramRequestHandler, ThreadingUDPServer, ForkingUDPServer
+from SocketServer import UDPServer, DatagramRequestHandler, ThreadingUDPServer, ForkingUDPServer, _eintr_retry
 
 from chaosc import _version
 from chaosc.lib import logger
@@ -37,6 +41,10 @@ except ImportError:
     from chaosc.osc_lib import *
 
 from chaosc.lib import resolve_host
+from chaosc.osc_pattern import PatternDispatcher
+from chaosc.profiling import SamplingProfiler, default_profile_path
+from chaosc.sequencing import (SequenceTracker, SEQUENCE_PREFIX, SEQUENCE_MASK,
+    unstamp)
 
 __all__ = ["SimpleOSCServer",]
 
@@ -53,8 +61,28 @@ class OSCRequestHandler(DatagramRequestHandler):
 
     def handle(self):
         """Handle incoming OSCMessage
+
+        Packets stamped with a sequence number by chaosc are unwrapped and
+        accounted by the server's sequence tracker. If the server dispatches
+        message views, messages are not decoded up front.
         """
         packet = self.packet
+        if packet.startswith(SEQUENCE_PREFIX):
+            stamped = unstamp(packet)
+            if stamped is not None:
+                sequence, packet = stamped
+                self.server.track_sequence(sequence)
+        if self.server.message_views:
+            try:
+                view = OSCMessageView(packet)
+            except OSCBundleFound:
+                pass
+            except OSCError, e:
+                return
+            else:
+                self.server.dispatchMessage(view.address, view.typetags, view,
+                    packet, self.client_address)
+                return
         len_packet = len(packet)
         try:
             osc_address, typetags, args = decode_osc(packet, 0, len_packet)
@@ -70,8 +98,15 @@ class SimpleOSCServer(UDPServer):
     """A simple osc server/client to build upon our tools.
 
     Subscribes to chaosc if you want.
+
+    Subclasses which only look at a few arguments can set
+    :attr:`message_views` to get an :class:`OSCMessageView` as args and the
+    typetag string as typetags, which decode arguments only on access.
+    Bundles are still decoded as a whole.
     """
 
+    message_views = False
+
     def __init__(self, args):
         """Instantiate an OSCServer.
         server_address ((host, port) tuple): the local host & UDP-port
@@ -87,10 +122,23 @@ class SimpleOSCServer(UDPServer):
         UDPServer.__init__(self, self.own_address, OSCRequestHandler)
 
         self.socket.setblocking(0)
+
+        self.sequence_tracker = SequenceTracker()
+        self.loss_report_interval = getattr(args, "loss_report_interval", 5.)
+        self.last_loss_report = time()
+
+        self.profiler = SamplingProfiler()
+        try:
+            signal.signal(signal.SIGUSR2, self.toggle_profiling)
+        except ValueError:
+            # not instantiated in the main thread
+            pass
+
         if hasattr(args, "subscribe") and args.subscribe:
             self.subscribe_me()
 
-        self.callbacks = {}
+        self.dispatcher = PatternDispatcher()
+        self.default_handler = None
 
     def subscribe_me(self):
         """Use this procedure for a quick'n dirty subscription to your chaosc instance.
@@ -104,7 +152,7 @@ class SimpleOSCServer(UDPServer):
         :param token: token to get authorized for subscription
         :type token: str
         """
-        logger.info("subscribing to '%s:%d' with label %r" % self.chaosc_address[0], self.chaosc_address[1], self.args.subscriber_label)
+        logger.info("subscribing to '%s:%d' with label %r", self.chaosc_address[0], self.chaosc_address[1], self.args.subscriber_label)
         msg = OSCMessage("/subscribe")
         msg.appendTypedArg(self.own_address[0], "s")
         msg.appendTypedArg(self.own_address[1], "i")
@@ -113,50 +161,152 @@ class SimpleOSCServer(UDPServer):
             msg.appendTypedArg(self.args.subscriber_label, "s")
         self.sendto(msg, self.chaosc_address)
 
+        if getattr(self.args, "sequenced", False):
+            logger.info("requesting sequence numbers from '%s:%d'", self.chaosc_address[0], self.chaosc_address[1])
+            msg = OSCMessage("/sequence")
+            msg.appendTypedArg(self.own_address[0], "s")
+            msg.appendTypedArg(self.own_address[1], "i")
+            msg.appendTypedArg(self.args.authenticate, "s")
+            msg.appendTypedArg(1, "i")
+            self.sendto(msg, self.chaosc_address)
+
     def unsubscribe_me(self):
         if self.args.keep_subscribed:
             return
 
-        logger.info("unsubscribing from '%s:%d'" % self.chaosc_address[0], self.chaosc_address[1])
+        logger.info("unsubscribing from '%s:%d'", self.chaosc_address[0], self.chaosc_address[1])
         msg = OSCMessage("/unsubscribe")
         msg.appendTypedArg(self.own_address[0], "s")
         msg.appendTypedArg(self.own_address[1], "i")
         msg.appendTypedArg(self.args.authenticate, "s")
         self.sendto(msg, self.chaosc_address)
 
-    def addMsgHandler(self, address, callback):
+    def track_sequence(self, sequence):
+        """Accounts the sequence number of a packet stamped by chaosc
+
+        If this tool requested sequence numbers, a loss report is sent to
+        chaosc every `loss_report_interval` seconds, see
+        :meth:`service_actions`, which :meth:`serve_forever` calls.
+
+        :param sequence: the sequence number
+        :type sequence: int
+        """
+        self.sequence_tracker.update(sequence)
+
+    def serve_forever(self, poll_interval=0.5):
+        """Handle one request at a time until shutdown.
+
+        Works like :meth:`BaseServer.serve_forever`, but calls
+        :meth:`service_actions` after each iteration.
+        """
+        self._BaseServer__is_shut_down.clear()
+        try:
+            while not self._BaseServer__shutdown_request:
+                r, w, e = _eintr_retry(select.select, [self], [], [],
+                    poll_interval)
+                if self in r:
+                    self._handle_request_noblock()
+                self.service_actions()
+        finally:
+            self._BaseServer__shutdown_request = False
+            self._BaseServer__is_shut_down.set()
+
+    def service_actions(self):
+        """Called by :meth:`serve_forever` after each loop iteration
+
+        Sends the loss report if this tool requested sequence numbers and
+        `loss_report_interval` seconds passed since the last one, so chaosc
+        also learns about losses when no stamped packets arrive anymore.
+        """
+        if getattr(self.args, "sequenced", False):
+            now = time()
+            if now - self.last_loss_report >= self.loss_report_interval:
+                self.last_loss_report = now
+                self.send_loss_report()
+
+    def send_loss_report(self):
+        """Sends the counters of the sequence tracker to chaosc
+
+        The counters are sent modulo 2 ** 31, since they are 32 bit ints.
+        """
+        counters = self.sequence_tracker.counters()
+        logger.info("received %d, lost %d, reordered %d, duplicates %d",
+            *counters)
+        msg = OSCMessage("/loss_report")
+        for counter in counters:
+            msg.appendTypedArg(counter & SEQUENCE_MASK, "i")
+        try:
+            self.sendto(msg, self.chaosc_address)
+        except OSCError, e:
+            logger.error("sending loss report failed - %s", e)
+
+    def toggle_profiling(self, signum=None, frame=None):
+        """Starts the sampling profiler or stops it and writes the profile
+        to ~/.chaosc. Installed as handler of SIGUSR2.
+        """
+        try:
+            if self.profiler.running:
+                self.profiler.stop()
+            else:
+                self.profiler.start(default_profile_path("~/.chaosc",
+                    os.path.basename(sys.argv[0])))
+        except (ValueError, IOError), e:
+            logger.error("toggling the profiler failed - %s", e)
+
+    def addMsgHandler(self, address, callback, prefix=False, append=False):
         """Register a handler for an OSC-address
         - 'address' is the OSC address-string.
-        the address-string should start with '/' and may not contain '*'
+        the address-string should start with '/' and may be an OSC address
+        pattern like '/fader/{1,2}/*'
         - 'callback' is the function called for incoming OSCMessages that match 'address'.
         The callback-function will be called with the same arguments as the 'msgPrinter_handler' below
+        - 'prefix': if True, the callback gets all messages with addresses
+        below 'address', e.g. '/sensor/1/x' for '/sensor'
+        - 'append': if True, the callback is added to the handlers already
+        registered for 'address' and they are called in the order of
+        registration, else it replaces them
         """
 
         if type(callback) not in (FunctionType, MethodType):
             raise OSCError("Message callback '%s' is not callable" % repr(callback))
 
-        if address != 'X':
-            address = '/' + address.strip('/')
+        if address == 'X':
+            self.default_handler = callback
+            return
 
-        self.callbacks[address] = callback
+        address = '/' + address.strip('/')
+        try:
+            self.dispatcher.add(address, callback, prefix, replace=not append)
+        except ValueError, e:
+            raise OSCError(str(e))
 
-    def delMsgHandler(self, address):
-        """Remove the registered handler for the given OSC-address
+    def delMsgHandler(self, address, callback=None, prefix=False):
+        """Remove the registered handlers for the given OSC-address, or
+        only 'callback' if given
         """
-        del self.callbacks[address]
+        if address == 'X':
+            if self.default_handler is None:
+                raise KeyError(address)
+            self.default_handler = None
+        else:
+            self.dispatcher.remove('/' + address.strip('/'), callback, prefix)
 
     def dispatchMessage(self, address, tags, args, packet, client_address):
-        """Dispatches messages to a callback or a default msg handler, which
-        should be registered with "X" as osc address.
+        """Dispatches messages to all callbacks registered for matching
+        addresses or patterns, or to a default msg handler, which should be
+        registered with "X" as osc address. Messages sent to a pattern are
+        dispatched to the matching registered addresses.
 
         If you don't need message dispatching, you can also overwrite
         the :meth:`SimpleOSCServer.process_request` inherited from BaseServer
         """
 
-        try:
-            self.callbacks[address](address, tags, args, packet, client_address)
-        except KeyError:
-            self.callbacks["X"](address, tags, args, packet, client_address)
+        handlers = self.dispatcher.match(address)
+        if handlers:
+            for handler in handlers:
+                handler(address, tags, args, packet, client_address)
+        elif self.default_handler is not None:
+            self.default_handler(address, tags, args, packet, client_address)
 
     def close(self):
         """Stops serving requests, closes server (socket), closes used client
@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+
+'''This module implements named target groups with delivery policies'''
+
+# This file is part of chaosc
+#
+# chaosc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# chaosc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with chaosc.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2012-2014 Stefan Kögl
+
+from __future__ import absolute_import
+
+from bisect import bisect
+from time import time
+from zlib import crc32
+
+try:
+    from chaosc.c_osc_lib import decode_string
+except ImportError:
+    from chaosc.osc_lib import decode_string
+
+
+__all__ = ["TargetGroup", "POLICIES", "bundle_address"]
+
+
+POLICIES = ("broadcast", "round_robin", "hash", "failover")
+
+# number of points per member on the consistent hashing ring
+VIRTUAL_NODES = 64
+
+# upper bound of cached osc address to member lookups for the hash policy
+HASH_CACHE_SIZE = 4096
+
+
+def bundle_address(packet):
+    """Returns the osc address of the first element in a binary OSCBundle
+
+    The first element starts after the '#bundle' string (8 bytes), the
+    timetag (8 bytes) and its size (4 bytes).
+
+    :param packet: the binary representation of an osc bundle
+    :type packet: str
+
+    :rtype: str
+    """
+    if len(packet) <= 20:
+        return ""
+    return decode_string(packet, 20, len(packet))[0]
+
+
+class TargetGroup(object):
+    """A named set of targets sharing one delivery policy
+
+    broadcast
+        every member receives every packet. This is the default and equals
+        the behaviour of ungrouped targets.
+
+    round_robin
+        each packet is sent to the next member in turn.
+
+    hash
+        the osc address of a packet selects the member on a consistent
+        hashing ring, so all packets of one address go to the same member
+        and keep their order. Adding or removing a member only moves the
+        addresses of that member.
+
+    failover
+        all packets are sent to the first member which has not failed.
+        Failed members are retried after `failover_retry` seconds.
+    """
+
+    def __init__(self, name, policy="broadcast", failover_retry=5.0):
+        """Instantiate a new TargetGroup
+
+        :param name: the group name
+        :type name: str
+
+        :param policy: one of :data:`POLICIES`
+        :type policy: str
+
+        :param failover_retry: seconds until a failed member is used again
+        :type failover_retry: float
+        """
+        super(TargetGroup, self).__init__()
+        self.name = name
+        self.members = list()
+        self.failed = dict()
+        self.failover_retry = failover_retry
+        self.rr_index = 0
+        self.ring_keys = list()
+        self.ring_members = list()
+        self.hash_cache = dict()
+        self.set_policy(policy)
+
+    def __repr__(self):
+        return "TargetGroup(%r, %r, %r)" % (self.name, self.policy,
+            self.members)
+
+    def __len__(self):
+        return len(self.members)
+
+    def __iter__(self):
+        return iter(self.members)
+
+    def __contains__(self, address):
+        return address in self.members
+
+    def set_policy(self, policy):
+        """Changes the delivery policy
+
+        :param policy: one of :data:`POLICIES`
+        :type policy: str
+
+        :raises: ValueError if the policy is unknown
+        """
+        if policy not in POLICIES:
+            raise ValueError("unknown delivery policy %r" % policy)
+
+        self.policy = policy
+        self.select = getattr(self, "_select_%s" % policy)
+
+    def add(self, address):
+        """Adds a target to this group
+
+        :param address: (host, port) of the target
+        :type address: tuple
+        """
+        self.members.append(address)
+        self.__rebuild_ring()
+
+    def remove(self, address):
+        """Removes a target from this group
+
+        :param address: (host, port) of the target
+        :type address: tuple
+
+        :raises: ValueError if the target is not a member
+        """
+        self.members.remove(address)
+        self.failed.pop(address, None)
+        self.__rebuild_ring()
+
+    def mark_failed(self, address):
+        """Marks a member as unreachable for the failover policy
+
+        :param address: (host, port) of the target
+        :type address: tuple
+        """
+        self.failed[address] = time()
+
+    def reselect(self, address, osc_address, packet, unavailable):
+        """Returns another member for a packet the selected member can't
+        take, or None if all members are unavailable
+
+        round_robin continues with the next members in turn, hash walks the
+        ring on to the next member, so the addresses of the unavailable
+        member are spread like on removal without moving the others.
+        failover marks the member failed and takes the next one.
+
+        :param address: the selected member
+        :type address: tuple
+
+        :param osc_address: the osc address of the packet, None for bundles
+        :type osc_address: str
+
+        :param packet: the binary representation of the packet
+        :type packet: str
+
+        :param unavailable: returns True for members which can't take the
+            packet either
+        :type unavailable: callable
+        """
+        policy = self.policy
+        if policy == "round_robin":
+            members = self.members
+            count = len(members)
+            for index in xrange(self.rr_index, self.rr_index + count):
+                candidate = members[index % count]
+                if candidate != address and not unavailable(candidate):
+                    self.rr_index = (index + 1) % count
+                    return candidate
+        elif policy == "hash":
+            if osc_address is None:
+                osc_address = bundle_address(packet)
+            ring_members = self.ring_members
+            count = len(ring_members)
+            start = bisect(self.ring_keys, crc32(osc_address) & 0xffffffff)
+            tried = set([address])
+            for index in xrange(start, start + count):
+                candidate = ring_members[index % count]
+                if candidate not in tried:
+                    if not unavailable(candidate):
+                        return candidate
+                    tried.add(candidate)
+        elif policy == "failover":
+            self.mark_failed(address)
+            for candidate in self.members:
+                if candidate not in self.failed and not unavailable(candidate):
+                    return candidate
+        return None
+
+    def __rebuild_ring(self):
+        ring = list()
+        for address in self.members:
+            for replica in range(VIRTUAL_NODES):
+                key = crc32("%s:%d#%d" % (address[0], address[1], replica))
+                ring.append((key & 0xffffffff, address))
+        ring.sort()
+        self.ring_keys = [key for key, address in ring]
+        self.ring_members = [address for key, address in ring]
+        self.hash_cache.clear()
+
+    def _select_broadcast(self, osc_address, packet):
+        return self.members
+
+    def _select_round_robin(self, osc_address, packet):
+        members = self.members
+        if not members:
+            return ()
+        index = self.rr_index % len(members)
+        self.rr_index = index + 1
+        return (members[index],)
+
+    def _select_hash(self, osc_address, packet):
+        if osc_address is None:
+            osc_address = bundle_address(packet)
+        try:
+            return self.hash_cache[osc_address]
+        except KeyError:
+            pass
+
+        if not self.ring_keys:
+            return ()
+        index = bisect(self.ring_keys, crc32(osc_address) & 0xffffffff)
+        result = (self.ring_members[index % len(self.ring_members)],)
+        if len(self.hash_cache) >= HASH_CACHE_SIZE:
+            self.hash_cache.clear()
+        self.hash_cache[osc_address] = result
+        return result
+
+    def _select_failover(self, osc_address, packet):
+        members = self.members
+        if not members:
+            return ()
+        failed = self.failed
+        if failed:
+            now = time()
+            for address in members:
+                failed_at = failed.get(address)
+                if failed_at is None:
+                    return (address,)
+                if now - failed_at >= self.failover_retry:
+                    del failed[address]
+                    return (address,)
+        return (members[0],)
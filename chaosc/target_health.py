@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+
+'''This module tracks send errors per target, suspends unreachable targets and
+reads the socket error queue to find out which target an ICMP error was for'''
+
+# This file is part of chaosc
+#
+# chaosc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# chaosc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with chaosc.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2012-2014 Stefan Kögl
+
+from __future__ import absolute_import
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import socket
+import struct
+import sys
+
+from time import time
+
+from chaosc.lib import logger
+
+
+__all__ = ["TargetHealth", "enable_error_queue", "read_error_queue"]
+
+
+# not exported by the socket module of python 2
+IP_RECVERR = 11
+IPV6_RECVERR = 25
+MSG_ERRQUEUE = 0x2000
+MSG_DONTWAIT = 0x40
+
+# cmsg_len, cmsg_level, cmsg_type of struct cmsghdr, size_t is a long on linux
+_cmsghdr = struct.Struct("@Lii")
+_cmsg_align = ctypes.sizeof(ctypes.c_size_t)
+_port = struct.Struct(">H")
+_family = struct.Struct("@H")
+_errno = struct.Struct("@I")
+
+
+class _iovec(ctypes.Structure):
+    _fields_ = [
+        ("iov_base", ctypes.c_void_p),
+        ("iov_len", ctypes.c_size_t)]
+
+
+class _msghdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(_iovec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int)]
+
+
+_libc = None
+if sys.platform.startswith("linux") and ctypes.util.find_library("c"):
+    _libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+
+
+def enable_error_queue(sock):
+    """Asks the kernel to report ICMP errors for packets sent by an
+    unconnected udp socket and to queue them with their destination
+
+    :returns: True if the errors can be read with :func:`read_error_queue`
+    :rtype: bool
+    """
+    if _libc is None:
+        return False
+    enabled = False
+    for level, option in ((socket.IPPROTO_IP, IP_RECVERR),
+        (socket.IPPROTO_IPV6, IPV6_RECVERR)):
+        try:
+            sock.setsockopt(level, option, 1)
+        except socket.error:
+            pass
+        else:
+            enabled = True
+    return enabled
+
+
+def _parse_address(name, length):
+    family = _family.unpack_from(name, 0)[0]
+    port = _port.unpack_from(name, 2)[0]
+    if family == socket.AF_INET and length >= 8:
+        return socket.inet_ntop(socket.AF_INET, name[4:8]), port
+    elif family == socket.AF_INET6 and length >= 24:
+        return socket.inet_ntop(socket.AF_INET6, name[8:24]), port
+    return None
+
+
+def _parse_errno(control, length):
+    offset = 0
+    while offset + _cmsghdr.size <= length:
+        cmsg_len, level, cmsg_type = _cmsghdr.unpack_from(control, offset)
+        if cmsg_len < _cmsghdr.size:
+            break
+        if (level, cmsg_type) in ((socket.IPPROTO_IP, IP_RECVERR),
+            (socket.IPPROTO_IPV6, IPV6_RECVERR)):
+            return _errno.unpack_from(control, offset + _cmsghdr.size)[0]
+        offset += (cmsg_len + _cmsg_align - 1) & ~(_cmsg_align - 1)
+    return 0
+
+
+def read_error_queue(sock, limit=256):
+    """Reads the queued send errors of `sock`
+
+    The kernel keeps the destination of the failed packet with the error, so
+    the errors can be attributed to the right targets, though python 2 has no
+    recvmsg.
+
+    :param limit: upper bound of errors read in one call
+    :type limit: int
+
+    :returns: list of ((host, port), errno) tuples
+    :rtype: list
+    """
+    result = list()
+    if _libc is None:
+        return result
+    fd = sock.fileno()
+    name = ctypes.create_string_buffer(128)
+    control = ctypes.create_string_buffer(512)
+    data = ctypes.create_string_buffer(1)
+    iov = _iovec(ctypes.cast(data, ctypes.c_void_p), 1)
+    message = _msghdr()
+    for i in xrange(limit):
+        message.msg_name = ctypes.cast(name, ctypes.c_void_p)
+        message.msg_namelen = ctypes.sizeof(name)
+        message.msg_iov = ctypes.pointer(iov)
+        message.msg_iovlen = 1
+        message.msg_control = ctypes.cast(control, ctypes.c_void_p)
+        message.msg_controllen = ctypes.sizeof(control)
+        message.msg_flags = 0
+        if _libc.recvmsg(fd, ctypes.byref(message),
+            MSG_ERRQUEUE | MSG_DONTWAIT) < 0:
+            error = ctypes.get_errno()
+            if error not in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                logger.warning("reading the error queue failed - %s",
+                    os.strerror(error))
+            break
+        address = _parse_address(name.raw, message.msg_namelen)
+        if address is not None:
+            result.append((address, _parse_errno(control.raw,
+                message.msg_controllen) or errno.ECONNREFUSED))
+    return result
+
+
+class _TargetState(object):
+
+    def __init__(self, backoff):
+        super(_TargetState, self).__init__()
+        self.consecutive = 0
+        self.errors = 0
+        self.reported = 0
+        self.last_errno = 0
+        self.last_error = 0.
+        self.probed = 0.
+        self.backoff = backoff
+
+
+class TargetHealth(object):
+    """Tracks send errors per target and suspends unreachable targets
+
+    After `threshold` errors without `settle` quiet seconds in between, a
+    target is suspended. Packets for it are skipped until its backoff
+    expired, then one packet goes out as probe. If the probe fails too, the
+    backoff doubles up to `max_backoff`, otherwise the target resumes once
+    `settle` seconds passed without an error. As ICMP errors arrive after
+    the send, a successful sendto alone does not prove a target reachable.
+
+    Errors are logged once per state change and as summary every
+    `report_interval` seconds instead of once per packet.
+
+    :meth:`may_send` is only called for addresses in :attr:`suspended`, so
+    healthy targets cost one dict lookup per packet.
+    """
+
+    def __init__(self, threshold=5, backoff=1., max_backoff=60., settle=1.,
+        report_interval=10.):
+        """Instantiate a new TargetHealth
+
+        :param threshold: errors until a target is suspended
+        :type threshold: int
+
+        :param backoff: seconds until the first probe of a suspended target
+        :type backoff: float
+
+        :param max_backoff: upper bound of seconds between probes
+        :type max_backoff: float
+
+        :param settle: seconds without errors after which a target counts
+            as reachable again
+        :type settle: float
+
+        :param report_interval: seconds between error summaries
+        :type report_interval: float
+        """
+        super(TargetHealth, self).__init__()
+        self.threshold = threshold
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.settle = settle
+        self.report_interval = report_interval
+        self.failing = dict()
+        # address -> time of the next probe
+        self.suspended = dict()
+        self.skipped = 0
+        self.next_check = 0.
+        self.next_report = 0.
+
+    def may_send(self, address):
+        """Returns True if a suspended target is due for a probe
+
+        The next probe is scheduled right away, so only one packet per
+        backoff period goes out. The time of the first probe without an
+        error is kept for deciding when the target resumes.
+        """
+        now = time()
+        if now < self.suspended[address]:
+            self.skipped += 1
+            return False
+        state = self.failing[address]
+        if not state.probed:
+            state.probed = now
+        self.suspended[address] = now + state.backoff
+        return True
+
+    def send_failed(self, address, error_number):
+        """Counts a send error of a target
+
+        :param address: (host, port) of the target
+        :type address: tuple
+
+        :param error_number: the errno of the failed send
+        :type error_number: int
+        """
+        now = time()
+        try:
+            state = self.failing[address]
+        except KeyError:
+            state = self.failing[address] = _TargetState(self.backoff)
+        state.consecutive += 1
+        state.errors += 1
+        state.last_errno = error_number
+        state.last_error = now
+
+        if address in self.suspended:
+            if state.probed:
+                state.backoff = min(state.backoff * 2, self.max_backoff)
+                self.suspended[address] = state.probed + state.backoff
+                state.probed = 0.
+        elif state.consecutive >= self.threshold:
+            self.suspended[address] = now + state.backoff
+            logger.warning("suspending target %s:%d after %d errors - %s",
+                address[0], address[1], state.consecutive,
+                os.strerror(error_number))
+
+    def remove(self, address):
+        """Forgets a target, e.g. after unsubscription"""
+        self.failing.pop(address, None)
+        self.suspended.pop(address, None)
+
+    def check(self, now):
+        """Resumes recovered targets and logs the error summary if due,
+        called regularly by chaosc while there are failing targets
+
+        :returns: False if nothing was due
+        :rtype: bool
+        """
+        if now < self.next_check:
+            return False
+        self.next_check = now + min(self.settle, 0.1)
+
+        settle = self.settle
+        suspended = self.suspended
+        for address, state in self.failing.items():
+            if now - state.last_error < settle:
+                continue
+            state.consecutive = 0
+            if address in suspended:
+                if not state.probed or now - state.probed < settle:
+                    continue
+                del suspended[address]
+                logger.info("target %s:%d is reachable again", *address[:2])
+            elif state.errors > state.reported:
+                continue
+            del self.failing[address]
+
+        if now >= self.next_report:
+            self.next_report = now + self.report_interval
+            self.report()
+        return True
+
+    def report(self):
+        """Logs a summary of the errors since the last report"""
+        for address, state in self.failing.iteritems():
+            errors = state.errors - state.reported
+            if not errors:
+                continue
+            state.reported = state.errors
+            if address in self.suspended:
+                logger.warning("%d send errors to %s:%d - %s, suspended, "
+                    "next probe in %.0fs", errors, address[0], address[1],
+                    os.strerror(state.last_errno),
+                    max(0., self.suspended[address] - time()))
+            else:
+                logger.warning("%d send errors to %s:%d - %s", errors,
+                    address[0], address[1], os.strerror(state.last_errno))
+        if self.skipped:
+            logger.warning("skipped %d packets for %d suspended targets",
+                self.skipped, len(self.suspended))
+            self.skipped = 0
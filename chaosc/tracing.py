@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+'''This module implements sampled tracing of packets through chaosc'''
+
+# This file is part of chaosc
+#
+# chaosc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# chaosc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with chaosc.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2012-2014 Stefan Kögl
+
+from __future__ import absolute_import
+
+import json
+import os.path
+
+from collections import deque, defaultdict
+from time import time
+
+from chaosc.latency import kernel_timestamp
+
+
+__all__ = ["Tracer"]
+
+
+class Tracer(object):
+    """Records stage timestamps for one in `every` packets
+
+    A trace is a list of (stage, timestamp) tuples. :meth:`sample` starts a
+    trace for every `every` packet and returns None for the others, so
+    untraced packets only pay a counter decrement. Each stage appends its
+    tuple to the trace and :meth:`finish` keeps it in a buffer of the last
+    `capacity` traces.
+
+    If the platform supports it, a trace starts with the time the kernel
+    received the packet.
+    """
+
+    def __init__(self, every=1000, capacity=1024):
+        """Instantiate a new Tracer
+
+        :param every: trace one in `every` packets
+        :type every: int
+
+        :param capacity: how many traces are kept
+        :type capacity: int
+        """
+        super(Tracer, self).__init__()
+        self.every = every
+        self.countdown = every
+        self.traces = deque(maxlen=capacity)
+        self.kernel_timestamps = True
+
+    def sample(self, sock):
+        """Returns a new trace if the current packet is sampled, else None
+
+        :param sock: the socket the packet was read from
+        :type sock: socket.socket
+
+        :rtype: list
+        """
+        self.countdown -= 1
+        if self.countdown:
+            return None
+        self.countdown = self.every
+        now = time()
+        trace = list()
+        if self.kernel_timestamps:
+            try:
+                received = kernel_timestamp(sock)
+            except (IOError, AttributeError):
+                self.kernel_timestamps = False
+            else:
+                if received is not None and received <= now:
+                    trace.append(("kernel", received))
+        trace.append(("receive", now))
+        return trace
+
+    def finish(self, trace, osc_address, client_address):
+        """Keeps a completed trace"""
+        self.traces.append((osc_address or "#bundle", client_address[:2],
+            trace))
+
+    def export(self):
+        """Returns the kept traces as dicts with the stage durations in
+        microseconds
+
+        Each stage's duration is the time since the previous stage.
+
+        :rtype: list
+        """
+        result = list()
+        for osc_address, client_address, trace in list(self.traces):
+            stages = list()
+            previous = trace[0][1]
+            for stage, timestamp in trace:
+                stages.append([stage, (timestamp - previous) * 1e6])
+                previous = timestamp
+            result.append({
+                "time" : trace[0][1],
+                "address" : osc_address,
+                "source" : "%s:%d" % client_address,
+                "stages" : stages,
+                "total_us" : (trace[-1][1] - trace[0][1]) * 1e6})
+        return result
+
+    def summary(self):
+        """Returns (stage, samples, p50, p99) tuples of the stage durations
+        in microseconds. Sends are summarized as one stage "send".
+
+        :rtype: list
+        """
+        durations = defaultdict(list)
+        order = list()
+        for trace in self.export():
+            for stage, duration in trace["stages"][1:]:
+                if stage.startswith("send "):
+                    stage = "send"
+                if stage not in durations:
+                    order.append(stage)
+                durations[stage].append(duration)
+        result = list()
+        for stage in order:
+            values = sorted(durations[stage])
+            result.append((stage, len(values), values[len(values) / 2],
+                values[min(len(values) - 1, int(len(values) * 0.99))]))
+        return result
+
+    def dump(self, path):
+        """Writes the kept traces as json lines
+
+        :returns: the number of written traces
+        :rtype: int
+        """
+        traces = self.export()
+        with open(os.path.expanduser(path), "w") as fileobj:
+            for trace in traces:
+                fileobj.write(json.dumps(trace) + "\n")
+        return len(traces)
@@ -23,9 +23,9 @@ from operator import itemgetter
 import re
 
 try:
-    from c_osc_lib import OSCMessage
+    from c_osc_lib import OSCMessage, message_template
 except ImportError:
-    from osc_lib  import OSCMessage
+    from osc_lib  import OSCMessage, message_template
 
 
 class ITranscoder(object):
@@ -35,6 +35,7 @@ class ITranscoder(object):
         raise NotImplementedError()
 
     def __call__(self, osc_address, typetags, args):
+        """Returns the binary representation of the transcoded message"""
         raise NotImplementedError()
 
 
@@ -108,10 +109,7 @@ class AddressTranscoder(ITranscoder):
         return False
 
     def __call__(self, osc_address, typetags, args):
-        new_message = OSCMessage(self.to_addr)
-        for arg, typetag in zip(args, typetags):
-            new_message.appendTypedArg(arg, typetag)
-        return new_message
+        return message_template(self.to_addr, "".join(typetags)).encode(*args)
 
 
 class DampingTranscoder(ITranscoder):
@@ -126,10 +124,8 @@ class DampingTranscoder(ITranscoder):
         return self.regrex_fmt.match(osc_address) is not None
 
     def __call__(self, osc_address, typetags, args):
-        new_message = OSCMessage(osc_address)
-        for arg, typetag in zip(args, typetags):
-            new_message.appendTypedArg(arg * self.factor, typetag)
-        return new_message
+        return message_template(osc_address, "".join(typetags)).encode(
+            *[arg * self.factor for arg in args])
 
 
 class AddressRegExChanger(ITranscoder):
@@ -151,10 +147,8 @@ class AddressRegExChanger(ITranscoder):
         return False
 
     def __call__(self, osc_address, typetags, args):
-        new_message = OSCMessage(self.to_addr % tuple([int(item) for item in self.groups]))
-        for arg, typetag in zip(args, typetags):
-            new_message.appendTypedArg(arg, typetag)
-        return new_message
+        return message_template(self.to_addr % tuple([int(item) for item in self.groups]),
+            "".join(typetags)).encode(*args)
 
 
 class MappingTranscoder(ITranscoder):
@@ -36,6 +36,7 @@ setup(
     [console_scripts]
     chaosc = chaosc.chaosc:main
     chaosc_ctl = chaosc.chaosc_ctl:main
+    chaosc_emitter = chaosc.chaosc_emitter:main
     chaosc_transcoder = chaosc.chaosc_transcoder:main
     chaosc_dump = chaosc.chaosc_dump:main
     chaosc_filter = chaosc.chaosc_filter:main
@@ -18,3 +18,17 @@
 # Copyright (C) 2012-2013 Stefan Kögl
 
 import osc_lib_test
+import target_groups_test
+import federation_test
+import ratelimit_test
+import sequencing_test
+import latency_test
+import recording_test
+import profiling_test
+import tracing_test
+import target_health_test
+import osc_batch_test
+import osc_pattern_test
+import handover_test
+import chaosc_test
+import emitter_test
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of chaosc
+#
+# chaosc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# chaosc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with chaosc.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2012-2014 Stefan Kögl
+
+from argparse import Namespace
+from chaosc.chaosc import Chaosc
+from chaosc.osc_lib import OSCMessage, decode_osc
+from time import time
+import socket
+import tempfile
+import threading
+import unittest
+
+
+def make_args():
+    return Namespace(address_family=socket.AF_INET, ipv4_only=True,
+        chaosc_host="127.0.0.1", chaosc_port=0, authenticate="sekret",
+        subscription_file=None, takeover=False, handover_path=None,
+        hub_id=None, peers=None, peer_interest="", max_hops=4,
+        source_rate=None, prefix_rates=None, overlimit="drop",
+        busy_poll=False, record_path=None, flight_size=1.,
+        dump_dir=tempfile.gettempdir(), trace_every=0, suspend_after=5,
+        max_backoff=60.)
+
+
+class TestPing(unittest.TestCase):
+    def setUp(self):
+        self.hub = Chaosc(make_args())
+        thread = threading.Thread(target=self.hub.serve_forever,
+            args=(0.05,))
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.hub.server_close)
+        self.addCleanup(self.hub.shutdown)
+        self.client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.client.bind(("127.0.0.1", 0))
+        self.client.settimeout(2.)
+        self.addCleanup(self.client.close)
+
+    def send(self, address, *typed_args):
+        message = OSCMessage(address)
+        for argument, typetag in typed_args:
+            message.appendTypedArg(argument, typetag)
+        self.client.sendto(message.encode_osc(),
+            self.hub.socket.getsockname())
+
+    def test_pong(self):
+        sent = time()
+        self.send("/ping", (7, "i"), (sent, "d"))
+        data = self.client.recv(1024)
+        address, typetags, args = decode_osc(data, 0, len(data))
+        self.assertEqual((address, typetags), ("/pong", ["i", "d", "d"]))
+        self.assertEqual(args[:2], [7, sent])
+        self.assertTrue(sent <= args[2] <= time())
+
+    def test_malformed(self):
+        self.send("/ping", (7, "i"))
+        self.send("/ping", ("7", "s"), (time(), "d"))
+        self.send("/ping", (8, "i"), (time(), "d"))
+        data = self.client.recv(1024)
+        self.assertEqual(decode_osc(data, 0, len(data))[2][0], 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of chaosc
+#
+# chaosc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# chaosc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with chaosc.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2012-2014 Stefan Kögl
+
+from chaosc import chaosc_emitter
+from chaosc.chaosc_emitter import expand_addresses, build_packets, Emitter
+from chaosc.osc_lib import decode_osc
+import errno
+import socket
+import unittest
+
+
+class FakeClock(object):
+    """Advances a little on every reading, and by the delay on sleep()"""
+
+    def __init__(self, tick=0.0001):
+        self.now = 1000.
+        self.tick = tick
+
+    def time(self):
+        self.now += self.tick
+        return self.now
+
+    def sleep(self, delay):
+        self.now += delay
+
+
+class FakeSocket(object):
+    def __init__(self, clock, stall_at=None, stall=0., fail_every=0):
+        self.clock = clock
+        self.stall_at = stall_at
+        self.stall = stall
+        self.fail_every = fail_every
+        self.calls = 0
+        self.sent = list()
+
+    def sendto(self, packet, address):
+        self.calls += 1
+        if self.calls == self.stall_at:
+            self.clock.now += self.stall
+        if self.fail_every and self.calls % self.fail_every == 0:
+            raise socket.error(errno.ENOBUFS, "No buffer space available")
+        self.sent.append((packet, address))
+
+
+class TestExpandAddresses(unittest.TestCase):
+    def test_plain(self):
+        self.assertEqual(expand_addresses("/foo,/bar", 3), ["/foo", "/bar"])
+
+    def test_replacements(self):
+        self.assertEqual(expand_addresses("/foo/%d,/bar", 3),
+            ["/foo/0", "/foo/1", "/foo/2", "/bar"])
+
+    def test_empty(self):
+        self.assertEqual(expand_addresses("/foo,,/bar,", 1), ["/foo", "/bar"])
+        self.assertEqual(expand_addresses("/foo/%d", 0), [])
+
+
+class TestBuildPackets(unittest.TestCase):
+    def test_messages(self):
+        packets = build_packets(["/foo", "/bar"], ["i", "ff", "s"],
+            variants=12)
+        self.assertEqual(len(packets), 12)
+        combinations = set()
+        for packet in packets:
+            address, typetags, args = decode_osc(packet, 0, len(packet))
+            self.assertEqual(len(args), len(typetags))
+            combinations.add((address, "".join(typetags)))
+        self.assertEqual(len(combinations), 6)
+
+        # "/foo" ",i" and a 32 bit int
+        self.assertEqual(len(build_packets(["/foo"], ["i"], variants=1)[0]),
+            16)
+
+    def test_bundles(self):
+        packets = build_packets(["/foo"], ["i"], bundle_size=3, variants=4)
+        self.assertEqual(len(packets), 4)
+        for packet in packets:
+            # header and timetag, then a size prefix for each message
+            self.assertEqual(len(packet), 16 + 3 * (4 + 16))
+            address, typetags, args = decode_osc(packet, 0, len(packet))
+            self.assertEqual(address, "#bundle")
+            self.assertEqual(len(args), 3)
+
+    def test_seed(self):
+        self.assertEqual(build_packets(["/foo"], ["ifsb"], seed=3),
+            build_packets(["/foo"], ["ifsb"], seed=3))
+        self.assertNotEqual(build_packets(["/foo"], ["ifsb"], seed=3),
+            build_packets(["/foo"], ["ifsb"], seed=4))
+
+
+class TestEmitter(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        for name in ("time", "sleep"):
+            self.addCleanup(setattr, chaosc_emitter, name,
+                getattr(chaosc_emitter, name))
+            setattr(chaosc_emitter, name, getattr(self.clock, name))
+        self.packets = ["a" * 16, "b" * 32, "c" * 48]
+        self.address = ("127.0.0.1", 1234)
+
+    def emitter(self, rate, batch, **kwargs):
+        sock = FakeSocket(self.clock, **kwargs)
+        return sock, Emitter(sock, self.address, self.packets, rate, batch)
+
+    def test_rate(self):
+        for rate, batch in ((1000., 10), (250., 1), (100., 16)):
+            sock, emitter = self.emitter(rate, batch)
+            elapsed = emitter.run(2.)
+            # the last wait may end behind the deadline
+            self.assertTrue(2. <= elapsed < 2. + batch / rate, elapsed)
+            expected = int(rate * 2)
+            self.assertTrue(expected <= emitter.sent < expected + batch,
+                (rate, batch, emitter.sent))
+            self.assertEqual(len(sock.sent), emitter.sent)
+            self.assertEqual(emitter.sent_bytes,
+                sum([len(packet) for packet, address in sock.sent]))
+            self.assertEqual(emitter.skipped, 0)
+
+    def test_packets_in_turn(self):
+        sock, emitter = self.emitter(100., 4)
+        emitter.run(0.1)
+        self.assertEqual([packet for packet, address in sock.sent[:7]],
+            (self.packets * 3)[:7])
+        self.assertEqual(set([address for packet, address in sock.sent]),
+            set([self.address]))
+
+    def test_skip_backlog(self):
+        # a stall of 0.5 s after the first second
+        sock, emitter = self.emitter(1000., 10, stall_at=1000, stall=0.5)
+        emitter.run(2.)
+        self.assertTrue(490 <= emitter.skipped <= 500, emitter.skipped)
+        # the missed batches are not sent in a burst afterwards
+        self.assertTrue(1500 <= emitter.sent <= 1520, emitter.sent)
+
+    def test_send_errors(self):
+        sock, emitter = self.emitter(1000., 10, fail_every=4)
+        emitter.run(1.)
+        self.assertEqual(emitter.sent + emitter.errors, sock.calls)
+        self.assertEqual(emitter.errors, sock.calls // 4)
+
+    def test_report(self):
+        reports = list()
+        sock, emitter = self.emitter(1000., 10)
+        emitter.run(2.5, 1., lambda *args: reports.append(args))
+        self.assertEqual(len(reports), 2)
+        for elapsed, packets, sent_bytes, errors in reports:
+            self.assertAlmostEqual(elapsed, 1., 2)
+            self.assertTrue(1000 <= packets <= 1010, packets)
+            self.assertEqual(errors, 0)
+        self.assertTrue(sum([report[1] for report in reports]) < emitter.sent)
+
+
+if __name__ == '__main__':
+    unittest.main()
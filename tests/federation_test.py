@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of chaosc
+#
+# chaosc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# chaosc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with chaosc.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2012-2014 Stefan Kögl
+
+from chaosc.federation import Federation, RELAY_ADDRESS
+from chaosc.osc_lib import OSCMessage, decode_osc
+import unittest
+
+peer_a = ("127.0.0.1", 7111)
+peer_b = ("127.0.0.1", 7112)
+relay_tags = ["s", "i", "i", "b"]
+
+
+class TestFederation(unittest.TestCase):
+    def setUp(self):
+        self.sent = list()
+        self.federation = Federation("hub", max_hops=2)
+        self.federation.add_peer("a", peer_a, ["/floor1"])
+        self.federation.add_peer("b", peer_b, ["/"])
+        message = OSCMessage("/floor1/light")
+        message.appendTypedArg(1, "i")
+        self.packet = message.encode_osc()
+
+    def sendto(self, packet, address):
+        self.sent.append((packet, address))
+
+    def test_forward_by_interest(self):
+        self.federation.forward(self.sendto, self.packet, "/floor1/light")
+        self.assertEqual(sorted(address for packet, address in self.sent),
+            [peer_a, peer_b])
+        del self.sent[:]
+        self.federation.forward(self.sendto, self.packet, "/floor2/light")
+        self.assertEqual([address for packet, address in self.sent], [peer_b])
+
+        relay = self.sent[0][0]
+        address, typetags, args = decode_osc(relay, 0, len(relay))
+        self.assertEqual(address, RELAY_ADDRESS)
+        self.assertEqual(args[:3], ["hub", 2, 2])
+        self.assertEqual(args[3], self.packet)
+
+    def test_no_interest(self):
+        self.federation.add_peer("c", ("127.0.0.1", 7113), [])
+        self.federation.forward(self.sendto, self.packet, "/floor1/light")
+        self.assertEqual(sorted(address for packet, address in self.sent),
+            [peer_a, peer_b])
+
+    def test_relay(self):
+        args = ["a", 1, 2, self.packet]
+        self.assertEqual(self.federation.relay(self.sendto, relay_tags, args,
+            peer_a), (self.packet, "/floor1/light"))
+        # forwarded to the other peer only
+        self.assertEqual([address for packet, address in self.sent], [peer_b])
+
+        # duplicates, own packets and unknown senders are dropped
+        self.assertEqual(self.federation.relay(self.sendto, relay_tags, args,
+            peer_b), None)
+        self.assertEqual(self.federation.relay(self.sendto, relay_tags,
+            ["hub", 5, 2, self.packet], peer_b), None)
+        self.assertEqual(self.federation.relay(self.sendto, relay_tags,
+            ["a", 2, 2, self.packet], ("127.0.0.1", 1)), None)
+        self.assertEqual(self.federation.dropped, 3)
+
+    def test_malformed(self):
+        relay = self.federation.relay
+        for typetags, args in ((["s", "i", "i"], ["a", 1, 2]),
+            (["i", "i", "i", "b"], [1, 1, 2, self.packet]),
+            (relay_tags, ["a", 1, 2, "no address"])):
+            self.assertEqual(relay(self.sendto, typetags, args, peer_a), None)
+        self.assertEqual(self.sent, [])
+        self.assertEqual(self.federation.dropped, 3)
+
+    def test_hop_limit(self):
+        self.federation.relay(self.sendto, relay_tags, ["a", 1, 1, self.packet],
+            peer_a)
+        self.assertEqual(self.sent, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of chaosc
+#
+# chaosc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# chaosc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with chaosc.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2012-2014 Stefan Kögl
+
+from chaosc import handover
+from chaosc.handover import HandoverThread, receive_handover
+import os
+import shutil
+import socket
+import tempfile
+import unittest
+
+
+class FakeServer(object):
+    def __init__(self, state):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(("127.0.0.1", 0))
+        self.state = state
+        self.handed_over = False
+
+    def shutdown(self):
+        pass
+
+    def get_state(self):
+        return self.state
+
+
+def open_fds():
+    return len(os.listdir("/proc/self/fd"))
+
+
+@unittest.skipIf(handover.sendfd is None, "no file descriptor passing")
+class TestHandover(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, "handover")
+
+    def start(self, state):
+        server = FakeServer(state)
+        self.addCleanup(server.socket.close)
+        thread = HandoverThread(server, self.path)
+        thread.start()
+        return server, thread
+
+    def receive(self):
+        fd, state = receive_handover(self.path, timeout=5.)
+        sock = socket.fromfd(fd, socket.AF_INET, socket.SOCK_DGRAM)
+        os.close(fd)
+        self.addCleanup(sock.close)
+        return sock, state
+
+    def test_round_trip(self):
+        server, thread = self.start({"targets": []})
+        sock, state = self.receive()
+        self.assertEqual(state, {"targets": []})
+        self.assertEqual(sock.getsockname(), server.socket.getsockname())
+        thread.join(5.)
+        self.assertFalse(thread.is_alive())
+        self.assertTrue(server.handed_over)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_failed_attempts(self):
+        server, thread = self.start(object())
+
+        # the state can't be encoded, the new process gets no state
+        self.assertRaises(ValueError, self.receive)
+        thread.attempted.wait(5.)
+        thread.attempted.clear()
+        self.assertTrue(thread.is_alive())
+        self.assertFalse(server.handed_over)
+
+        # a client leaving before receiving the socket
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(self.path)
+        connection.close()
+        thread.attempted.wait(5.)
+        thread.attempted.clear()
+        self.assertTrue(thread.is_alive())
+
+        # a later takeover succeeds
+        server.state = {"targets": []}
+        sock, state = self.receive()
+        self.assertEqual(state, {"targets": []})
+        thread.join(5.)
+        self.assertTrue(server.handed_over)
+
+    @unittest.skipUnless(os.path.isdir("/proc/self/fd"), "needs /proc")
+    def test_no_fd_leak(self):
+        server, thread = self.start(object())
+        before = open_fds()
+        self.assertRaises(ValueError, receive_handover, self.path, 5.)
+        self.assertEqual(open_fds(), before)
+        thread.attempted.wait(5.)
+        self.assertTrue(thread.is_alive())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of chaosc
+#
+# chaosc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# chaosc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with chaosc.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2012-2014 Stefan Kögl
+
+from chaosc.latency import WakeupStats, pin_to_cpu, summarize
+from time import time
+import socket
+import sys
+import unittest
+
+
+class TestSummarize(unittest.TestCase):
+    def test_summarize(self):
+        self.assertEqual(summarize([]), (0, 0., 0., 0., 0.))
+        count, minimum, average, p99, maximum = summarize(
+            [0.004, 0.001, 0.002, 0.003], 1000.)
+        self.assertEqual(count, 4)
+        self.assertAlmostEqual(minimum, 1.)
+        self.assertAlmostEqual(average, 2.5)
+        self.assertAlmostEqual(p99, 4.)
+        self.assertAlmostEqual(maximum, 4.)
+
+
+class TestWakeupStats(unittest.TestCase):
+    def test_empty(self):
+        self.assertEqual(WakeupStats().summary(), (0, 0., 0., 0., 0.))
+
+    def test_summary(self):
+        stats = WakeupStats()
+        stats.samples.extend([i / 1000000. for i in range(1, 101)])
+        count, minimum, average, p99, maximum = stats.summary()
+        self.assertEqual(count, 100)
+        self.assertAlmostEqual(minimum, 1.)
+        self.assertAlmostEqual(average, 50.5)
+        self.assertAlmostEqual(p99, 100.)
+        self.assertAlmostEqual(maximum, 100.)
+
+    def test_sampling(self):
+        stats = WakeupStats(sample_every=2)
+        if not stats.supported:
+            return
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        receiver.bind(("127.0.0.1", 0))
+        sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        # the first sample only enables timestamping, the kernel does so
+        # asynchronously and samples of packets without timestamp are dropped
+        deadline = time() + 5.
+        try:
+            while not stats.samples and time() < deadline:
+                sender.sendto("x", receiver.getsockname())
+                receiver.recv(16)
+                stats.packet_read(receiver)
+        finally:
+            sender.close()
+            receiver.close()
+        self.assertTrue(stats.supported)
+        self.assertTrue(len(stats.samples) >= 1)
+        self.assertTrue(min(stats.samples) >= 0.)
+
+
+class TestPinToCpu(unittest.TestCase):
+    def test_invalid_cpu(self):
+        if not sys.platform.startswith("linux"):
+            return
+        self.assertRaises(ValueError, pin_to_cpu, -1)
+        self.assertRaises(ValueError, pin_to_cpu, 1024)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of chaosc
+#
+# chaosc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# chaosc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with chaosc.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2012-2014 Stefan Kögl
+
+from chaosc.osc_batch import batch_dtype, decode_batch, encode_batch
+from chaosc.osc_lib import OSCMessage, OSCBundle, decode_osc
+import numpy
+import unittest
+
+
+def message(address, typetags, args):
+    msg = OSCMessage(address)
+    for argument, typetag in zip(args, typetags):
+        msg.appendTypedArg(argument, typetag)
+    return msg.encode_osc()
+
+
+class TestDecodeBatch(unittest.TestCase):
+    def test_decode(self):
+        packets = [message("/sensor", "ifd", [i, i * 0.5, -i * 0.25])
+            for i in range(100)]
+        args, rejects = decode_batch(packets, "/sensor", "ifd",
+            ["id", "x", "y"])
+        self.assertEqual(rejects, [])
+        self.assertEqual(args.dtype.names, ("id", "x", "y"))
+        self.assertEqual([args.dtype[i].byteorder for i in range(3)],
+            [">", ">", ">"])
+        self.assertEqual(len(args), 100)
+        for packet, row in zip(packets, args):
+            self.assertEqual(decode_osc(packet, 0, len(packet))[2],
+                list(row))
+        self.assertEqual(args["id"].sum(), sum(range(100)))
+
+    def test_rejects(self):
+        bundle = OSCBundle()
+        bundle.append(OSCMessage("/sensor"))
+        match = message("/sensor", "f", [1.5])
+        other = [message("/sensor/2", "f", [1.5]),
+            message("/sensor", "i", [1]),
+            message("/sensor", "ff", [1.5, 2.5]),
+            match[:-1],
+            bundle.encode_osc()]
+        args, rejects = decode_batch([match] + other + [match], "/sensor",
+            "f")
+        self.assertEqual(list(args["f0"]), [1.5, 1.5])
+        self.assertEqual(rejects, other)
+
+        args, rejects = decode_batch([], "/sensor", "f")
+        self.assertEqual((len(args), rejects), (0, []))
+
+    def test_dtype(self):
+        self.assertEqual(batch_dtype("if").itemsize, 8)
+        self.assertEqual(batch_dtype("hr").itemsize, 12)
+        self.assertRaises(ValueError, batch_dtype, "is")
+        self.assertRaises(ValueError, batch_dtype, "if", ["a"])
+        self.assertRaises(ValueError, decode_batch, [], "/foo", "b")
+
+
+
+class TestEncodeBatch(unittest.TestCase):
+    def test_encode(self):
+        values = numpy.arange(30).reshape(10, 3) * 0.5
+        packets = encode_batch("/frame", "ifd", values)
+        self.assertEqual(packets, [message("/frame", "ifd",
+            [int(i), float(f), float(d)]) for i, f, d in values])
+        self.assertEqual(encode_batch("/frame", "f", values[:, 1]),
+            [message("/frame", "f", [float(f)]) for f in values[:, 1]])
+
+    def test_round_trip(self):
+        packets = [message("/sensor", "if", [i, i * 0.25])
+            for i in range(10)]
+        args, rejects = decode_batch(packets, "/sensor", "if")
+        self.assertEqual(encode_batch("/sensor", "if", args), packets)
+
+    def test_bundles(self):
+        values = numpy.arange(512, dtype=numpy.float32).reshape(256, 2)
+        packets = encode_batch("/channel", "ff", values, max_size=1472)
+        # 16 byte bundle header, 52 messages of 24 bytes plus size
+        self.assertEqual(map(len, packets), [1472] * 4 + [16 + 48 * 28])
+        bundle = OSCBundle()
+        for x, y in values[:52]:
+            msg = OSCMessage("/channel")
+            msg.appendTypedArg(float(x), "f")
+            msg.appendTypedArg(float(y), "f")
+            bundle.append(msg)
+        self.assertEqual(packets[0], bundle.encode_osc())
+        self.assertRaises(ValueError, encode_batch, "/channel", "ff", values,
+            max_size=32)
+
+    def test_shape(self):
+        self.assertRaises(ValueError, encode_batch, "/foo", "ii",
+            numpy.zeros((3, 3)))
+        self.assertRaises(ValueError, encode_batch, "/foo", "s",
+            numpy.zeros((3, 1)))
+        self.assertEqual(encode_batch("/foo", "i", numpy.zeros((0, 1))), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -19,10 +19,22 @@
 
 from chaosc.c_osc_lib import (OSCMessage as CMessage,
     OSCBundle as CBundle,
-    decode_osc as c_decode_osc)
+    OSCMessageView as CMessageView,
+    typetag_codec as c_typetag_codec,
+    OSCMessageTemplate as CMessageTemplate,
+    message_template as c_message_template,
+    decode_osc as c_decode_osc,
+    walk_bundle as c_walk_bundle)
 from chaosc.osc_lib import (OSCMessage as PMessage,
     OSCBundle as PBundle,
-    decode_osc as p_decode_osc)
+    OSCMessageView as PMessageView,
+    OSCError, OSCBundleFound,
+    typetag_codec as p_typetag_codec,
+    OSCMessageTemplate as PMessageTemplate,
+    message_template as p_message_template,
+    decode_osc as p_decode_osc,
+    walk_bundle as p_walk_bundle)
+from chaosc import c_osc_lib, osc_lib
 import unittest
 
 class TestCOSCMessage(unittest.TestCase):
@@ -100,5 +112,410 @@ class TestPythonOSCBundle(unittest.TestCase):
         )
 
 
+class TestPythonOSCMessageView(unittest.TestCase):
+    Message = PMessage
+    Bundle = PBundle
+    MessageView = PMessageView
+    decode_osc = staticmethod(p_decode_osc)
+    Error = OSCError
+    BundleFound = OSCBundleFound
+
+    def setUp(self):
+        msg = self.Message("/my/osc/address")
+        for argument, typetag in ((1, "i"), (0.5, "f"), ("foo", "s"),
+            ("blob", "b"), (2.25, "d"), (-3, "i")):
+            msg.appendTypedArg(argument, typetag)
+        self.binary = msg.encode_osc()
+
+    def test_same_as_decode_osc(self):
+        view = self.MessageView(self.binary)
+        address, typetags, args = self.decode_osc(self.binary, 0,
+            len(self.binary))
+        self.assertEqual(view.address, address)
+        self.assertEqual(view.tags(), typetags)
+        self.assertEqual(len(view), len(args))
+        self.assertEqual(list(view), args)
+        self.assertEqual(view.items(), zip(typetags, args))
+
+    def test_random_access(self):
+        view = self.MessageView(bytearray(self.binary))
+        self.assertEqual(view[-1], -3)
+        self.assertEqual(view[2], "foo")
+        self.assertEqual(view[1:3], [0.5, "foo"])
+        self.assertEqual(view.raw(2).tobytes(), "foo")
+        self.assertRaises(IndexError, view.__getitem__, 6)
+
+    def test_errors(self):
+        self.assertRaises(self.Error,
+            lambda: self.MessageView(self.binary[:-8])[5])
+        self.assertRaises(self.Error, self.MessageView, "/foo")
+        bundle = self.Bundle()
+        bundle.append(self.Message("/foo"))
+        self.assertRaises(self.BundleFound, self.MessageView,
+            bundle.encode_osc())
+
+    def test_unterminated(self):
+        view = self.MessageView("/a\0\0,is\0\0\0\0\1abcd")
+        self.assertEqual(view[0], 1)
+        self.assertRaises(self.Error, view.__getitem__, 1)
+        self.assertRaises(self.Error, view.raw, 1)
+        self.assertRaises(self.Error, view.values)
+        view = self.MessageView("/a\0\0,b\0\0\0\0\0\x08abcd")
+        self.assertRaises(self.Error, view.__getitem__, 0)
+        self.assertRaises(self.Error, view.raw, 0)
+
+    def test_values(self):
+        args = self.decode_osc(self.binary, 0, len(self.binary))[2]
+        self.assertEqual(self.MessageView(bytearray(self.binary)).values(),
+            args)
+        padded = "\xff" * 4 + self.binary + "\xff" * 4
+        self.assertEqual(self.MessageView(padded, 4, len(padded) - 4).values(),
+            args)
+
+
+    def test_memoryview(self):
+        msg = self.Message("/long")
+        msg.appendTypedArg("x" * 200, "s")
+        msg.appendTypedArg(7, "i")
+        msg.appendTypedArg("blob", "b")
+        data = bytearray(msg.encode_osc())
+        view = self.MessageView(memoryview(data))
+        self.assertEqual(view.address, "/long")
+        self.assertEqual(view[1], 7)
+        self.assertEqual(list(view), ["x" * 200, 7, "blob"])
+        # raw shares the memory of the packet
+        raw = view.raw(0)
+        data[16] = "y"
+        self.assertEqual(raw[0], "y")
+        self.assertRaises(self.Error, lambda: self.MessageView(
+            memoryview("/a\0\0,s\0\0abcd"))[0])
+
+
+class TestCOSCMessageView(TestPythonOSCMessageView):
+    Message = CMessage
+    Bundle = CBundle
+    MessageView = CMessageView
+    decode_osc = staticmethod(c_decode_osc)
+    Error = c_osc_lib.OSCError
+    BundleFound = c_osc_lib.OSCBundleFound
+
+
+class TestPythonTypetagCodec(unittest.TestCase):
+    Message = PMessage
+    typetag_codec = staticmethod(p_typetag_codec)
+    decode_osc = staticmethod(p_decode_osc)
+    Error = OSCError
+
+    def test_segments(self):
+        codec = self.typetag_codec("iifsffb")
+        self.assertEqual([segment[0].format for segment in codec
+            if isinstance(segment, tuple)], [">iif", ">ff"])
+        self.assertEqual([segment for segment in codec
+            if not isinstance(segment, tuple)], ["s", "b"])
+        self.assertTrue(self.typetag_codec("iifsffb") is codec)
+        self.assertRaises(self.Error, self.typetag_codec, "ix")
+
+    def test_fixed_width_roundtrip(self):
+        msg = self.Message("/sensor")
+        for i in range(8):
+            msg.appendTypedArg(i * 0.5, "f")
+        msg.appendTypedArg(7, "i")
+        binary = msg.encode_osc()
+        self.assertEqual(self.decode_osc(binary, 0, len(binary)),
+            ("/sensor", ["f"] * 8 + ["i"], [i * 0.5 for i in range(8)] + [7]))
+        self.assertRaises(self.Error, self.decode_osc, binary, 0,
+            len(binary) - 4)
+
+
+class TestCTypetagCodec(TestPythonTypetagCodec):
+    Message = CMessage
+    typetag_codec = staticmethod(c_typetag_codec)
+    decode_osc = staticmethod(c_decode_osc)
+    Error = c_osc_lib.OSCError
+
+
+class TestPythonMessageTemplate(unittest.TestCase):
+    Message = PMessage
+    MessageTemplate = PMessageTemplate
+    message_template = staticmethod(p_message_template)
+    lib = osc_lib
+
+    def test_same_as_message(self):
+        for typetags, args in (("", []), ("ffi", [0.5, 1.5, 3]),
+            ("sib", ["foo", 7, "blob"]), ("d", [2.25])):
+            msg = self.Message("/some/address")
+            for argument, typetag in zip(args, typetags):
+                msg.appendTypedArg(argument, typetag)
+            template = self.MessageTemplate("/some/address", typetags)
+            self.assertEqual(template.encode(*args), msg.encode_osc())
+        self.assertRaises(TypeError, template.encode)
+
+    def test_lru_cache(self):
+        template = self.message_template("/foo", "i")
+        self.assertTrue(self.message_template("/foo", "i") is template)
+        for i in range(self.lib._templates_size):
+            self.message_template("/foo/%d" % i, "i")
+            if i == self.lib._templates_size / 2:
+                # recently used templates survive the eviction
+                self.message_template("/foo", "i")
+        self.assertTrue(len(self.lib._templates) <= self.lib._templates_size)
+        self.assertTrue(self.message_template("/foo", "i") is template)
+        self.assertFalse(("/foo/0", "i") in self.lib._templates)
+
+
+class TestCMessageTemplate(TestPythonMessageTemplate):
+    Message = CMessage
+    MessageTemplate = CMessageTemplate
+    message_template = staticmethod(c_message_template)
+    lib = c_osc_lib
+
+
+
+class TestPythonEncodeInto(unittest.TestCase):
+    Message = PMessage
+    Bundle = PBundle
+    lib = osc_lib
+
+    def message(self, address, typetags, args):
+        msg = self.Message(address)
+        for argument, typetag in zip(args, typetags):
+            msg.appendTypedArg(argument, typetag)
+        return msg
+
+    def test_message(self):
+        for address, typetags, args in (("/a", "", []),
+            ("/sensor/frame", "fffi", [0.5, 1.5, 2.5, 3]),
+            ("/abc", "sbsd", ["", "blob", "four", 2.25])):
+            msg = self.message(address, typetags, args)
+            binary = msg.encode_osc()
+            self.assertEqual(msg.encoded_size(), len(binary))
+            # reused buffers are dirty, padding has to be written too
+            buffer = bytearray("\xff" * (len(binary) + 8))
+            self.assertEqual(msg.encode_into(buffer, 4), len(binary) + 4)
+            self.assertEqual(str(buffer[4:-4]), binary)
+            self.assertEqual(str(buffer[:4]), "\xff" * 4)
+            self.assertEqual(str(buffer[-4:]), "\xff" * 4)
+
+    def test_bundle(self):
+        inner = self.Bundle()
+        inner.append(self.message("/inner", "is", [1, "abc"]))
+        bundle = self.Bundle()
+        bundle.append(self.message("/first", "f", [0.5]))
+        bundle.append(inner)
+        bundle.append(self.message("/last", "b", ["12345"]))
+        binary = bundle.encode_osc()
+        self.assertEqual(binary, "#bundle\0\0\0\0\0\0\0\0\1" +
+            "".join([osc_lib.encode_blob(element.encode_osc())
+                for element in bundle.args]))
+        self.assertEqual(bundle.encoded_size(), len(binary))
+        buffer = bytearray("\xff" * len(binary))
+        self.assertEqual(bundle.encode_into(buffer), len(binary))
+        self.assertEqual(str(buffer), binary)
+
+    def test_too_small(self):
+        msg = self.message("/foo", "i", [1])
+        self.assertRaises(ValueError, msg.encode_into,
+            bytearray(msg.encoded_size() - 1))
+        self.assertRaises(ValueError, msg.encode_into,
+            bytearray(msg.encoded_size()), 1)
+        self.assertRaises(ValueError, msg.encode_into, bytearray(64), -1)
+
+    def test_invalid_arguments(self):
+        buffer = bytearray(64)
+        try:
+            self.lib.encode_arguments_into(buffer, 0, "ii", [1, "abc"])
+        except self.lib.OSCError, error:
+            self.assertFalse("too small" in str(error))
+        else:
+            self.fail("no OSCError raised")
+        self.assertRaises(ValueError, self.lib.encode_arguments_into,
+            bytearray(4), 0, "ii", [1, 2])
+
+
+class TestCEncodeInto(TestPythonEncodeInto):
+    Message = CMessage
+    Bundle = CBundle
+    lib = c_osc_lib
+
+
+
+class TestPythonTypes(unittest.TestCase):
+    Message = PMessage
+    MessageView = PMessageView
+    decode_osc = staticmethod(p_decode_osc)
+    Error = OSCError
+    lib = osc_lib
+
+    typed_args = [(1, "i"), (2 ** 40, "h"), (0.5, "f"), (1.25, "d"),
+        ("symbol", "S"), ("string", "s"), ("blob", "b"), ("x", "c"),
+        (0x11223344, "r"), ((1, 0x90, 60, 127), "m"), (True, "T"),
+        (False, "F"), (None, "N"), (float("inf"), "I"), (7, "i")]
+
+    def message(self, typed_args):
+        msg = self.Message("/types")
+        for argument, typetag in typed_args:
+            msg.appendTypedArg(argument, typetag)
+        return msg.encode_osc()
+
+    def test_osc_1_1(self):
+        binary = self.message(self.typed_args)
+        address, typetags, args = self.decode_osc(binary, 0, len(binary))
+        self.assertEqual(typetags, [typetag for argument, typetag
+            in self.typed_args])
+        self.assertEqual(args, [argument for argument, typetag
+            in self.typed_args])
+        self.assertEqual(list(self.MessageView(binary)), args)
+        self.assertEqual(self.MessageView(binary)[-3], None)
+        # T, F, N and I have no argument data
+        self.assertEqual(len(self.message([(True, "T"), (None, "N")])),
+            len(self.message([])))
+
+    def test_arrays(self):
+        binary = self.message([(1, "i"), ([2.5, ["a", True], 3], "[f[sT]i]"),
+            (4, "i")])
+        self.assertEqual(binary[8:20], ",i[f[sT]i]i\0")
+        args = [1, [2.5, ["a", True], 3], 4]
+        self.assertEqual(self.decode_osc(binary, 0, len(binary))[2], args)
+        view = self.MessageView(binary)
+        self.assertEqual((len(view), list(view), view[1]), (3, args, args[1]))
+        template = self.lib.OSCMessageTemplate("/types", "i[f[sT]i]i")
+        self.assertEqual(template.encode(*args), binary)
+
+    def test_decode_long(self):
+        binary = self.lib._long_struct.pack(-2 ** 40)
+        self.assertEqual(self.lib.decode_long(binary, 0, 8), (-2 ** 40, 8))
+        self.assertRaises(self.Error, self.lib.decode_long, binary, 0, 4)
+
+    def test_errors(self):
+        for typetags in ("x", "[i", "i]", "][", "iq"):
+            self.assertRaises(self.Error, self.lib.typetag_codec, typetags)
+        binary = self.message([(2 ** 40, "h")])
+        self.assertRaises(self.Error, self.decode_osc, binary[:-4], 0,
+            len(binary) - 4)
+
+    def test_malformed(self):
+        lib = self.lib
+        # strings end at end, not at the next null byte
+        self.assertRaises(self.Error, lib.decode_string, "abcd\0", 0, 4)
+        self.assertEqual(lib.decode_string("abc\0", 0, 4), ("abc", 4))
+        # negative blob sizes and blobs beyond end
+        for size in ("\xff\xff\xff\xfc", "\0\0\0\x05"):
+            self.assertRaises(self.Error, lib.decode_blob,
+                size + "abcd\0\0\0\0", 0, 8)
+        self.assertEqual(lib.decode_blob("\0\0\0\4abcd", 0, 8),
+            ("abcd", 8))
+
+        # a message string running into the next bundle element
+        bundle = lib.OSCBundle()
+        bundle.append(self.Message("/a"))
+        bundle.append(self.Message("/b"))
+        binary = bundle.encode_osc()
+        broken = binary[:24] + "xxxx" + binary[28:]
+        self.assertRaises(self.Error, self.decode_osc, broken, 0, len(broken))
+        binary = self.message([("blob", "b")])
+        broken = binary[:-8] + "\xff\xff\xff\xf8" + binary[-4:]
+        self.assertRaises(self.Error, self.decode_osc, broken, 0, len(broken))
+
+    def test_type_inference(self):
+        self.assertEqual([self.lib.get_type_tag(argument) for argument
+            in (1, 2 ** 40, True, False, None, 0.5, "foo")],
+            ["i", "h", "T", "F", "N", "f", "s"])
+
+
+class TestCTypes(TestPythonTypes):
+    Message = CMessage
+    MessageView = CMessageView
+    decode_osc = staticmethod(c_decode_osc)
+    Error = c_osc_lib.OSCError
+    lib = c_osc_lib
+
+
+class TestPythonWalkBundle(unittest.TestCase):
+    Message = PMessage
+    Bundle = PBundle
+    walk_bundle = staticmethod(p_walk_bundle)
+    decode_osc = staticmethod(p_decode_osc)
+    lib = osc_lib
+
+    def nested(self, depth):
+        bundle = self.Bundle()
+        bundle.append(self.Message("/deepest"))
+        for i in xrange(depth - 1):
+            outer = self.Bundle()
+            outer.append(bundle)
+            bundle = outer
+        return bundle.encode_osc()
+
+    def test_walk(self):
+        inner = self.Bundle(1000000000.5)
+        inner.append(self.Message("/inner"))
+        bundle = self.Bundle(1000000001.25)
+        first = self.Message("/first")
+        first.appendTypedArg(1, "i")
+        bundle.append(first)
+        bundle.append(inner)
+        bundle.append(self.Message("/last"))
+        binary = bundle.encode_osc()
+
+        walked = list(self.walk_bundle(binary))
+        self.assertEqual([timetag for timetag, offset, length in walked],
+            [1000000001.25, 1000000000.5, 1000000001.25])
+        self.assertEqual([self.decode_osc(binary, offset, offset + length)[0]
+            for timetag, offset, length in walked],
+            ["/first", "/inner", "/last"])
+        views = [view for timetag, view in self.walk_bundle(binary,
+            views=True)]
+        self.assertEqual([view.address for view in views],
+            ["/first", "/inner", "/last"])
+        self.assertEqual(list(views[0]), [1])
+
+    def test_limits(self):
+        binary = self.nested(4)
+        self.assertEqual(len(list(self.walk_bundle(binary, max_depth=4))), 1)
+        self.assertRaises(self.lib.OSCError, list,
+            self.walk_bundle(binary, max_depth=3))
+        # three nested bundles and the message
+        self.assertRaises(self.lib.OSCError, list,
+            self.walk_bundle(binary, max_elements=3))
+        self.assertEqual(len(list(self.walk_bundle(binary,
+            max_elements=4))), 1)
+
+    def test_invalid(self):
+        message = self.Message("/foo").encode_osc()
+        self.assertRaises(self.lib.OSCError, list, self.walk_bundle(message))
+        bundle = self.Bundle()
+        bundle.append(self.Message("/foo"))
+        binary = bundle.encode_osc()
+        for broken in (binary[:-4], binary[:16] + "\0\0\0\0" + binary[20:],
+            binary[:16] + "\xff\xff\xff\xfc" + binary[20:], binary + "\0"):
+            self.assertRaises(self.lib.OSCError, list,
+                self.walk_bundle(broken))
+
+    def test_decode_osc_invalid(self):
+        bundle = self.Bundle()
+        bundle.append(self.Message("/foo"))
+        binary = bundle.encode_osc()
+        # truncated size field of the second element
+        for broken in (binary + "\0\0", binary[:16] + "\0\0\0\0" + binary[20:],
+            binary[:16] + "\0\0\1\0" + binary[20:]):
+            self.assertRaises(self.lib.OSCError, self.decode_osc, broken, 0,
+                len(broken))
+
+    def test_decode_osc_depth(self):
+        binary = self.nested(self.lib.MAX_BUNDLE_DEPTH)
+        self.decode_osc(binary, 0, len(binary))
+        binary = self.nested(self.lib.MAX_BUNDLE_DEPTH + 1)
+        self.assertRaises(self.lib.OSCError, self.decode_osc, binary, 0,
+            len(binary))
+
+
+class TestCWalkBundle(TestPythonWalkBundle):
+    Message = CMessage
+    Bundle = CBundle
+    walk_bundle = staticmethod(c_walk_bundle)
+    decode_osc = staticmethod(c_decode_osc)
+    lib = c_osc_lib
+
+
 if __name__ == '__main__':
     unittest.main()
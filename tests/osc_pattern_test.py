@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of chaosc
+#
+# chaosc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# chaosc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with chaosc.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2012-2014 Stefan Kögl
+
+from chaosc.osc_pattern import PatternDispatcher, compile_pattern, is_pattern
+import unittest
+
+
+class TestCompilePattern(unittest.TestCase):
+    def assertMatches(self, pattern, address):
+        self.assertTrue(compile_pattern(pattern)(address),
+            "%r should match %r" % (pattern, address))
+
+    def assertNotMatches(self, pattern, address):
+        self.assertFalse(compile_pattern(pattern)(address),
+            "%r should not match %r" % (pattern, address))
+
+    def test_is_pattern(self):
+        self.assertFalse(is_pattern("/fader/1"))
+        for address in ("/fader/*", "/fader/?", "/fader/[12]", "/{a,b}"):
+            self.assertTrue(is_pattern(address))
+
+    def test_literal(self):
+        self.assertMatches("/a.b/c+", "/a.b/c+")
+        self.assertNotMatches("/a.b/c+", "/axb/cc")
+        self.assertNotMatches("/a", "/ab")
+
+    def test_wildcards(self):
+        self.assertMatches("/fader/*", "/fader/1")
+        self.assertMatches("/fader/*", "/fader/")
+        self.assertNotMatches("/fader/*", "/fader/1/x")
+        self.assertMatches("/*/x", "/fader/x")
+        self.assertMatches("/fader?", "/fader1")
+        self.assertNotMatches("/fader?", "/fader")
+        self.assertNotMatches("/a?b", "/a/b")
+
+    def test_character_classes(self):
+        self.assertMatches("/ch[0-9]", "/ch7")
+        self.assertNotMatches("/ch[0-9]", "/chx")
+        self.assertMatches("/ch[!0-9]", "/chx")
+        self.assertNotMatches("/ch[!0-9]", "/ch7")
+        self.assertNotMatches("/a[!x]b", "/a/b")
+        self.assertMatches("/a[^]", "/a^")
+        self.assertMatches("/a[-x]", "/a-")
+        # a range must not cross into the next part of the address
+        self.assertMatches("/a[+-0]", "/a+")
+        self.assertMatches("/a[+-0]", "/a0")
+        self.assertNotMatches("/a[+-0]", "/a/")
+        self.assertNotMatches("/a[+-0]b", "/a/b")
+        self.assertNotMatches("/a[/]b", "/a/b")
+
+    def test_alternatives(self):
+        self.assertMatches("/{fader,knob}/1", "/fader/1")
+        self.assertMatches("/{fader,knob}/1", "/knob/1")
+        self.assertNotMatches("/{fader,knob}/1", "/faderknob/1")
+        self.assertMatches("/{a.b,c}", "/a.b")
+        self.assertNotMatches("/{a.b,c}", "/axb")
+
+    def test_invalid(self):
+        for pattern in ("/a[bc", "/a{b,c", "/a]", "/a}", "/a[]", "/a[!]",
+            "/a[z-a]"):
+            self.assertRaises(ValueError, compile_pattern, pattern)
+
+
+class TestPatternDispatcher(unittest.TestCase):
+    def test_exact(self):
+        dispatcher = PatternDispatcher()
+        dispatcher.add("/a", 1)
+        self.assertEqual(dispatcher.match("/a"), (1,))
+        self.assertEqual(dispatcher.match("/b"), ())
+        dispatcher.add("/a", 2)
+        self.assertEqual(dispatcher.match("/a"), (2,))
+        self.assertEqual(len(dispatcher), 1)
+
+    def test_patterns(self):
+        dispatcher = PatternDispatcher()
+        dispatcher.add("/fader/*", 1)
+        dispatcher.add("/fader/1", 2)
+        dispatcher.add("/{fader,knob}/[0-9]", 3)
+        self.assertEqual(dispatcher.match("/fader/1"), (2, 1, 3))
+        self.assertEqual(dispatcher.match("/fader/x"), (1,))
+        self.assertEqual(dispatcher.match("/knob/2"), (3,))
+        self.assertTrue("/fader/*" in dispatcher)
+        self.assertFalse("/knob/*" in dispatcher)
+
+    def test_remove_invalidates_cache(self):
+        dispatcher = PatternDispatcher()
+        dispatcher.add("/fader/*", 1)
+        self.assertEqual(dispatcher.match("/fader/1"), (1,))
+        dispatcher.remove("/fader/*")
+        self.assertEqual(dispatcher.match("/fader/1"), ())
+        self.assertRaises(KeyError, dispatcher.remove, "/fader/*")
+
+    def test_incoming_patterns(self):
+        dispatcher = PatternDispatcher()
+        dispatcher.add("/fader/1", 1)
+        dispatcher.add("/fader/2", 2)
+        dispatcher.add("/knob/1", 3)
+        self.assertEqual(dispatcher.match("/fader/*"), (1, 2))
+        self.assertEqual(dispatcher.match("/*/1"), (1, 3))
+        self.assertEqual(dispatcher.match("/fader/[x"), ())
+
+        dispatcher = PatternDispatcher(incoming_patterns=False)
+        dispatcher.add("/fader/1", 1)
+        self.assertEqual(dispatcher.match("/fader/*"), ())
+
+    def test_multiple_handlers(self):
+        dispatcher = PatternDispatcher()
+        dispatcher.add("/a", 1, replace=False)
+        dispatcher.add("/a", 2, replace=False)
+        dispatcher.add("/*", 3, replace=False)
+        dispatcher.add("/*", 4, replace=False)
+        self.assertEqual(dispatcher.match("/a"), (1, 2, 3, 4))
+        dispatcher.remove("/a", 1)
+        dispatcher.remove("/*", 4)
+        self.assertEqual(dispatcher.match("/a"), (2, 3))
+        self.assertRaises(KeyError, dispatcher.remove, "/a", 1)
+        dispatcher.remove("/a")
+        self.assertEqual(dispatcher.match("/a"), (3,))
+        self.assertEqual(dispatcher.root.children, {})
+
+    def test_prefixes(self):
+        dispatcher = PatternDispatcher()
+        dispatcher.add("/sensor/", 1, prefix=True)
+        dispatcher.add("/sensor/1", 2, prefix=True)
+        dispatcher.add("/", 3, prefix=True)
+        dispatcher.add("/sensor/1/x", 4)
+        self.assertEqual(dispatcher.match("/sensor/1/x"), (4, 2, 1, 3))
+        self.assertEqual(dispatcher.match("/sensor/2"), (1, 3))
+        self.assertEqual(dispatcher.match("/sensor"), (3,))
+        self.assertEqual(dispatcher.match("/other"), (3,))
+        self.assertEqual(len(dispatcher), 4)
+        self.assertRaises(ValueError, dispatcher.add, "/s*", 5, True)
+
+        dispatcher.remove("/sensor", prefix=True)
+        self.assertEqual(dispatcher.match("/sensor/2"), (3,))
+        self.assertEqual(dispatcher.match("/sensor/1/x"), (4, 2, 3))
+        self.assertRaises(KeyError, dispatcher.remove, "/sensor/1")
+
+    def test_cache_generations(self):
+        dispatcher = PatternDispatcher(cache_size=2)
+        dispatcher.add("/a/*", 1)
+        for address in ("/a/1", "/a/2", "/a/3", "/a/1", "/a/4", "/a/5"):
+            self.assertEqual(dispatcher.match(address), (1,))
+        self.assertTrue(len(dispatcher.recent) <= 2)
+        self.assertTrue(len(dispatcher.older) <= 2)
+        self.assertTrue("/a/5" in dispatcher.recent)
+        self.assertFalse("/a/2" in dispatcher.recent or
+            "/a/2" in dispatcher.older)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of chaosc
+#
+# chaosc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# chaosc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with chaosc.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2012-2014 Stefan Kögl
+
+from chaosc.profiling import SamplingProfiler
+import os
+import tempfile
+import unittest
+from time import time
+
+
+def busy(seconds):
+    end = time() + seconds
+    while time() < end:
+        pass
+
+
+class TestSamplingProfiler(unittest.TestCase):
+    def test_profile(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        profiler = SamplingProfiler(interval=0.001)
+        try:
+            profiler.start(path)
+            self.assertRaises(ValueError, profiler.start, path)
+            busy(0.2)
+            self.assertEqual(profiler.stop(), path)
+            self.assertFalse(profiler.running)
+            with open(path) as fileobj:
+                lines = fileobj.readlines()
+        finally:
+            os.unlink(path)
+        self.assertTrue(lines)
+        stack, count = lines[0].rsplit(" ", 1)
+        self.assertTrue(int(count) > 0)
+        self.assertTrue("busy (profiling_test.py:" in "".join(lines))
+
+    def test_duration(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        profiler = SamplingProfiler(interval=0.001)
+        try:
+            profiler.start(path, duration=0.05)
+            busy(0.2)
+            self.assertFalse(profiler.running)
+        finally:
+            os.unlink(path)
+
+    def test_stop_not_running(self):
+        self.assertRaises(ValueError, SamplingProfiler().stop)
+
+
+if __name__ == '__main__':
+    unittest.main()
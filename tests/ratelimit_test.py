@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of chaosc
+#
+# chaosc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# chaosc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with chaosc.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2012-2014 Stefan Kögl
+
+from chaosc import ratelimit
+from chaosc.ratelimit import RateLimiter, parse_rate, parse_prefix_rates
+import unittest
+
+source_a = ("10.0.0.1", 5000)
+source_b = ("10.0.0.2", 5000)
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(parse_rate("100"), (100., 100.))
+        self.assertEqual(parse_rate("0.5"), (0.5, 1.))
+        self.assertEqual(parse_prefix_rates("/a=10:2,/b=5"),
+            [("/a", 10., 2.), ("/b", 5., 5.)])
+
+    def test_source_drop(self):
+        limiter = RateLimiter((10., 2.))
+        admitted = [limiter.admit("p", source_a, "/x", 0.) for i in range(5)]
+        self.assertEqual(admitted, [True, True, False, False, False])
+        # other sources are not starved
+        self.assertTrue(limiter.admit("p", source_b, "/x", 0.))
+        # refilled after 0.1 seconds
+        self.assertTrue(limiter.admit("p", source_a, "/x", 0.1))
+        self.assertEqual(sorted(limiter.stats()),
+            [("10.0.0.1", 3, 3, 0), ("10.0.0.2", 1, 0, 0)])
+
+    def test_prefix(self):
+        limiter = RateLimiter(None, [("/video", 1., 1.), ("/video/hd", 1., 2.)])
+        self.assertTrue(limiter.admit("p", source_a, "/video/sd", 0.))
+        self.assertFalse(limiter.admit("p", source_b, "/video/sd", 0.))
+        self.assertTrue(limiter.admit("p", source_a, "/video/hd", 0.))
+        self.assertTrue(limiter.admit("p", source_a, "/video/hd", 0.))
+        self.assertTrue(limiter.admit("p", source_a, "/audio", 0.))
+
+    def test_conflate(self):
+        limiter = RateLimiter((10., 1.), mode="conflate")
+        self.assertTrue(limiter.admit("1", source_a, "/x", 0.))
+        self.assertFalse(limiter.admit("2", source_a, "/x", 0.))
+        self.assertFalse(limiter.admit("3", source_a, "/x", 0.))
+        self.assertAlmostEqual(limiter.next_deadline(0.), 0.1)
+        self.assertEqual(limiter.flush(0.05), [])
+        # a newer packet never overtakes the pending one
+        self.assertFalse(limiter.admit("4", source_a, "/x", 0.1))
+        self.assertEqual(limiter.flush(0.1), [("4", source_a, "/x")])
+        self.assertEqual(limiter.next_deadline(0.1), None)
+        self.assertEqual(limiter.stats(), [("10.0.0.1", 2, 0, 2)])
+
+    def test_pending_order(self):
+        limiter = RateLimiter(None, [("/x", 10., 1.)], mode="conflate")
+        self.assertTrue(limiter.admit("1", source_a, "/x/1", 0.))
+        self.assertFalse(limiter.admit("2", source_a, "/x/2", 0.))
+        self.assertFalse(limiter.admit("3", source_b, "/x/3", 0.))
+        self.assertAlmostEqual(limiter.next_deadline(0.), 0.1)
+        self.assertEqual(limiter.flush(0.05), [])
+        # both were due, but the shared bucket only allows one
+        self.assertEqual(limiter.flush(0.1), [("2", source_a, "/x/2")])
+        self.assertAlmostEqual(limiter.next_deadline(0.1), 0.1)
+        self.assertEqual(limiter.flush(0.2), [("3", source_b, "/x/3")])
+        self.assertEqual(limiter.next_deadline(0.2), None)
+
+    def test_bounded(self):
+        self.addCleanup(setattr, ratelimit, "SOURCE_BUCKETS_SIZE",
+            ratelimit.SOURCE_BUCKETS_SIZE)
+        self.addCleanup(setattr, ratelimit, "PENDING_SIZE",
+            ratelimit.PENDING_SIZE)
+        ratelimit.SOURCE_BUCKETS_SIZE = 4
+        ratelimit.PENDING_SIZE = 2
+
+        limiter = RateLimiter((1., 1.))
+        self.assertTrue(limiter.admit("p", source_a, "/x", 0.))
+        # rotating hosts neither grow the table nor reset a flooding host
+        for i in range(10):
+            limiter.admit("p", ("10.0.1.%d" % i, 5000), "/x", 0.)
+            self.assertFalse(limiter.admit("p", source_a, "/x", 0.))
+            self.assertTrue(len(limiter.source_buckets) +
+                len(limiter.older_source_buckets) <= 4)
+        self.assertEqual([item for item in limiter.stats()
+            if item[0] == "10.0.0.1"], [("10.0.0.1", 1, 10, 0)])
+        # the least recently seen hosts are evicted
+        self.assertFalse("10.0.1.0" in limiter.source_buckets or
+            "10.0.1.0" in limiter.older_source_buckets)
+
+        # the pending packets are bounded, the rest is dropped
+        limiter = RateLimiter((1., 1.), mode="conflate")
+        for address in ("/x", "/y", "/z", "/w"):
+            limiter.admit("p", source_b, address, 0.)
+        self.assertEqual(len(limiter.pending), 2)
+        self.assertEqual(limiter.stats(), [("10.0.0.2", 1, 1, 0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
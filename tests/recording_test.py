@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of chaosc
+#
+# chaosc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# chaosc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with chaosc.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2012-2014 Stefan Kögl
+
+from chaosc.recording import (FlightRecorder, RecordingTap, read_records,
+    write_record, MAGIC)
+from StringIO import StringIO
+import os
+import tempfile
+import unittest
+
+records = [
+    (1400000000.25, ("127.0.0.1", 9000), "/foo\0\0\0\0,i\0\0\0\0\0\1"),
+    (1400000000.5, ("::1", 9001), "")]
+
+
+class TestRecording(unittest.TestCase):
+    def test_round_trip(self):
+        fileobj = StringIO()
+        fileobj.write(MAGIC)
+        for record in records:
+            write_record(fileobj, *record)
+        fileobj.seek(0)
+        self.assertEqual(list(read_records(fileobj)), records)
+
+    def test_truncated(self):
+        fileobj = StringIO()
+        fileobj.write(MAGIC)
+        write_record(fileobj, *records[0])
+        fileobj = StringIO(fileobj.getvalue()[:-1])
+        self.assertRaises(ValueError, list, read_records(fileobj))
+
+    def test_no_recording(self):
+        self.assertRaises(ValueError, list, read_records(StringIO("foo")))
+
+    def test_tap(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            tap = RecordingTap(path, interval=0.001)
+            tap.start()
+            for record in records:
+                tap.append(*record)
+            tap.stop()
+            # a second tap appends to the same recording
+            tap = RecordingTap(path)
+            tap.start()
+            tap.append(*records[0])
+            tap.stop()
+            with open(path, "rb") as fileobj:
+                self.assertEqual(list(read_records(fileobj)),
+                    records + records[:1])
+        finally:
+            os.unlink(path)
+
+
+class TestFlightRecorder(unittest.TestCase):
+    def test_keeps_recent_packets(self):
+        recorder = FlightRecorder(size=100, max_packets=5)
+        expected = list()
+        for i in range(50):
+            record = (float(i), ("127.0.0.1", i), chr(65 + i % 26) * (i % 30 + 1))
+            recorder.add(*record)
+            expected.append(record)
+            kept = list(recorder.records())
+            self.assertEqual(kept, expected[-len(kept):])
+            self.assertTrue(len(kept) <= 5)
+            self.assertTrue(sum([len(r[2]) for r in kept]) <= 100)
+
+    def test_oversized_packet(self):
+        recorder = FlightRecorder(size=8, max_packets=5)
+        recorder.add(1., ("127.0.0.1", 9000), "x" * 9)
+        self.assertEqual(len(recorder), 0)
+
+    def test_dump(self):
+        recorder = FlightRecorder(size=1024, max_packets=16)
+        for record in records:
+            recorder.add(*record)
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            self.assertEqual(recorder.dump(path), 2)
+            with open(path, "rb") as fileobj:
+                self.assertEqual(list(read_records(fileobj)), records)
+        finally:
+            os.unlink(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of chaosc
+#
+# chaosc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# chaosc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with chaosc.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2012-2014 Stefan Kögl
+
+from chaosc.osc_lib import OSCMessage
+from chaosc.sequencing import SequenceTracker, SEQUENCE_MASK, stamp, unstamp
+import unittest
+
+
+class TestStamp(unittest.TestCase):
+    def test_round_trip(self):
+        message = OSCMessage("/foo")
+        message.appendTypedArg(1, "i")
+        message.appendTypedArg(2.5, "f")
+        packet = message.encode_osc()
+        self.assertEqual(unstamp(stamp(packet, 42)), (42, packet))
+
+    def test_not_stamped(self):
+        packet = OSCMessage("/foo").encode_osc()
+        self.assertEqual(unstamp(packet), None)
+
+
+class TestSequenceTracker(unittest.TestCase):
+    def test_in_order(self):
+        tracker = SequenceTracker()
+        for i in range(10):
+            tracker.update(i)
+        self.assertEqual(tracker.counters(), (10, 0, 0, 0))
+
+    def test_lost_and_reordered(self):
+        tracker = SequenceTracker()
+        for i in (0, 1, 4, 5, 2):
+            tracker.update(i)
+        self.assertEqual(tracker.counters(), (5, 1, 1, 0))
+
+    def test_duplicates(self):
+        tracker = SequenceTracker()
+        for i in (0, 1, 1, 2, 0):
+            tracker.update(i)
+        self.assertEqual(tracker.counters(), (5, 0, 0, 2))
+
+    def test_wrap(self):
+        tracker = SequenceTracker()
+        for i in (SEQUENCE_MASK - 1, SEQUENCE_MASK, 0, 2):
+            tracker.update(i)
+        self.assertEqual(tracker.counters(), (4, 1, 0, 0))
+
+    def test_restart(self):
+        tracker = SequenceTracker()
+        for i in (1000000, 1000001, 0, 1):
+            tracker.update(i)
+        self.assertEqual(tracker.counters(), (4, 0, 0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of chaosc
+#
+# chaosc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# chaosc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with chaosc.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2012-2014 Stefan Kögl
+
+from chaosc.osc_lib import OSCMessage, OSCBundle
+from chaosc.target_groups import TargetGroup, bundle_address
+import unittest
+
+members = [("127.0.0.1", 9000 + i) for i in range(3)]
+
+
+class TestTargetGroup(unittest.TestCase):
+    def make_group(self, policy):
+        group = TargetGroup("workers", policy)
+        for address in members:
+            group.add(address)
+        return group
+
+    def test_broadcast(self):
+        group = self.make_group("broadcast")
+        self.assertEqual(list(group.select("/foo", "")), members)
+
+    def test_round_robin(self):
+        group = self.make_group("round_robin")
+        selected = [group.select("/foo", "")[0] for i in range(6)]
+        self.assertEqual(selected, members + members)
+
+    def test_hash(self):
+        group = self.make_group("hash")
+        addresses = ["/sensor/%d" % i for i in range(100)]
+        selected = dict((a, group.select(a, "")[0]) for a in addresses)
+        self.assertEqual(set(selected.values()), set(members))
+        for a in addresses:
+            self.assertEqual(group.select(a, "")[0], selected[a])
+
+        # only addresses of the removed member move
+        group.remove(members[0])
+        for a in addresses:
+            if selected[a] != members[0]:
+                self.assertEqual(group.select(a, "")[0], selected[a])
+
+    def test_hash_bundle(self):
+        group = self.make_group("hash")
+        bundle = OSCBundle()
+        bundle.append(OSCMessage("/sensor/1"))
+        packet = bundle.encode_osc()
+        self.assertEqual(bundle_address(packet), "/sensor/1")
+        self.assertEqual(group.select(None, packet),
+            group.select("/sensor/1", ""))
+
+    def test_failover(self):
+        group = self.make_group("failover")
+        self.assertEqual(group.select("/foo", ""), (members[0],))
+        group.mark_failed(members[0])
+        self.assertEqual(group.select("/foo", ""), (members[1],))
+        group.failover_retry = 0.
+        self.assertEqual(group.select("/foo", ""), (members[0],))
+
+    def deliver(self, group, osc_address, suspended):
+        """Selects like chaosc does for a group with suspended members"""
+        unavailable = suspended.__contains__
+        result = list()
+        for address in group.select(osc_address, ""):
+            if unavailable(address):
+                address = group.reselect(address, osc_address, "",
+                    unavailable)
+            result.append(address)
+        return result
+
+    def test_reselect_round_robin(self):
+        group = self.make_group("round_robin")
+        suspended = set([members[1]])
+        selected = sum([self.deliver(group, "/foo", suspended)
+            for i in range(6)], [])
+        self.assertEqual(selected, [members[0], members[2]] * 3)
+        self.assertEqual(self.deliver(group, "/foo", set(members)), [None])
+
+    def test_reselect_hash(self):
+        group = self.make_group("hash")
+        addresses = ["/sensor/%d" % i for i in range(100)]
+        selected = dict((a, group.select(a, "")[0]) for a in addresses)
+        suspended = set([members[0]])
+        moved = dict((a, self.deliver(group, a, suspended)[0])
+            for a in addresses)
+        # like removing the member: only its addresses move
+        group.remove(members[0])
+        for a in addresses:
+            self.assertEqual(moved[a], group.select(a, "")[0])
+            if selected[a] != members[0]:
+                self.assertEqual(moved[a], selected[a])
+
+    def test_reselect_failover(self):
+        group = self.make_group("failover")
+        self.assertEqual(self.deliver(group, "/foo", set([members[0]])),
+            [members[1]])
+        self.assertEqual(group.select("/foo", ""), (members[1],))
+
+    def test_unknown_policy(self):
+        self.assertRaises(ValueError, TargetGroup, "workers", "random")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of chaosc
+#
+# chaosc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# chaosc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with chaosc.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2012-2014 Stefan Kögl
+
+from chaosc.target_health import (TargetHealth, enable_error_queue,
+    read_error_queue)
+import errno
+import socket
+import time
+import unittest
+
+
+TARGET = ("127.0.0.1", 9999)
+
+
+class TestTargetHealth(unittest.TestCase):
+    def setUp(self):
+        self.health = TargetHealth(threshold=3, backoff=1., max_backoff=4.,
+            settle=1.)
+
+    def test_suspend_after_threshold(self):
+        for i in range(2):
+            self.health.send_failed(TARGET, errno.ECONNREFUSED)
+        self.assertFalse(TARGET in self.health.suspended)
+        self.health.send_failed(TARGET, errno.ECONNREFUSED)
+        self.assertTrue(TARGET in self.health.suspended)
+        self.assertFalse(self.health.may_send(TARGET))
+        self.assertEqual(self.health.skipped, 1)
+
+    def test_probe_and_backoff(self):
+        for i in range(3):
+            self.health.send_failed(TARGET, errno.ECONNREFUSED)
+        self.health.suspended[TARGET] = 0.
+        self.assertTrue(self.health.may_send(TARGET))
+        # only one probe per backoff period
+        self.assertFalse(self.health.may_send(TARGET))
+        self.health.send_failed(TARGET, errno.ECONNREFUSED)
+        state = self.health.failing[TARGET]
+        self.assertEqual(state.backoff, 2.)
+        for i in range(3):
+            state.probed = time.time()
+            self.health.send_failed(TARGET, errno.ECONNREFUSED)
+        self.assertEqual(state.backoff, 4.)
+
+    def test_resume(self):
+        for i in range(3):
+            self.health.send_failed(TARGET, errno.ECONNREFUSED)
+        self.health.suspended[TARGET] = 0.
+        self.assertTrue(self.health.may_send(TARGET))
+        now = time.time()
+        # no error since the probe, but not settled yet
+        self.health.failing[TARGET].last_error = now - 2.
+        self.health.check(now)
+        self.assertTrue(TARGET in self.health.suspended)
+        self.health.next_check = 0.
+        self.health.check(now + 1.5)
+        self.assertFalse(TARGET in self.health.suspended)
+        self.assertFalse(TARGET in self.health.failing)
+
+    def test_quiet_period_resets_threshold(self):
+        for i in range(2):
+            self.health.send_failed(TARGET, errno.ECONNREFUSED)
+        self.health.failing[TARGET].last_error = 0.
+        self.health.check(time.time())
+        self.health.send_failed(TARGET, errno.ECONNREFUSED)
+        self.assertFalse(TARGET in self.health.suspended)
+
+    def test_remove(self):
+        for i in range(3):
+            self.health.send_failed(TARGET, errno.ECONNREFUSED)
+        self.health.remove(TARGET)
+        self.assertEqual(self.health.failing, {})
+        self.assertEqual(self.health.suspended, {})
+
+
+class TestErrorQueue(unittest.TestCase):
+    def test_port_unreachable(self):
+        sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        closed = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        closed.bind(("127.0.0.1", 0))
+        address = closed.getsockname()
+        closed.close()
+        try:
+            if not enable_error_queue(sender):
+                return
+            sender.sendto("x", address)
+            time.sleep(0.05)
+            self.assertEqual(read_error_queue(sender),
+                [(address, errno.ECONNREFUSED)])
+            self.assertEqual(read_error_queue(sender), [])
+        finally:
+            sender.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of chaosc
+#
+# chaosc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# chaosc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with chaosc.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2012-2014 Stefan Kögl
+
+from chaosc.tracing import Tracer
+import unittest
+
+
+class TestTracer(unittest.TestCase):
+    def make_trace(self, start):
+        return [("receive", start), ("decode", start + 0.00001),
+            ("send 127.0.0.1:9000", start + 0.00003),
+            ("send 127.0.0.1:9001", start + 0.00004)]
+
+    def test_sampling(self):
+        tracer = Tracer(every=3)
+        tracer.kernel_timestamps = False
+        sampled = [tracer.sample(None) is not None for i in range(9)]
+        self.assertEqual(sampled, [False, False, True] * 3)
+
+    def test_export(self):
+        tracer = Tracer(every=1, capacity=2)
+        for i in range(3):
+            tracer.finish(self.make_trace(float(i)), "/foo",
+                ("127.0.0.1", 8000, 0, 0))
+        traces = tracer.export()
+        self.assertEqual(len(traces), 2)
+        self.assertEqual(traces[0]["time"], 1.)
+        self.assertEqual(traces[0]["source"], "127.0.0.1:8000")
+        self.assertEqual([stage for stage, duration in traces[0]["stages"]],
+            ["receive", "decode", "send 127.0.0.1:9000", "send 127.0.0.1:9001"])
+        self.assertAlmostEqual(traces[0]["stages"][2][1], 20., 3)
+        self.assertAlmostEqual(traces[0]["total_us"], 40., 3)
+
+    def test_summary(self):
+        tracer = Tracer(every=1)
+        tracer.finish(self.make_trace(0.), None, ("127.0.0.1", 8000))
+        summary = tracer.summary()
+        self.assertEqual([(stage, samples) for stage, samples, p50, p99
+            in summary], [("decode", 1), ("send", 2)])
+
+
+if __name__ == '__main__':
+    unittest.main()